@@ -1,14 +1,93 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+import io
+import json
+import logging
+import time
 from datetime import datetime
 import pandas as pd
-from .model import model
-from .shapefiles import gdf_trechos_vulneraveis, gdf_relevo_sp
-from .utils import get_neighbourhood, analyze_floodable_sections, analyze_local_relief, get_weather_forecast_24h, accumulated_rain, consecutive_rainy_days, obter_nivel_rio_proximo
+from .config import PREDICT_LOTE_MAX, PREDICT_SUBLOTE, MODO_DADOS, INGESTAO_INTERVALO, LOG_LEVEL
+from . import upstream, compartilhado, ingestao, grade, agendamento, metricas, respostas, alertas
+from . import model as modelo, shapefiles, sheets
+from .grade import CAMADAS_TRECHOS
+from .predicao import ler_pontos, prever_pontos
+from .utils import cache_previsoes, get_neighbourhood, analyze_floodable_sections, analyze_local_relief, get_weather_forecast_24h, accumulated_rain, consecutive_rainy_days, obter_nivel_rio_proximo
 # from .sheets import DadosMeteorologicos
-from .sheets import medidas_pluviometros, estacoes_pluviometricas, medidas_hidrologicas, estacoes_hidrologicas
+
+logger = logging.getLogger(__name__)
+
+
+def configurar_logging():
+    """
+    Logs da aplicação (logger "app") no stderr, no nível LOG_LEVEL; LOG_LEVEL=OFF os desliga.
+    """
+    raiz = logging.getLogger(__name__)
+    if not raiz.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        raiz.addHandler(handler)
+        raiz.propagate = False
+    raiz.setLevel(logging.CRITICAL + 1 if LOG_LEVEL == "OFF" else LOG_LEVEL)
+
+
+def _registrar_medidores():
+    def caches():
+        medidas = [
+            ({"cache": "previsao"}, cache_previsoes.estatisticas()["taxa_acerto"]),
+            ({"cache": "respostas"}, respostas.cache_respostas.estatisticas()["taxa_acerto"]),
+        ]
+        # Só olha o índice de relevo se ele já foi carregado: uma coleta não deve disparar a carga
+        indice_relevo = vars(shapefiles).get("indice_relevo")
+        info = indice_relevo.info_cache() if indice_relevo is not None else None
+        if info is not None and info["hits"] + info["misses"]:
+            medidas.append(({"cache": "relevo"}, info["hits"] / (info["hits"] + info["misses"])))
+        return medidas
+
+    def upstream_erros():
+        requisicoes = metricas.valores("upstream_requisicoes_total")
+        erros = metricas.valores("upstream_erros_total")
+        return [(rotulos, erros.get(chave, (None, 0))[1] / total) for chave, (rotulos, total) in requisicoes.items() if total]
+
+    def consultas_previsao():
+        estatisticas = cache_previsoes.estatisticas()
+        return [({"resultado": resultado}, estatisticas[resultado]) for resultado in ("hits", "misses", "coalescidas", "expiradas", "despejadas")]
+
+    metricas.registrar_medidor("cache_taxa_acerto", "Fração das consultas respondidas pelo cache.", caches)
+    metricas.registrar_medidor("upstream_taxa_erro", "Fração das chamadas aos serviços externos que falharam.", upstream_erros)
+    metricas.registrar_medidor("cache_previsao_consultas_total", "Consultas ao cache de previsões do OpenWeather.", consultas_previsao, tipo="counter")
+
 
 def create_app():
     app = Flask(__name__)
+    configurar_logging()
+    _registrar_medidores()
+
+    if MODO_DADOS in ("prefork", "mmap"):
+        # Carga antecipada: com preload_app (gunicorn.conf.py) acontece uma vez no processo mestre,
+        # e os workers herdam as páginas por fork em vez de cada um ler as entradas
+        shapefiles.carregar_tudo()
+        sheets.carregar_tudo()
+        grade.grade
+        modelo.inferencia
+
+    @app.before_request
+    def iniciar_tarefas():
+        # Acompanhamento dos arquivos de medidas, predições agendadas e alertas, iniciados uma vez em cada worker
+        ingestao.iniciar()
+        agendamento.iniciar()
+        alertas.iniciar()
+        g.inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def registrar_requisicao(response):
+        rota = request.url_rule.rule if request.url_rule is not None else "desconhecida"
+        metricas.incrementar("http_requisicoes_total", "Requisições HTTP por rota e status.", rota=rota, status=response.status_code)
+        if "inicio_requisicao" in g:
+            metricas.observar("http_duracao_segundos", "Duração das requisições HTTP por rota.", time.perf_counter() - g.inicio_requisicao, rota=rota)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
 
     @app.route("/status", methods=["GET"])
     def status():
@@ -18,18 +97,148 @@ def create_app():
     @app.route("/shapes", methods=["GET"])
     def shapes():
         return jsonify({
-            "trechos_vulneraveis": len(gdf_trechos_vulneraveis),
-            "relevo": len(gdf_relevo_sp)
+            "trechos_vulneraveis": len(shapefiles.indice_trechos),
+            "relevo": len(shapefiles.indice_relevo),
+            "bairros": len(shapefiles.indice_bairros) if shapefiles.indice_bairros is not None else 0
         })
+
+
+    @app.route("/memory", methods=["GET"])
+    def memory():
+        # Memória residente do worker, separando o que é compartilhado com os demais (bytes)
+        return jsonify({"modo_dados": MODO_DADOS, **compartilhado.uso_memoria()})
     
     
-    @app.route("/floodable_stretches", methods=["GET"]) # Exemplo de uso: /floodable_stretches?lat=-23.55052&lon=-46.633308
-    def floodable_stretches():
+    @app.route("/cache_stats", methods=["GET"])
+    def cache_stats():
+        return jsonify({
+            "previsao": cache_previsoes.estatisticas(),
+            "relevo": shapefiles.indice_relevo.info_cache(),
+            "respostas": respostas.estatisticas()
+        })
+    
+    
+    @app.route("/predictions", methods=["GET"]) # Tabela das predições agendadas; com ?lat=&lon=, só a do ponto (ou da sua célula)
+    def predictions():
+        if "lat" not in request.args and "lon" not in request.args:
+            return jsonify(agendamento.resumo())
+
         try:
             lat = float(request.args.get("lat"))
             lon = float(request.args.get("lon"))
+        except TypeError:
+            return jsonify({"error": "Por favor, passe 'lat' e 'lon' na URL"}), 400
+        except ValueError:
+            return jsonify({"error": "Lat e Lon devem ser numeros"}), 400
+
+        agendada = agendamento.consultar(lat, lon)
+        if agendada is None:
+            return jsonify({"error": "Local sem predição agendada"}), 404
+        return jsonify(agendada)
+
+
+    @app.route("/tiles/<int:z>/<int:x>/<int:y>.png", methods=["GET"]) # Mapa de calor da grade estática; ?camada=risco_medio_trechos_5km (padrão)
+    def tiles(z, x, y):
+        if grade.grade is None:
+            return jsonify({"error": "Grade estática não gerada (python -m app.preprocessar grade)"}), 404
+
+        camada = request.args.get("camada", "risco_medio_trechos_5km")
+        if camada not in CAMADAS_TRECHOS:
+            return jsonify({"error": f"Camada deve ser uma de: {', '.join(CAMADAS_TRECHOS)}"}), 400
+        if z > 22 or x >= 2 ** z or y >= 2 ** z:
+            return jsonify({"error": "Tile fora do intervalo"}), 400
+
+        response = Response(grade.grade.tile(z, x, y, camada), mimetype="image/png")
+        response.headers["Cache-Control"] = "public, max-age=86400"
+        return response
+
+
+    @app.route("/ingest", methods=["GET"])
+    def ingest_status():
+        return jsonify(ingestao.estatisticas())
+
+
+    @app.route("/ingest/<destino>", methods=["POST"]) # Authorization: Bearer <INGESTAO_TOKEN>; destino: pluviometros ou hidrologicas; corpo: lista JSON de medidas ou CSV ";" no formato CEMADEN
+    def ingest(destino):
+        if not ingestao.autorizado(request.headers.get("Authorization")):
+            return jsonify({"error": "Token ausente ou inválido (Authorization: Bearer <INGESTAO_TOKEN>)"}), 401
+        if destino not in ingestao.DESTINOS:
+            return jsonify({"error": f"Destino deve ser um de: {', '.join(ingestao.DESTINOS)}"}), 404
+
+        try:
+            if request.is_json:
+                corpo = request.get_json(silent=True)
+                if not isinstance(corpo, list):
+                    raise ValueError("esperada uma lista de medidas")
+                blocos = [ingestao.tipar_medidas(pd.DataFrame(corpo), destino)]
+            else:
+                blocos = list(ingestao.ler_blocos(io.BytesIO(request.get_data()), destino))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Corpo inválido: {e}"}), 400
+
+        try:
+            recebidas = 0
+            for bloco in blocos:
+                recebidas += ingestao.ingerir(destino, bloco)
+                if INGESTAO_INTERVALO > 0:
+                    ingestao.gravar_recebidas(destino, bloco)
+            return jsonify({"recebidas": recebidas, "lidas": sum(len(bloco) for bloco in blocos)})
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+
+    @app.route("/alerts/watches", methods=["GET"])
+    def alert_watches():
+        return jsonify(alertas.listar())
+
+
+    @app.route("/alerts/watches", methods=["POST"]) # Corpo: {"lat": -23.55, "lon": -46.63, "limites": {"chuva_48h": 50, "risco": 1}} (com "id" opcional) ou uma lista deles
+    def alert_watches_register():
+        try:
+            vigias = alertas.ler_vigias(request.get_json(force=True, silent=True))
+        except (TypeError, ValueError, KeyError) as e:
+            return jsonify({"error": f"Corpo inválido: {e}"}), 400
+        return jsonify(alertas.registrar(vigias)), 201
+
 
-            response = analyze_floodable_sections(lat, lon, gdf_trechos_vulneraveis)
+    @app.route("/alerts/watches/<identificador>", methods=["DELETE"])
+    def alert_watches_remove(identificador):
+        if not alertas.remover(identificador):
+            return jsonify({"error": "Vigia não encontrado"}), 404
+        return "", 204
+
+
+    @app.route("/alerts", methods=["GET"]) # Long-poll (espera só no modo ASGI): ?desde=<seq>&espera=<segundos>&ids=a,b; sem desde, devolve o histórico na hora
+    def alerts():
+        if not alertas.ativo():
+            return jsonify({"error": "Alertas desativados (ALERTAS_INTERVALO=0)"}), 503
+        try:
+            desde = int(request.args.get("desde", 0))
+        except ValueError:
+            return jsonify({"error": "desde deve ser um numero"}), 400
+        # Sem espera (?espera= é ignorado): cada assinante prenderia uma thread do worker por até ALERTAS_ESPERA_MAX
+        # segundos. O cliente repete a consulta a partir de "ultimo"; no modo ASGI (app/asgi.py) a espera acontece no laço
+        eventos, ultimo = alertas.aguardar(desde, 0, alertas.ler_ids(request.args))
+        return jsonify({"eventos": eventos, "ultimo": ultimo})
+
+
+    @app.route("/alerts/stream", methods=["GET"]) # Server-sent events; ?ids=a,b filtra os vigias, Last-Event-ID (ou ?desde=) retoma
+    def alerts_stream():
+        # No modo ASGI a rota é atendida no laço de eventos (app/asgi.py); aqui cada assinante
+        # prenderia uma thread do worker enquanto estivesse conectado
+        response = jsonify({"error": "Server-sent events só no modo ASGI (SERVIDOR=asgi); use o long-poll de /alerts"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "60"
+        return response
+
+
+    @app.route("/floodable_stretches", methods=["GET"]) # Exemplo de uso: /floodable_stretches?lat=-23.55052&lon=-46.633308
+    @respostas.em_cache
+    def floodable_stretches():
+        try:
+            lat, lon = respostas.coordenadas()
+
+            response = analyze_floodable_sections(lat, lon, shapefiles.indice_trechos)
             return jsonify(response)
         except TypeError:
             return jsonify({"error": "Por favor, passe 'lat' e 'lon' na URL"}), 400
@@ -40,12 +249,12 @@ def create_app():
         
 
     @app.route("/local_relief", methods=["GET"]) # Exemplo de uso: /local_relief?lat=-23.55052&lon=-46.633308
+    @respostas.em_cache
     def local_relief():
         try:
-            lat = float(request.args.get("lat"))
-            lon = float(request.args.get("lon"))
+            lat, lon = respostas.coordenadas()
 
-            response = analyze_local_relief(lat, lon, gdf_relevo_sp)
+            response = analyze_local_relief(lat, lon, shapefiles.indice_relevo)
             return jsonify(response)
         except TypeError:
             return jsonify({"error": "Por favor, passe 'lat' e 'lon' na URL"}), 400
@@ -56,10 +265,10 @@ def create_app():
 
 
     @app.route("/weather_forecast_24h", methods=["GET"])
+    @respostas.em_cache
     def weather_forecast_24h():
         try:
-            lat = float(request.args.get("lat"))
-            lon = float(request.args.get("lon"))
+            lat, lon = respostas.coordenadas()
 
             response = get_weather_forecast_24h(lat, lon)
             if response is None:
@@ -79,7 +288,7 @@ def create_app():
             lat = float(request.args.get("lat"))
             lon = float(request.args.get("lon"))
 
-            bairro = get_neighbourhood(lat, lon)
+            bairro = get_neighbourhood(lat, lon, shapefiles.indice_bairros)
             if bairro is None:
                 return jsonify({"error": "Erro ao obter o bairro"}), 500
             return jsonify({"bairro": bairro})
@@ -91,7 +300,19 @@ def create_app():
             return jsonify({"error": str(e)}), 500
         
 
+    def predicao_agendada(lat, lon):
+        # Local coberto pelas predições agendadas: responde da tabela, sem o pipeline de features. Consultada
+        # pela coordenada pedida, antes do cache de respostas: os pontos do arquivo valem só para si, não para a célula
+        agendada = agendamento.consultar(lat, lon)
+        if agendada is None:
+            return None
+        response = jsonify({"prediction": [agendada["prediction"]]})
+        response.headers["X-Prediction-Computed-At"] = agendada["calculado_em"]
+        return response
+
+
     @app.route("/predict", methods=["GET"])
+    @respostas.em_cache(direta=predicao_agendada)
     def predict():
         try:
             # PRECISO DE:
@@ -100,16 +321,41 @@ def create_app():
             # FALTAM:
             # nivel_rio_24h
 
-            lat = float(request.args.get("lat"))
-            lon = float(request.args.get("lon"))
+            lat, lon = respostas.coordenadas()
+
+            logger.debug("Recebido lat: %s lon: %s", lat, lon)
 
-            print("Recebido lat:", lat, "lon:", lon)
-            
             data_atual = pd.Timestamp(datetime.now()) # data_evento
-            neighbourhood = get_neighbourhood(lat, lon) # bairro
-            features_floodable = analyze_floodable_sections(lat, lon, gdf_trechos_vulneraveis) # n_trechos_alto_impacto_5km, n_trechos_vulneraveis_5km, risco_medio_trechos_5km
-            features_relief = analyze_local_relief(lat, lon, gdf_relevo_sp) # AMPLIT_ALT, DDREN_MED, DECLIV_MED, E_HIDR_MED, GEOL_CPRM, GEOL_rev, NIVEL_1
-            weather_forecast = get_weather_forecast_24h(lat, lon) # chuva_24h, intensidade_max_24h
+
+            # Retrato das séries no início da requisição: a ingestão pode trocá-las no meio do cálculo
+            serie_pluviometrica = sheets.serie_pluviometrica
+            serie_hidrologica = sheets.serie_hidrologica
+
+            # Chamadas externas em paralelo, sobrepostas ao cálculo das features locais
+            futuro_bairro = upstream.executor_geocodificacao.submit(metricas.medir("geocodificacao", pipeline="predict")(get_neighbourhood), lat, lon, shapefiles.indice_bairros) # bairro
+            futuro_previsao = upstream.executor.submit(metricas.medir("previsao", pipeline="predict")(get_weather_forecast_24h), lat, lon) # chuva_24h, intensidade_max_24h
+
+            # Features estáticas da grade pré-calculada, quando o ponto cai nela
+            with metricas.medir("grade", pipeline="predict"):
+                features_static = grade.grade.consultar(lat, lon, shapefiles.indice_relevo) if grade.grade is not None else None
+            if features_static is None:
+                with metricas.medir("trechos", pipeline="predict"):
+                    features_floodable = analyze_floodable_sections(lat, lon, shapefiles.indice_trechos) # n_trechos_alto_impacto_5km, n_trechos_vulneraveis_5km, risco_medio_trechos_5km
+                with metricas.medir("relevo", pipeline="predict"):
+                    features_relief = analyze_local_relief(lat, lon, shapefiles.indice_relevo) # AMPLIT_ALT, DDREN_MED, DECLIV_MED, E_HIDR_MED, GEOL_CPRM, GEOL_rev, NIVEL_1
+                features_static = {**features_floodable, **features_relief}
+            with metricas.medir("dias_consecutivos", pipeline="predict"):
+                consec_rain_days = consecutive_rainy_days(lat, lon, data_atual, serie_pluviometrica, None)
+
+            inicio_dia = data_atual.normalize()
+            fim_dia = inicio_dia + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+            with metricas.medir("nivel_rio", pipeline="predict"):
+                nivel_rio_24h = obter_nivel_rio_proximo(lat, lon, inicio_dia, fim_dia, serie_hidrologica, None)
+
+            with metricas.medir("espera_externa", pipeline="predict"):
+                neighbourhood = upstream.resultado(futuro_bairro, "geocodificacao")
+                weather_forecast = upstream.resultado(futuro_previsao, "previsao")
 
             if weather_forecast is None:
                 return jsonify({"error": "Erro ao obter a previsão do tempo"}), 500
@@ -118,23 +364,14 @@ def create_app():
             # medidas_pluviometros = dados.medidas_pluviometros
             # estacoes_pluviometricas = dados.estacoes_pluviometricas
         
-            print(medidas_pluviometros.head())
-            print(estacoes_pluviometricas.head())
-
             # TODO: preencher períodos sem informações
-            acc_rain = accumulated_rain(lat, lon, data_atual, medidas_pluviometros, estacoes_pluviometricas, weather_forecast["chuva_24h"]) # chuva_48h, chuva_72h
-            consec_rain_days = consecutive_rainy_days(lat, lon, data_atual, medidas_pluviometros, estacoes_pluviometricas)
-
-            inicio_dia = data_atual.normalize()
-            fim_dia = inicio_dia + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-
-            nivel_rio_24h = obter_nivel_rio_proximo(lat, lon, inicio_dia, fim_dia, medidas_hidrologicas, estacoes_hidrologicas)
+            with metricas.medir("chuva_acumulada", pipeline="predict"):
+                acc_rain = accumulated_rain(lat, lon, data_atual, serie_pluviometrica, None, weather_forecast["chuva_24h"]) # chuva_48h, chuva_72h
 
             features = {
                 "data_evento": data_atual.to_pydatetime().strftime("%Y-%m-%d"), 
                 "bairro": neighbourhood,
-                **features_floodable, 
-                **features_relief, 
+                **features_static,
                 **weather_forecast,
                 **acc_rain,
                 "dias_consec_chuva": consec_rain_days,
@@ -142,15 +379,50 @@ def create_app():
             }
 
             # return jsonify(features)
-            print("Features para predição:", features)
+            logger.debug("Features para predição: %s", features)
 
-
-            feature_order = model.feature_names_in_
-            X = pd.DataFrame([features], columns=feature_order)
-            prediction = model.predict(X)
+            with metricas.medir("modelo", pipeline="predict"):
+                prediction = modelo.inferencia.prever_linha(features)
 
             return jsonify({"prediction": prediction.tolist()})
         except Exception as e:
             return jsonify({"error": str(e)}), 400
 
+
+    @app.route("/predict/batch", methods=["POST"]) # Corpo: [{"lat": -23.55, "lon": -46.63}, ...] ou uma FeatureCollection GeoJSON de pontos
+    def predict_batch():
+        try:
+            pontos = ler_pontos(request.get_json(force=True, silent=True))
+        except (TypeError, ValueError, KeyError) as e:
+            return jsonify({"error": f"Corpo inválido: {e}"}), 400
+
+        if not pontos:
+            return jsonify({"error": "Nenhum ponto informado"}), 400
+        if len(pontos) > PREDICT_LOTE_MAX:
+            return jsonify({"error": f"Máximo de {PREDICT_LOTE_MAX} pontos por requisição"}), 413
+
+        data_atual = pd.Timestamp(datetime.now())
+        sublotes = [pontos[i:i + PREDICT_SUBLOTE] for i in range(0, len(pontos), PREDICT_SUBLOTE)]
+        try:
+            # O primeiro sub-lote é calculado antes da resposta: um erro nele ainda vira status 500
+            primeiro = prever_pontos(sublotes[0], data_atual)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        def gerar():
+            # Uma linha JSON por ponto (NDJSON), na ordem de entrada, um sub-lote por vez
+            resultados = primeiro
+            for proximo in sublotes[1:] + [None]:
+                for linha in resultados:
+                    yield json.dumps(linha, ensure_ascii=False) + "\n"
+                if proximo is None:
+                    break
+                try:
+                    resultados = prever_pontos(proximo, data_atual)
+                except Exception as e:
+                    logger.exception("Erro num sub-lote de /predict/batch")
+                    resultados = [{**ponto, "error": str(e)} for ponto in proximo]
+
+        return Response(stream_with_context(gerar()), mimetype="application/x-ndjson")
+
     return app
\ No newline at end of file
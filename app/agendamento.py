@@ -0,0 +1,177 @@
+"""
+Predições recalculadas periodicamente em segundo plano.
+
+A cada PREVISAO_AGENDADA_INTERVALO segundos, os pontos configurados (arquivo
+PREVISAO_AGENDADA_PONTOS e centros das células de geohash dentro de
+PREVISAO_AGENDADA_LIMITES) passam pelo mesmo pipeline de /predict/batch. O
+resultado vira uma tabela consultada em O(1): os pontos do arquivo pela
+própria coordenada (arredondada em CASAS_PONTOS casas decimais), e as
+células dos limites pelo geohash, cobrindo qualquer ponto que caia nelas.
+
+Com vários workers, só um recalcula por vez (trava em arquivo); a tabela é
+gravada em PREVISAO_AGENDADA_CAMINHO e cada worker a recarrega quando ela muda.
+A thread nasce em cada worker na primeira requisição, como a da ingestão.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from .config import (
+    PREVISAO_AGENDADA_INTERVALO, PREVISAO_AGENDADA_PONTOS, PREVISAO_AGENDADA_LIMITES,
+    PREVISAO_AGENDADA_PRECISAO, PREVISAO_AGENDADA_CAMINHO, PREDICT_LOTE_MAX
+)
+from .cache import geohash, centro_geohash, celulas_geohash
+from .predicao import ler_pontos, prever_pontos
+
+logger = logging.getLogger(__name__)
+
+# Tabela atual, trocada por inteiro a cada recarga (leitores nunca veem uma tabela pela metade)
+_tabela = {"calculado_em": None, "calculado_em_ts": 0.0, "precisao": PREVISAO_AGENDADA_PRECISAO, "itens": {}, "pontos": {}}
+_mtime_tabela = None
+_lock = threading.Lock()
+_pid_agendamento = None
+
+# Casas decimais da coordenada dos pontos do arquivo na tabela (4 casas ~ 11 m)
+CASAS_PONTOS = 4
+
+
+def _chave_ponto(lat, lon):
+    return f"{lat:.{CASAS_PONTOS}f},{lon:.{CASAS_PONTOS}f}"
+
+
+def pontos_agendados():
+    """
+    Pontos a recalcular: os do arquivo configurado e os centros das células de geohash dos limites.
+    """
+    pontos = []
+    if PREVISAO_AGENDADA_PONTOS:
+        with open(PREVISAO_AGENDADA_PONTOS, encoding="utf-8") as f:
+            pontos.extend(ler_pontos(json.load(f)))
+    if PREVISAO_AGENDADA_LIMITES:
+        limites = [float(valor) for valor in PREVISAO_AGENDADA_LIMITES.split(",")]
+        for codigo in celulas_geohash(limites, PREVISAO_AGENDADA_PRECISAO):
+            lat, lon = centro_geohash(codigo)
+            pontos.append({"lat": lat, "lon": lon, "id": codigo, "celula": codigo})
+    return pontos
+
+
+def calcular_tabela(pontos, data_atual=None):
+    """
+    Roda o pipeline em lotes de PREDICT_LOTE_MAX pontos e monta a tabela.
+
+    Os pontos com "celula" (centros das células dos limites) entram em "itens", por geohash; os
+    demais, em "pontos", pela coordenada: dois pontos do arquivo na mesma célula não se sobrescrevem.
+    """
+    data_atual = data_atual if data_atual is not None else pd.Timestamp(datetime.now())
+    itens = {}
+    por_ponto = {}
+    for inicio in range(0, len(pontos), PREDICT_LOTE_MAX):
+        for resultado in prever_pontos(pontos[inicio:inicio + PREDICT_LOTE_MAX], data_atual):
+            if "prediction" not in resultado:
+                continue
+            if "celula" in resultado:
+                itens[resultado["celula"]] = resultado
+            else:
+                por_ponto[_chave_ponto(resultado["lat"], resultado["lon"])] = resultado
+    return {
+        "calculado_em": data_atual.isoformat(),
+        "calculado_em_ts": time.time(),
+        "precisao": PREVISAO_AGENDADA_PRECISAO,
+        "itens": itens,
+        "pontos": por_ponto,
+    }
+
+
+def _gravar(tabela):
+    temporario = f"{PREVISAO_AGENDADA_CAMINHO}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(tabela, f, ensure_ascii=False)
+    os.replace(temporario, PREVISAO_AGENDADA_CAMINHO)
+
+
+def _recarregar():
+    global _tabela, _mtime_tabela
+    try:
+        mtime = os.stat(PREVISAO_AGENDADA_CAMINHO).st_mtime_ns
+    except OSError:
+        return
+    if mtime == _mtime_tabela:
+        return
+    with open(PREVISAO_AGENDADA_CAMINHO, encoding="utf-8") as f:
+        tabela = json.load(f)
+    _tabela, _mtime_tabela = tabela, mtime
+
+
+def atualizar():
+    """
+    Uma rodada: recalcula a tabela se ela venceu e nenhum outro worker já está recalculando; depois a recarrega.
+    """
+    with open(PREVISAO_AGENDADA_CAMINHO + ".lock", "w") as trava:
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            pass
+        else:
+            try:
+                idade = time.time() - os.stat(PREVISAO_AGENDADA_CAMINHO).st_mtime
+            except OSError:
+                idade = float("inf")
+            if idade >= PREVISAO_AGENDADA_INTERVALO:
+                inicio = time.perf_counter()
+                pontos = pontos_agendados()
+                tabela = calcular_tabela(pontos)
+                _gravar(tabela)
+                calculados = len(tabela["itens"]) + len(tabela["pontos"])
+                logger.info("Predições agendadas: %d/%d pontos em %.1fs", calculados, len(pontos), time.perf_counter() - inicio)
+    _recarregar()
+
+
+def _agendar():
+    while True:
+        try:
+            atualizar()
+        except Exception as e:
+            logger.exception("Erro nas predições agendadas: %s", e)
+        # Verifica com mais frequência que o intervalo, para recarregar logo a tabela gravada por outro worker
+        time.sleep(min(PREVISAO_AGENDADA_INTERVALO, 30))
+
+
+def iniciar():
+    """
+    Inicia o agendamento neste processo (uma vez por processo).
+    """
+    global _pid_agendamento
+    if PREVISAO_AGENDADA_INTERVALO <= 0 or _pid_agendamento == os.getpid():
+        return
+    with _lock:
+        if _pid_agendamento == os.getpid():
+            return
+        _pid_agendamento = os.getpid()
+    threading.Thread(target=_agendar, name="agendamento", daemon=True).start()
+
+
+def consultar(lat, lon):
+    """
+    Predição agendada do ponto do arquivo com essa coordenada ou, senão, da célula dos limites em que ele cai.
+
+    None se não há predição para o local ou se a tabela está vencida (mais de dois intervalos).
+    """
+    tabela = _tabela
+    if time.time() - tabela["calculado_em_ts"] > 2 * PREVISAO_AGENDADA_INTERVALO:
+        return None
+    item = tabela.get("pontos", {}).get(_chave_ponto(lat, lon)) or tabela["itens"].get(geohash(lat, lon, tabela["precisao"]))
+    if item is None:
+        return None
+    return {**item, "calculado_em": tabela["calculado_em"]}
+
+
+def resumo():
+    tabela = _tabela
+    itens = list(tabela.get("pontos", {}).values()) + list(tabela["itens"].values())
+    return {"calculado_em": tabela["calculado_em"], "precisao": tabela["precisao"], "itens": itens}
@@ -0,0 +1,582 @@
+"""
+Alertas de enchente para locais vigiados, avaliados de forma incremental.
+
+Cada vigia é um ponto com limites para algumas das métricas de METRICAS
+(chuva prevista e acumulada, nível do rio e a classe de risco do modelo).
+Os vigias são reavaliados só quando algo que os afeta muda:
+- medidas novas de uma estação (ingestão): o índice estação -> vigias aponta
+  os vigias a até ALERTAS_RAIO_KM dela, o raio da interpolação;
+- previsão nova: a previsão de cada célula de geohash vale por
+  PREVISAO_CACHE_TTL segundos, e os vigias da célula são reavaliados juntos
+  quando ela vence.
+Os vigias pendentes são avaliados em lote (montar_features e uma chamada ao
+modelo), e cada limite que passa a ser atingido (ou deixa de ser) vira um
+evento. Os eventos ficam num histórico de ALERTAS_HISTORICO itens, entregues
+por GET /alerts/stream (server-sent events) ou GET /alerts (long-poll), com
+espera só no modo ASGI (sem ele, /alerts responde na hora): o custo de uma atualização é uma avaliação, qualquer que seja o
+número de assinantes, e cada conexão aberta só espera o próximo evento.
+
+Os vigias são gravados em ALERTAS_CAMINHO e cada worker os recarrega quando o
+arquivo muda. Com vários workers, só um avalia: o que obtém a trava em
+arquivo (mantida enquanto o processo vive; se ele morre, outro a assume e
+retoma dos estados gravados). O avaliador grava os eventos, numerados por
+uma sequência única, e o estado de cada vigia em ALERTAS_EVENTOS_CAMINHO
+(SQLite); os demais workers copiam os eventos novos para o seu histórico em
+memória, então o `seq` (e o Last-Event-ID) vale em qualquer worker. A thread
+de avaliação nasce em cada worker na primeira requisição, como a da
+ingestão.
+"""
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .config import (
+    ALERTAS_INTERVALO, ALERTAS_CAMINHO, ALERTAS_EVENTOS_CAMINHO, ALERTAS_LEITURA_INTERVALO, ALERTAS_RAIO_KM, ALERTAS_HISTORICO,
+    PREVISAO_GEOHASH_PRECISAO, PREVISAO_CACHE_TTL, PREDICT_LOTE_MAX
+)
+from . import model as modelo, shapefiles, sheets, grade, upstream, metricas
+from .cache import geohash
+from .predicao import montar_features, prever
+from .utils import get_neighbourhood, get_weather_forecast_24h
+
+logger = logging.getLogger(__name__)
+
+# Métricas que aceitam limite; o alerta dispara quando o valor fica maior ou igual ao limite
+METRICAS = ("chuva_24h", "chuva_48h", "chuva_72h", "intensidade_max_24h", "nivel_rio_24h", "risco")
+
+# Destino da ingestão -> atributo da série em sheets
+SERIES = {"pluviometros": "serie_pluviometrica", "hidrologicas": "serie_hidrologica"}
+
+_lock = threading.Lock()
+_pendentes_cond = threading.Condition(_lock)
+_vigias = {}           # id -> {"id", "lat", "lon", "limites"}
+_mtime_vigias = None
+_indice = {}           # destino -> (motor indexado, {código da estação: [ids]})
+_celulas = {}          # célula de geohash da previsão -> [ids]
+_pendentes = set()
+_reindexar = False
+_estados = {}          # id -> {"valores", "disparados", "avaliado_em", "avaliado_em_ts"}
+_bairros = {}          # id -> bairro (não muda com o tempo; obtido uma vez por vigia)
+
+# Cópia em memória do final do log de eventos compartilhado (seq: o último lido)
+_eventos_cond = threading.Condition()
+_eventos = deque(maxlen=ALERTAS_HISTORICO)
+_seq = 0
+# Último seq lido antes de o log ser recriado: um `desde` até ele é de um log anterior
+_seq_log_anterior = 0
+# Funções chamadas (na thread dos alertas) quando chegam eventos, para assinantes que não esperam em _eventos_cond
+ouvintes = []
+
+# Conexão com o log de eventos, (pid, conexão): não é herdada por fork
+_banco = None
+_banco_lock = threading.Lock()
+
+_pid_alertas = None
+# Processo que detém a trava de avaliador e o arquivo dela, aberto enquanto ele vive
+_pid_avaliador = None
+_trava_avaliador = None
+
+
+def ler_vigias(corpo):
+    """
+    Lê os vigias de um corpo de requisição: um objeto ou uma lista de objetos
+    {"lat", "lon", "limites": {métrica: limite}} (com "id" opcional).
+    """
+    itens = corpo if isinstance(corpo, list) else [corpo]
+    vigias = []
+    for item in itens:
+        if not isinstance(item, dict):
+            raise ValueError("esperado um objeto com lat, lon e limites")
+        limites = item.get("limites")
+        if not isinstance(limites, dict) or not limites:
+            raise ValueError("informe ao menos um limite")
+        desconhecidas = [metrica for metrica in limites if metrica not in METRICAS]
+        if desconhecidas:
+            raise ValueError(f"métricas desconhecidas: {', '.join(desconhecidas)} (use {', '.join(METRICAS)})")
+        vigias.append({
+            "id": str(item.get("id") or uuid.uuid4().hex[:12]),
+            "lat": float(item["lat"]),
+            "lon": float(item["lon"]),
+            "limites": {metrica: float(limite) for metrica, limite in limites.items()},
+        })
+    return vigias
+
+
+def _alterar_arquivo(alterar):
+    """
+    Lê, altera e grava o arquivo dos vigias sob uma trava (workers diferentes não perdem alterações).
+    """
+    diretorio = os.path.dirname(ALERTAS_CAMINHO)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    with open(ALERTAS_CAMINHO + ".lock", "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            with open(ALERTAS_CAMINHO, encoding="utf-8") as f:
+                vigias = {vigia["id"]: vigia for vigia in json.load(f)["vigias"]}
+        except (OSError, ValueError):
+            vigias = {}
+        resultado = alterar(vigias)
+        temporario = f"{ALERTAS_CAMINHO}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"vigias": list(vigias.values())}, f, ensure_ascii=False)
+        os.replace(temporario, ALERTAS_CAMINHO)
+    recarregar()
+    return resultado
+
+
+def registrar(vigias):
+    """
+    Registra (ou substitui, pelo id) vigias; eles são avaliados na próxima rodada.
+    """
+    def alterar(registrados):
+        registrados.update({vigia["id"]: vigia for vigia in vigias})
+    _alterar_arquivo(alterar)
+    return vigias
+
+
+def remover(identificador):
+    """
+    Remove um vigia; devolve False se ele não existia.
+    """
+    return _alterar_arquivo(lambda registrados: registrados.pop(identificador, None) is not None)
+
+
+def _indexar_estacoes(destino, vigias):
+    """
+    Índice estação -> vigias a até ALERTAS_RAIO_KM, para a série atual do destino.
+    """
+    motor = getattr(sheets, SERIES[destino]).motor
+    por_estacao = {}
+    if vigias and len(motor):
+        distancias = motor.distancias([v["lat"] for v in vigias], [v["lon"] for v in vigias])
+        ids = np.array([v["id"] for v in vigias], dtype=object)
+        for posicao in np.flatnonzero((distancias <= ALERTAS_RAIO_KM).any(axis=0)):
+            por_estacao[motor.codigos[posicao]] = ids[distancias[:, posicao] <= ALERTAS_RAIO_KM].tolist()
+    return motor, por_estacao
+
+
+def recarregar():
+    """
+    Relê os vigias se o arquivo mudou: os novos (ou alterados) ficam pendentes e os índices são refeitos.
+    """
+    global _vigias, _mtime_vigias, _indice, _celulas
+    try:
+        mtime = os.stat(ALERTAS_CAMINHO).st_mtime_ns
+    except OSError:
+        return
+    if mtime == _mtime_vigias:
+        return
+    with open(ALERTAS_CAMINHO, encoding="utf-8") as f:
+        vigias = {vigia["id"]: vigia for vigia in json.load(f)["vigias"]}
+
+    avaliador = _avaliador()
+    celulas = {}
+    for vigia in vigias.values():
+        celulas.setdefault(geohash(vigia["lat"], vigia["lon"], PREVISAO_GEOHASH_PRECISAO), []).append(vigia["id"])
+    # Os índices só servem para escolher quem reavaliar, o que só o avaliador faz
+    indice = {destino: _indexar_estacoes(destino, list(vigias.values())) for destino in SERIES} if avaliador else {}
+
+    with _lock:
+        alterados = {identificador for identificador, vigia in vigias.items() if _vigias.get(identificador) != vigia}
+        removidos = set(_vigias) - set(vigias)
+        for identificador in removidos:
+            _estados.pop(identificador, None)
+            _bairros.pop(identificador, None)
+        for identificador in alterados:
+            anterior = _vigias.get(identificador)
+            _estados.pop(identificador, None)
+            if anterior is None or (anterior["lat"], anterior["lon"]) != (vigias[identificador]["lat"], vigias[identificador]["lon"]):
+                _bairros.pop(identificador, None)
+        _vigias, _mtime_vigias, _indice, _celulas = vigias, mtime, indice, celulas
+        if avaliador:
+            _pendentes.update(alterados)
+            _pendentes_cond.notify()
+    if avaliador and (removidos or alterados):
+        with _banco_lock:
+            conexao = _conexao()
+            with conexao:
+                conexao.executemany("DELETE FROM estados WHERE id = ?", [(identificador,) for identificador in removidos | alterados])
+
+
+def medidas_recebidas(destino, codigos):
+    """
+    Marca como pendentes os vigias próximos das estações que receberam medidas novas.
+    """
+    global _reindexar
+    if not _avaliador() or not _vigias:
+        return
+    with _lock:
+        motor, por_estacao = _indice.get(destino, (None, {}))
+        afetados = {identificador for codigo in set(codigos) for identificador in por_estacao.get(codigo, ())}
+        # Estações novas entraram na série: o índice é refeito na thread de avaliação
+        _reindexar = _reindexar or motor is not getattr(sheets, SERIES[destino]).motor
+        _pendentes.update(afetados)
+        _pendentes_cond.notify()
+
+
+def _previsoes_vencidas(agora):
+    """
+    Vigias das células cuja previsão foi usada há mais de PREVISAO_CACHE_TTL segundos (a próxima consulta busca outra).
+    """
+    vencidos = set()
+    for ids in _celulas.values():
+        avaliados = [_estados[identificador]["avaliado_em_ts"] for identificador in ids if identificador in _estados]
+        if avaliados and agora - min(avaliados) >= PREVISAO_CACHE_TTL:
+            vencidos.update(ids)
+    return vencidos
+
+
+def _conexao():
+    """
+    Conexão deste processo com o log de eventos e os estados dos vigias (chamada com _banco_lock).
+    """
+    global _banco
+    if _banco is None or _banco[0] != os.getpid():
+        diretorio = os.path.dirname(ALERTAS_EVENTOS_CAMINHO)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        conexao = sqlite3.connect(ALERTAS_EVENTOS_CAMINHO, timeout=5, check_same_thread=False)
+        # WAL: os workers leem enquanto o avaliador grava
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("CREATE TABLE IF NOT EXISTS eventos (seq INTEGER PRIMARY KEY AUTOINCREMENT, evento TEXT NOT NULL)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS estados (id TEXT PRIMARY KEY, estado TEXT NOT NULL)")
+        conexao.commit()
+        _banco = (os.getpid(), conexao)
+    return _banco[1]
+
+
+def _publicar(eventos):
+    """
+    Acrescenta os eventos ao log compartilhado (que mantém os últimos ALERTAS_HISTORICO) e os entrega neste worker.
+    """
+    if not eventos:
+        return
+    with _banco_lock:
+        conexao = _conexao()
+        with conexao:
+            conexao.executemany("INSERT INTO eventos (evento) VALUES (?)", [(json.dumps(evento, ensure_ascii=False),) for evento in eventos])
+            conexao.execute("DELETE FROM eventos WHERE seq <= (SELECT MAX(seq) FROM eventos) - ?", (ALERTAS_HISTORICO,))
+    _ler_eventos()
+
+
+def _ler_eventos():
+    """
+    Copia os eventos novos do log para o histórico em memória e avisa quem espera por eles.
+    """
+    global _seq, _seq_log_anterior
+    with _banco_lock:
+        conexao = _conexao()
+        linhas = conexao.execute("SELECT seq, evento FROM eventos WHERE seq > ? ORDER BY seq", (_seq,)).fetchall()
+        # Log recriado (arquivo apagado): a sequência recomeçou abaixo da lida
+        recriado = not linhas and (conexao.execute("SELECT MAX(seq) FROM eventos").fetchone()[0] or 0) < _seq
+    if not linhas and not recriado:
+        return
+    with _eventos_cond:
+        if recriado:
+            _eventos.clear()
+            _seq_log_anterior, _seq = _seq, 0
+        for seq, evento in linhas:
+            _eventos.append({"seq": seq, **json.loads(evento)})
+            _seq = seq
+        _eventos_cond.notify_all()
+    for ouvinte in ouvintes:
+        ouvinte()
+
+
+def _gravar_estados(ids):
+    with _lock:
+        estados = [(identificador, json.dumps(_estados[identificador])) for identificador in ids if identificador in _estados]
+    with _banco_lock:
+        conexao = _conexao()
+        with conexao:
+            conexao.executemany("INSERT OR REPLACE INTO estados VALUES (?, ?)", estados)
+
+
+def _estados_gravados():
+    """
+    Estados dos vigias gravados pelo avaliador (id -> estado), lidos em qualquer worker.
+    """
+    with _banco_lock:
+        linhas = _conexao().execute("SELECT id, estado FROM estados").fetchall()
+    return {identificador: json.loads(estado) for identificador, estado in linhas}
+
+
+def avaliar(ids, data_atual=None):
+    """
+    Avalia os vigias em lote e publica um evento para cada limite que mudou de estado.
+
+    Returns:
+        list: Os eventos publicados.
+    """
+    data_atual = data_atual if data_atual is not None else pd.Timestamp(datetime.now())
+    with _lock:
+        vigias = [_vigias[identificador] for identificador in sorted(ids) if identificador in _vigias]
+
+    eventos = []
+    for inicio in range(0, len(vigias), PREDICT_LOTE_MAX):
+        eventos += _avaliar_lote(vigias[inicio:inicio + PREDICT_LOTE_MAX], data_atual)
+    _gravar_estados([vigia["id"] for vigia in vigias])
+    _publicar(eventos)
+    return eventos
+
+
+def _niveis_risco(predicoes):
+    """
+    Classes previstas como números comparáveis aos limites de "risco".
+
+    Rótulos numéricos valem o próprio valor; outros (ex.: "baixo", "alto") valem a
+    posição em model.classes_, a ordem das classes do modelo. Sem como ordená-los,
+    o risco fica sem dado (as demais métricas são avaliadas normalmente).
+    """
+    predicoes = np.asarray(predicoes)
+    try:
+        return predicoes.astype(float)
+    except (TypeError, ValueError):
+        pass
+    classes = getattr(modelo.model, "classes_", None)
+    if classes is None:
+        logger.warning("Classes do modelo não numéricas e sem classes_: limites de risco não avaliados.")
+        return np.full(len(predicoes), np.nan)
+    posicoes = {classe: posicao for posicao, classe in enumerate(classes)}
+    return np.array([posicoes.get(predicao, np.nan) for predicao in predicoes], dtype=float)
+
+
+def _avaliar_lote(vigias, data_atual):
+    sem_bairro = [vigia for vigia in vigias if vigia["id"] not in _bairros]
+    futuros_bairros = [upstream.executor_geocodificacao.submit(get_neighbourhood, v["lat"], v["lon"], shapefiles.indice_bairros) for v in sem_bairro]
+    futuros_previsoes = [upstream.executor.submit(get_weather_forecast_24h, v["lat"], v["lon"]) for v in vigias]
+    for vigia, futuro in zip(sem_bairro, futuros_bairros):
+        bairro = upstream.resultado(futuro, "geocodificacao")
+        if bairro is not None:
+            _bairros[vigia["id"]] = bairro
+    previsoes = [upstream.resultado(futuro, "previsao") for futuro in futuros_previsoes]
+    com_previsao = [previsao is not None for previsao in previsoes]
+
+    with metricas.medir("features", pipeline="alertas"):
+        features = montar_features(
+            [v["lat"] for v in vigias], [v["lon"] for v in vigias], data_atual,
+            [_bairros.get(v["id"]) for v in vigias],
+            [previsao or {"chuva_24h": np.nan, "intensidade_max_24h": np.nan} for previsao in previsoes],
+            shapefiles.indice_trechos, shapefiles.indice_relevo, sheets.serie_pluviometrica, sheets.serie_hidrologica,
+            grade.grade
+        )
+    risco = np.full(len(vigias), np.nan)
+    usa_risco = np.array([ok and "risco" in v["limites"] for v, ok in zip(vigias, com_previsao)])
+    if usa_risco.any():
+        with metricas.medir("modelo", pipeline="alertas"):
+            risco[usa_risco] = _niveis_risco(prever(features[usa_risco]))
+
+    agora = time.time()
+    eventos = []
+    for i, vigia in enumerate(vigias):
+        valores = {metrica: features[metrica].iloc[i] for metrica in METRICAS if metrica != "risco"}
+        valores["risco"] = risco[i]
+        valores = {metrica: (None if pd.isna(valor) else float(valor)) for metrica, valor in valores.items()}
+
+        with _lock:
+            estado = _estados.setdefault(vigia["id"], {"disparados": {}})
+            for metrica, limite in vigia["limites"].items():
+                valor = valores[metrica]
+                if valor is None:
+                    continue  # sem dado (estação fora do raio ou previsão indisponível): o estado anterior é mantido
+                disparado = valor >= limite
+                if disparado != estado["disparados"].get(metrica, False):
+                    eventos.append({
+                        "tipo": "alerta" if disparado else "normalizado",
+                        "id": vigia["id"], "lat": vigia["lat"], "lon": vigia["lon"],
+                        "metrica": metrica, "valor": valor, "limite": limite,
+                        "datahora": data_atual.isoformat(),
+                    })
+                estado["disparados"][metrica] = disparado
+            estado.update(valores=valores, avaliado_em=data_atual.isoformat(), avaliado_em_ts=agora)
+
+    metricas.incrementar("alertas_avaliacoes_total", "Vigias avaliados pelo motor de alertas.", len(vigias))
+    for evento in eventos:
+        metricas.incrementar("alertas_eventos_total", "Eventos publicados pelo motor de alertas.", tipo=evento["tipo"], metrica=evento["metrica"])
+    return eventos
+
+
+def _rodada():
+    global _reindexar
+    with _lock:
+        _pendentes_cond.wait_for(lambda: _pendentes or _reindexar, timeout=ALERTAS_INTERVALO)
+        ids = set(_pendentes)
+        _pendentes.clear()
+        reindexar, _reindexar = _reindexar, False
+    recarregar()
+    if reindexar:
+        vigias = list(_vigias.values())
+        indice = {destino: _indexar_estacoes(destino, vigias) for destino in SERIES}
+        with _lock:
+            for destino, (motor, por_estacao) in indice.items():
+                # Vigias próximos das estações novas: as medidas delas ainda não foram consideradas
+                anteriores = _indice.get(destino, (None, {}))[1]
+                ids.update(i for codigo, vigias_estacao in por_estacao.items() if codigo not in anteriores for i in vigias_estacao)
+            _indice.update(indice)
+    ids |= _previsoes_vencidas(time.time())
+    if ids:
+        inicio = time.perf_counter()
+        eventos = avaliar(ids)
+        logger.info("Alertas: %d vigias avaliados em %.2fs, %d eventos", len(ids), time.perf_counter() - inicio, len(eventos))
+
+
+def _avaliador():
+    return _pid_avaliador == os.getpid()
+
+
+def _eleger():
+    """
+    Tenta obter a trava de avaliador; quem a obtém retoma os estados gravados e reavalia todos os vigias.
+
+    Returns:
+        bool: Se este processo passou a ser o avaliador.
+    """
+    global _pid_avaliador, _trava_avaliador, _mtime_vigias
+    diretorio = os.path.dirname(ALERTAS_CAMINHO)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    trava = open(ALERTAS_CAMINHO + ".avaliador.lock", "w")
+    try:
+        fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        trava.close()
+        return False
+    # Vigias atuais lidos antes de assumir: os estados gravados valem para eles
+    recarregar()
+    # A trava fica com o processo: é liberada pelo sistema quando ele termina
+    _trava_avaliador, _pid_avaliador = trava, os.getpid()
+    estados = _estados_gravados()
+    with _lock:
+        _estados.clear()
+        _estados.update({identificador: estado for identificador, estado in estados.items() if identificador in _vigias})
+        # Relê os vigias para montar os índices, que só o avaliador mantém
+        _mtime_vigias = None
+    recarregar()
+    with _lock:
+        # Medidas que chegaram sem avaliador: os estados gravados evitam repetir eventos já publicados
+        _pendentes.update(_vigias)
+        _pendentes_cond.notify()
+    logger.info("Alertas: este worker (pid %d) passou a avaliar os vigias.", os.getpid())
+    return True
+
+
+def _avaliar_continuamente():
+    while True:
+        try:
+            if _avaliador() or _eleger():
+                _rodada()
+            else:
+                time.sleep(ALERTAS_LEITURA_INTERVALO)
+                _ler_eventos()
+        except Exception as e:
+            logger.exception("Erro na avaliação dos alertas: %s", e)
+            time.sleep(ALERTAS_INTERVALO)
+
+
+def iniciar():
+    """
+    Inicia a avaliação dos alertas neste processo (uma vez por processo).
+    """
+    global _pid_alertas
+    if ALERTAS_INTERVALO <= 0 or _pid_alertas == os.getpid():
+        return
+    with _lock:
+        if _pid_alertas == os.getpid():
+            return
+        _pid_alertas = os.getpid()
+        _pendentes.clear()
+    # Histórico já gravado lido antes da primeira consulta (depois, a thread o mantém em dia)
+    try:
+        _ler_eventos()
+    except Exception as e:
+        logger.error("Erro ao ler o log de eventos dos alertas: %s", e)
+    threading.Thread(target=_avaliar_continuamente, name="alertas", daemon=True).start()
+
+
+def ativo():
+    return _pid_alertas == os.getpid()
+
+
+def ultimo_seq(ler=True):
+    """
+    Seq do último evento; com ler=False, só o da cópia em memória (sem E/S, para o laço de eventos do ASGI).
+    """
+    if ler:
+        _ler_eventos()
+    with _eventos_cond:
+        return _seq
+
+
+def aguardar(desde, espera, ids=None, ler=True):
+    """
+    Eventos com seq maior que `desde` (dos vigias `ids`, se dados), esperando até `espera` segundos pelo primeiro.
+
+    Com ler=False, só a cópia em memória é consultada, sem tocar no log (a thread dos alertas a mantém
+    em dia): é o modo do laço de eventos do ASGI, que não pode esperar por uma gravação no SQLite.
+
+    Returns:
+        tuple: (eventos, seq até onde o histórico foi lido), para a próxima chamada continuar dali.
+    """
+    limite = time.monotonic() + espera
+    if ler and desde > _seq:
+        # Seq que este worker ainda não leu do log
+        _ler_eventos()
+    with _eventos_cond:
+        if _seq < desde <= _seq_log_anterior:
+            # seq de um log anterior (arquivo recriado): recomeça do histórico atual
+            desde = 0
+        while True:
+            eventos = [evento for evento in _eventos if evento["seq"] > desde and (ids is None or evento["id"] in ids)]
+            restante = limite - time.monotonic()
+            if eventos or restante <= 0:
+                # Um `desde` à frente da cópia (eventos ainda não lidos do log) é mantido para a próxima chamada
+                return eventos, max(_seq, desde)
+            # Eventos de outros vigias não interessam a este assinante: continua a partir deles
+            desde = max(_seq, desde)
+            _eventos_cond.wait(restante)
+
+
+def ler_ids(args):
+    """
+    Vigias do filtro ?ids=a,b de uma consulta aos eventos (None: todos).
+    """
+    ids = args.get("ids")
+    return set(ids.split(",")) if ids else None
+
+
+def listar():
+    """
+    Vigias com os últimos valores avaliados e os limites atingidos.
+    """
+    recarregar()
+    estados = _estados_gravados()
+    with _lock:
+        return [
+            {**vigia, **{chave: valor for chave, valor in estados.get(identificador, {}).items() if chave != "avaliado_em_ts"}}
+            for identificador, vigia in _vigias.items()
+        ]
+
+
+def estatisticas():
+    estados = _estados_gravados()
+    with _lock:
+        resumo = {
+            "ativo": ativo(),
+            "avaliador": _avaliador(),
+            "vigias": len(_vigias),
+            "pendentes": len(_pendentes),
+            "disparados": sum(any(estado["disparados"].values()) for identificador, estado in estados.items() if identificador in _vigias),
+        }
+    resumo["ultimo_seq"] = ultimo_seq()
+    return resumo
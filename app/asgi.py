@@ -0,0 +1,445 @@
+"""
+Modo de serviço assíncrono (ASGI) das rotas da API.
+
+As rotas continuam as de create_app: cada requisição roda no pool de
+ASGI_WORKERS threads (o cálculo das features e a espera pelos serviços
+externos) e o laço de eventos só distribui o trabalho. O que este modo
+acrescenta é o controle da carga:
+- cada rota tem um limite de requisições simultâneas (ASGI_LIMITES, ou
+  ASGI_LIMITE_PADRAO) e uma fila de até ASGI_FILA_MAX requisições esperando
+  vaga, cada uma por no máximo ASGI_ESPERA_MAX segundos;
+- acima delas, um limite global de admissão (ASGI_ADMISSAO_MAX, nunca mais
+  que as threads do pool) com fila própria (ASGI_ADMISSAO_FILA_MAX): o pool
+  não acumula trabalho que nenhuma thread vai pegar a tempo;
+- com uma fila cheia ou a espera vencida, a requisição é descartada na hora:
+  com ASGI_DEGRADADO, as rotas com cache de respostas devolvem a resposta já
+  guardada para o ponto (em /predict, também a predição agendada), marcada
+  com X-Degraded; sem ela, 503 com Retry-After. Num pico de chuva os
+  clientes recebem uma resposta rápida em vez de esperar numa fila até o
+  timeout;
+- os eventos de alerta (GET /alerts/stream e o long-poll de GET /alerts) são
+  atendidos no próprio laço: cada assinante conectado é uma corrotina à
+  espera de um asyncio.Event, sem ocupar uma thread do pool.
+
+Uso: SERVIDOR=asgi python run.py (no uvicorn) ou uvicorn app.asgi:app.
+"""
+import asyncio
+import functools
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from werkzeug.exceptions import HTTPException
+
+from .config import (
+    ASGI_WORKERS, ASGI_LIMITES, ASGI_LIMITE_PADRAO, ASGI_FILA_MAX, ASGI_ESPERA_MAX, ASGI_ADMISSAO_MAX, ASGI_ADMISSAO_FILA_MAX,
+    ASGI_RETRY_AFTER, ASGI_DEGRADADO, ALERTAS_ESPERA_MAX
+)
+from . import ingestao, agendamento, alertas, metricas, respostas
+from .snapshots import atributos_preguicosos
+
+logger = logging.getLogger(__name__)
+
+# Rotas atendidas no laço de eventos (endpoint -> método de AplicacaoASGI)
+_NATIVAS = {"alerts": "_alertas", "alerts_stream": "_alertas_stream"}
+
+
+def ler_limites(texto):
+    """
+    Limites por rota de "rota=n,rota=n" (ASGI_LIMITES).
+    """
+    limites = {}
+    for item in texto.split(","):
+        if item.strip():
+            rota, _, limite = item.partition("=")
+            limites[rota.strip()] = int(limite)
+    return limites
+
+
+class _Limite:
+    """
+    Vagas de execução (de uma rota ou do pool inteiro) e a fila de quem espera por elas.
+    """
+
+    def __init__(self, limite, fila_max):
+        self.limite = limite
+        self.fila_max = fila_max
+        self.semaforo = asyncio.Semaphore(limite)
+        self.na_fila = 0
+        self.em_execucao = 0
+
+    async def obter(self, espera_max):
+        """
+        Espera uma vaga por até `espera_max` segundos.
+
+        Returns:
+            str | None: None com a vaga obtida, ou o motivo do descarte ("fila_cheia" ou "espera_vencida").
+        """
+        if not self.semaforo.locked():
+            await self.semaforo.acquire()
+            return None
+        if self.na_fila >= self.fila_max:
+            return "fila_cheia"
+        self.na_fila += 1
+        try:
+            await asyncio.wait_for(self.semaforo.acquire(), max(espera_max, 0))
+        except asyncio.TimeoutError:
+            return "espera_vencida"
+        finally:
+            self.na_fila -= 1
+        return None
+
+
+def _environ(scope, corpo):
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(servidor[0]),
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": cliente[0] if cliente else "",
+        "CONTENT_LENGTH": str(len(corpo)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(corpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for nome, valor in scope.get("headers", []):
+        nome = nome.decode("latin-1").upper().replace("-", "_")
+        valor = valor.decode("latin-1")
+        if nome == "CONTENT_LENGTH":
+            continue
+        chave = nome if nome == "CONTENT_TYPE" else "HTTP_" + nome
+        environ[chave] = f"{environ[chave]},{valor}" if chave in environ else valor
+    return environ
+
+
+def _cabecalhos(pares):
+    return [(nome.lower().encode("latin-1"), str(valor).encode("latin-1")) for nome, valor in pares]
+
+
+class AplicacaoASGI:
+    """
+    Aplicação ASGI sobre o app Flask de create_app, com limites por rota e descarte de carga.
+    """
+
+    def __init__(self, flask_app, workers=ASGI_WORKERS, limites=None, limite_padrao=ASGI_LIMITE_PADRAO,
+                 fila_max=ASGI_FILA_MAX, espera_max=ASGI_ESPERA_MAX, degradado=ASGI_DEGRADADO,
+                 admissao_max=ASGI_ADMISSAO_MAX, admissao_fila_max=ASGI_ADMISSAO_FILA_MAX):
+        self.flask_app = flask_app
+        self.rotas = flask_app.url_map.bind("localhost")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asgi")
+        self.fila_max = fila_max
+        self.limites = {rota: _Limite(limite, fila_max) for rota, limite in (limites if limites is not None else ler_limites(ASGI_LIMITES)).items()}
+        self.limite_padrao = limite_padrao
+        # Vagas no pool inteiro: mais que as threads só formaria fila dentro do executor
+        self.admissao = _Limite(min(admissao_max, workers), admissao_fila_max)
+        self.espera_max = espera_max
+        self.degradado = degradado
+        self._laco = None
+        self._sinal_alertas = None
+
+        metricas.registrar_medidor("asgi_fila", "Requisições esperando vaga, por rota (modo ASGI).",
+                                   lambda: [({"rota": rota}, limite.na_fila) for rota, limite in list(self.limites.items())])
+        metricas.registrar_medidor("asgi_em_execucao", "Requisições em execução no pool, por rota (modo ASGI).",
+                                   lambda: [({"rota": rota}, limite.em_execucao) for rota, limite in list(self.limites.items())])
+        metricas.registrar_medidor("asgi_admissao_fila", "Requisições esperando vaga no pool (modo ASGI).",
+                                   lambda: [({}, self.admissao.na_fila)])
+        metricas.registrar_medidor("asgi_admissao_em_execucao", "Requisições ocupando o pool (modo ASGI).",
+                                   lambda: [({}, self.admissao.em_execucao)])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            self._preparar()
+            await self._http(scope, receive, send)
+
+    def _preparar(self):
+        if self._laco is not None:
+            return
+        self._laco = asyncio.get_running_loop()
+        self._sinal_alertas = asyncio.Event()
+        alertas.ouvintes.append(self._avisar_alertas)
+        ingestao.iniciar()
+        agendamento.iniciar()
+        alertas.iniciar()
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                self._preparar()
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                if self._avisar_alertas in alertas.ouvintes:
+                    alertas.ouvintes.remove(self._avisar_alertas)
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _limite(self, rota):
+        limite = self.limites.get(rota)
+        if limite is None:
+            limite = self.limites[rota] = _Limite(self.limite_padrao, self.fila_max)
+        return limite
+
+    async def _responder(self, send, rota, inicio, status, corpo, cabecalhos=()):
+        if isinstance(corpo, str):
+            corpo = corpo.encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": _cabecalhos(cabecalhos) + [(b"content-length", str(len(corpo)).encode())]})
+        await send({"type": "http.response.body", "body": corpo})
+        # Mesmas métricas que o after_request do Flask registra nas rotas que passam por ele
+        metricas.incrementar("http_requisicoes_total", "Requisições HTTP por rota e status.", rota=rota, status=status)
+        metricas.observar("http_duracao_segundos", "Duração das requisições HTTP por rota.", time.perf_counter() - inicio, rota=rota)
+
+    async def _responder_json(self, send, rota, inicio, status, dados, cabecalhos=()):
+        corpo = json.dumps(dados, ensure_ascii=False)
+        await self._responder(send, rota, inicio, status, corpo, [("Content-Type", "application/json"), *cabecalhos])
+
+    async def _http(self, scope, receive, send):
+        inicio = time.perf_counter()
+        try:
+            regra, argumentos = self.rotas.match(scope["path"], scope["method"], return_rule=True)
+            rota, endpoint = regra.rule, regra.endpoint
+        except HTTPException:
+            # 404, 405 e redirecionamentos ficam com o Flask
+            rota, endpoint = "desconhecida", None
+
+        nativa = _NATIVAS.get(endpoint)
+        if nativa is not None and scope["method"] in ("GET", "HEAD"):
+            await getattr(self, nativa)(scope, receive, send, rota, inicio)
+            return
+
+        corpo = bytearray()
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "http.disconnect":
+                return
+            corpo += mensagem.get("body", b"")
+            if not mensagem.get("more_body", False):
+                break
+
+        # Vaga na rota e depois no pool, as duas dentro de ASGI_ESPERA_MAX
+        limite = self._limite(rota)
+        motivo = await limite.obter(self.espera_max)
+        if motivo is not None:
+            await self._descartar(scope, send, rota, endpoint, inicio, motivo)
+            return
+        try:
+            motivo = await self.admissao.obter(self.espera_max - (time.perf_counter() - inicio))
+        except BaseException:
+            limite.semaforo.release()
+            raise
+        if motivo is not None:
+            limite.semaforo.release()
+            await self._descartar(scope, send, rota, endpoint, inicio, "admissao_" + motivo)
+            return
+        metricas.observar("asgi_espera_segundos", "Espera por vaga na rota antes da execução (modo ASGI).", time.perf_counter() - inicio, rota=rota)
+
+        # As vagas valem enquanto a thread trabalha, não enquanto um cliente lento recebe a resposta
+        limite.em_execucao += 1
+        self.admissao.em_execucao += 1
+
+        def liberar(_):
+            limite.em_execucao -= 1
+            self.admissao.em_execucao -= 1
+            self.admissao.semaforo.release()
+            limite.semaforo.release()
+
+        fila = asyncio.Queue()
+        cancelada = threading.Event()
+        entregar = functools.partial(self._laco.call_soon_threadsafe, fila.put_nowait)
+        execucao = self._laco.run_in_executor(self.executor, self._executar, _environ(scope, bytes(corpo)), entregar, cancelada)
+        execucao.add_done_callback(liberar)
+        try:
+            while (mensagem := await fila.get()) is not None:
+                await send(mensagem)
+        except BaseException:
+            # Cliente desconectado ou requisição cancelada: a thread para na próxima parte
+            cancelada.set()
+            raise
+        await execucao
+
+    def _executar(self, environ, entregar, cancelada):
+        """
+        Roda a requisição no app Flask (numa thread do pool) e entrega a resposta ao laço parte a parte.
+
+        O corpo é consumido aqui mesmo: respostas com stream_with_context (/predict/batch)
+        precisam ser lidas na thread que as criou. Cada parte vai para o laço assim que é
+        gerada (em /predict/batch, um sub-lote por vez), com more_body; None marca o fim.
+        """
+        resposta = {}
+
+        def start_response(status, cabecalhos, exc_info=None):
+            resposta["inicio"] = {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                                  "headers": _cabecalhos(cabecalhos)}
+            return lambda parte: enviar(parte, True)
+
+        def enviar(parte, mais):
+            # start_response pode vir só junto da primeira parte do corpo (PEP 3333)
+            inicio = resposta.pop("inicio", None)
+            if inicio is not None:
+                entregar(inicio)
+            if parte or not mais:
+                entregar({"type": "http.response.body", "body": bytes(parte), "more_body": mais})
+
+        try:
+            iteravel = self.flask_app(environ, start_response)
+            try:
+                for parte in iteravel:
+                    if cancelada.is_set():
+                        return
+                    enviar(parte, True)
+            finally:
+                if hasattr(iteravel, "close"):
+                    iteravel.close()
+            enviar(b"", False)
+        finally:
+            entregar(None)
+
+    async def _descartar(self, scope, send, rota, endpoint, inicio, motivo):
+        """
+        Resposta imediata de uma requisição sem vaga: a guardada para o ponto (ASGI_DEGRADADO) ou 503.
+        """
+        item = self._degradada(scope, endpoint) if self.degradado else None
+        metricas.incrementar("asgi_descartadas_total", "Requisições descartadas por falta de vaga (modo ASGI).",
+                             rota=rota, motivo=motivo, resposta="degradada" if item is not None else "503")
+        if item is not None:
+            corpo, mimetype, cabecalhos = item
+            await self._responder(send, rota, inicio, 200, corpo, [("Content-Type", mimetype), *cabecalhos])
+            return
+        await self._responder_json(send, rota, inicio, 503, {"error": "Servidor sobrecarregado, tente novamente em instantes"},
+                                   [("Retry-After", ASGI_RETRY_AFTER)])
+
+    def _degradada(self, scope, endpoint):
+        if endpoint is None or scope["method"] != "GET":
+            return None
+        if not getattr(self.flask_app.view_functions.get(endpoint), "em_cache", False):
+            return None
+        consulta = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            lat, lon = float(consulta["lat"][0]), float(consulta["lon"][0])
+        except (KeyError, ValueError):
+            return None
+
+        # A predição agendada antes do cache, como na rota: um ponto do arquivo não recebe a resposta da célula
+        if endpoint == "predict":
+            agendada = agendamento.consultar(lat, lon)
+            if agendada is not None:
+                corpo = json.dumps({"prediction": [agendada["prediction"]]})
+                return corpo, "application/json", [("X-Prediction-Computed-At", agendada["calculado_em"]), ("X-Degraded", "agendada")]
+        # Só a memória deste processo: o laço de eventos não espera pelo backend compartilhado
+        item = respostas.guardada(endpoint, lat, lon, compartilhado=False)
+        if item is not None:
+            cabecalhos = [*item["cabecalhos"].items(), ("ETag", f'"{item["etag"]}"'), ("X-Degraded", "cache")]
+            return item["corpo"], item["mimetype"], cabecalhos
+        return None
+
+    def _avisar_alertas(self):
+        # Chamado na thread de avaliação dos alertas a cada publicação
+        try:
+            self._laco.call_soon_threadsafe(self._renovar_sinal)
+        except RuntimeError:
+            # Laço já encerrado
+            pass
+
+    def _renovar_sinal(self):
+        sinal, self._sinal_alertas = self._sinal_alertas, asyncio.Event()
+        sinal.set()
+
+    async def _aguardar_alertas(self, desde, espera, ids, desconexao=None):
+        """
+        Versão assíncrona de alertas.aguardar: espera no laço, sem bloquear uma thread.
+        """
+        limite = self._laco.time() + espera
+        while True:
+            sinal = self._sinal_alertas
+            eventos, ultimo = alertas.aguardar(desde, 0, ids, ler=False)
+            restante = limite - self._laco.time()
+            if eventos or restante <= 0:
+                return eventos, ultimo
+            desde = ultimo
+            espera_sinal = asyncio.ensure_future(sinal.wait())
+            aguardados = {espera_sinal} | ({desconexao} if desconexao is not None else set())
+            await asyncio.wait(aguardados, timeout=restante, return_when=asyncio.FIRST_COMPLETED)
+            espera_sinal.cancel()
+            if desconexao is not None and desconexao.done():
+                return [], ultimo
+
+    async def _aguardar_desconexao(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def _alertas(self, scope, receive, send, rota, inicio):
+        if not alertas.ativo():
+            await self._responder_json(send, rota, inicio, 503, {"error": "Alertas desativados (ALERTAS_INTERVALO=0)"})
+            return
+        consulta = {nome: valores[0] for nome, valores in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        try:
+            desde = int(consulta.get("desde", 0))
+            espera = min(float(consulta.get("espera", ALERTAS_ESPERA_MAX)), ALERTAS_ESPERA_MAX) if "desde" in consulta else 0
+        except ValueError:
+            await self._responder_json(send, rota, inicio, 400, {"error": "desde e espera devem ser numeros"})
+            return
+        eventos, ultimo = await self._aguardar_alertas(desde, espera, alertas.ler_ids(consulta))
+        await self._responder_json(send, rota, inicio, 200, {"eventos": eventos, "ultimo": ultimo})
+
+    async def _alertas_stream(self, scope, receive, send, rota, inicio):
+        if not alertas.ativo():
+            await self._responder_json(send, rota, inicio, 503, {"error": "Alertas desativados (ALERTAS_INTERVALO=0)"})
+            return
+        consulta = {nome: valores[0] for nome, valores in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+        cabecalhos = dict(scope.get("headers", []))
+        try:
+            desde = int(cabecalhos.get(b"last-event-id", b"").decode("latin-1") or consulta.get("desde") or alertas.ultimo_seq(ler=False))
+        except ValueError:
+            await self._responder_json(send, rota, inicio, 400, {"error": "desde deve ser um numero"})
+            return
+        ids = alertas.ler_ids(consulta)
+
+        await send({"type": "http.response.start", "status": 200, "headers": _cabecalhos([
+            ("Content-Type", "text/event-stream; charset=utf-8"), ("Cache-Control", "no-cache"), ("X-Accel-Buffering", "no"),
+        ])})
+        metricas.incrementar("http_requisicoes_total", "Requisições HTTP por rota e status.", rota=rota, status=200)
+        desconexao = asyncio.ensure_future(self._aguardar_desconexao(receive))
+        try:
+            await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+            ultimo = desde
+            while not desconexao.done():
+                eventos, ultimo = await self._aguardar_alertas(ultimo, ALERTAS_ESPERA_MAX, ids, desconexao)
+                if desconexao.done():
+                    break
+                # Comentário a cada espera sem eventos: mantém a conexão aberta em proxies
+                texto = "".join(
+                    f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+                    for evento in eventos
+                ) or ": keep-alive\n\n"
+                await send({"type": "http.response.body", "body": texto.encode("utf-8"), "more_body": True})
+        except OSError:
+            # Cliente desconectado no meio de um envio
+            pass
+        finally:
+            desconexao.cancel()
+
+
+def _criar_app():
+    from . import create_app
+    return {"app": AplicacaoASGI(create_app())}
+
+
+# `uvicorn app.asgi:app`: o app Flask só é criado no primeiro acesso
+__getattr__ = atributos_preguicosos(globals(), {"app": _criar_app})
@@ -0,0 +1,234 @@
+"""
+Cálculo em lote das features de eventos históricos (treino e backtesting do modelo).
+
+Lê um arquivo de eventos (CSV ou Parquet com lat, lon e data/hora; as
+demais colunas são mantidas na saída) e calcula, para cada evento, o mesmo
+vetor de features que /predict monta, na ordem de model.feature_names_in_:
+- a data de referência é a do evento, não o momento atual;
+- no lugar da previsão do OpenWeather entra a chuva observada nas 24 horas
+  seguintes (chuva_24h) e o maior acumulado em 3 horas delas
+  (intensidade_max_24h), interpolados (IDW) dos pluviômetros;
+- as features estáticas são calculadas nos índices espaciais (sem a grade);
+- o bairro vem da coluna "bairro" do arquivo, se houver, ou da geocodificação
+  (GEOCODIFICACAO_MODO; com o Nominatim, o intervalo entre chamadas vale
+  para o conjunto dos processos).
+
+Os eventos são divididos em blocos processados num pool de processos, que
+herdam por fork as séries e os índices carregados antes. Cada bloco pronto
+vira um arquivo Parquet em `saida/` (um dataset lido com
+pd.read_parquet(saida)) e entra no checkpoint `saida/_progresso.json`; uma
+execução interrompida continua dos blocos que faltam.
+
+Uso:
+    python -m app.backfill eventos.csv saida/ [--processos N] [--bloco 1000]
+        [--pluviometricas a.csv b.csv ...] [--hidrologicas c.csv ...]
+
+Sem --pluviometricas/--hidrologicas, usa as séries das planilhas de SHEETS
+(que precisam cobrir as datas dos eventos, e os 30 dias anteriores).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import model as modelo, shapefiles, sheets, upstream, ingestao
+from .predicao import montar_features
+from .series import SerieMedidas
+from .snapshots import assinatura
+from .utils import chuva_idw_janelas, get_neighbourhood
+
+COLUNAS_LAT = ["lat", "latitude"]
+COLUNAS_LON = ["lon", "longitude"]
+COLUNAS_DATA = ["datahora", "data", "data_evento"]
+
+
+def ler_eventos(caminho):
+    """
+    Eventos do arquivo, com as colunas padronizadas lat, lon e datahora (linhas inválidas são descartadas).
+    """
+    if caminho.endswith(".parquet"):
+        eventos = pd.read_parquet(caminho)
+    else:
+        with open(caminho, encoding="utf-8") as f:
+            cabecalho = f.readline()
+        eventos = pd.read_csv(caminho, sep=";" if ";" in cabecalho else ",")
+
+    def coluna(opcoes):
+        for opcao in opcoes:
+            if opcao in eventos.columns:
+                return opcao
+        raise ValueError(f"coluna ausente no arquivo de eventos (uma de: {', '.join(opcoes)})")
+
+    eventos = eventos.rename(columns={coluna(COLUNAS_LAT): "lat", coluna(COLUNAS_LON): "lon", coluna(COLUNAS_DATA): "datahora"})
+    eventos["lat"] = pd.to_numeric(eventos["lat"], errors="coerce")
+    eventos["lon"] = pd.to_numeric(eventos["lon"], errors="coerce")
+    eventos["datahora"] = pd.to_datetime(eventos["datahora"], errors="coerce")
+    validos = eventos[["lat", "lon", "datahora"]].notna().all(axis=1)
+    if not validos.all():
+        print(f"{(~validos).sum()} eventos sem lat, lon ou data válidos foram ignorados.")
+    return eventos[validos].reset_index(drop=True)
+
+
+def chuva_observada(lats, lons, datahora, serie_pluviometrica):
+    """
+    Chuva observada nas 24 horas seguintes a `datahora`, no formato da previsão de get_weather_forecast_24h.
+
+    Returns:
+        list: Um dicionário por ponto, com chuva_24h e intensidade_max_24h (maior acumulado em 3 horas).
+    """
+    janelas = [
+        (datahora + pd.Timedelta(hours=3 * i), datahora + pd.Timedelta(hours=3 * (i + 1)) - pd.Timedelta(seconds=1))
+        for i in range(8)
+    ]
+    chuva_3h = chuva_idw_janelas(lats, lons, janelas, serie_pluviometrica, None)
+    return [
+        {"chuva_24h": float(np.sum(linha)), "intensidade_max_24h": float(np.max(linha))}
+        for linha in chuva_3h
+    ]
+
+
+def calcular_bloco(eventos, colunas=None):
+    """
+    Features de um bloco de eventos, um grupo de mesma data/hora por vez (passadas vetorizadas).
+
+    Returns:
+        DataFrame: As colunas do arquivo de eventos seguidas das features (na ordem de `colunas`, se dada).
+    """
+    partes = []
+    for datahora, grupo in eventos.groupby("datahora", sort=True):
+        lats = grupo["lat"].to_numpy(dtype=float)
+        lons = grupo["lon"].to_numpy(dtype=float)
+        if "bairro" in grupo.columns:
+            bairros = grupo["bairro"].tolist()
+        else:
+            bairros = [get_neighbourhood(lat, lon, shapefiles.indice_bairros) for lat, lon in zip(lats, lons)]
+        features = montar_features(
+            lats, lons, datahora, bairros, chuva_observada(lats, lons, datahora, sheets.serie_pluviometrica),
+            shapefiles.indice_trechos, shapefiles.indice_relevo, sheets.serie_pluviometrica, sheets.serie_hidrologica
+        )
+        features.index = grupo.index
+        partes.append(features)
+
+    features = pd.concat(partes).loc[eventos.index]
+    if colunas is not None:
+        features = features.reindex(columns=colunas)
+    originais = eventos.drop(columns=[coluna for coluna in features.columns if coluna in eventos.columns])
+    return pd.concat([originais, features], axis=1)
+
+
+def _ler_serie(caminhos, destino):
+    medidas = pd.concat([bloco for caminho in caminhos for bloco in ingestao.ler_blocos(caminho, destino)], ignore_index=True)
+    estacoes = medidas[["codEstacao", "latitude", "longitude", "nomeEstacao"]].drop_duplicates("codEstacao").reset_index(drop=True)
+    return SerieMedidas(medidas, estacoes, sensor=ingestao.DESTINOS[destino][1])
+
+
+def _colunas_modelo():
+    try:
+        return list(modelo.model.feature_names_in_)
+    except FileNotFoundError:
+        print("Modelo não encontrado: as features saem na ordem de montar_features.")
+        return None
+
+
+def _gravar_json(caminho, dados):
+    temporario = os.path.join(os.path.dirname(caminho), "." + os.path.basename(caminho) + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def _calcular(argumentos):
+    numero, eventos, colunas = argumentos
+    return numero, calcular_bloco(eventos, colunas)
+
+
+def _iniciar_processo(processos):
+    # Fora da API ninguém espera a resposta: cada geocodificação aguarda a sua vez, sem desistir
+    upstream.limitador_nominatim.espera_max = float("inf")
+    if not upstream.limitador_nominatim.caminho:
+        # Sem o arquivo compartilhado (NOMINATIM_LIMITE_CAMINHO), o limite de cada processo é dividido entre eles
+        upstream.limitador_nominatim.intervalo_min *= processos
+
+
+def backfill(caminho_eventos, saida, processos=None, tamanho_bloco=1000, pluviometricas=None, hidrologicas=None):
+    """
+    Calcula as features de todos os eventos que ainda não estão em `saida`, gravando um Parquet por bloco.
+    """
+    processos = processos or os.cpu_count()
+    os.makedirs(saida, exist_ok=True)
+    # Arquivos iniciados por "_" ou "." ficam fora do dataset lido pelo pyarrow
+    caminho_progresso = os.path.join(saida, "_progresso.json")
+
+    eventos = ler_eventos(caminho_eventos)
+    blocos = [eventos.iloc[i:i + tamanho_bloco] for i in range(0, len(eventos), tamanho_bloco)]
+    progresso = {
+        "eventos": os.path.abspath(caminho_eventos),
+        "assinatura": assinatura(caminho_eventos),
+        "bloco": tamanho_bloco,
+        "blocos": len(blocos),
+        "concluidos": [],
+    }
+    if os.path.exists(caminho_progresso):
+        with open(caminho_progresso, encoding="utf-8") as f:
+            anterior = json.load(f)
+        if any(anterior.get(chave) != progresso[chave] for chave in ("assinatura", "bloco", "blocos")):
+            raise SystemExit(f"{saida} tem um backfill de outro arquivo de eventos ou tamanho de bloco; use outra saída.")
+        progresso["concluidos"] = anterior["concluidos"]
+
+    concluidos = set(progresso["concluidos"])
+    pendentes = [
+        numero for numero in range(len(blocos))
+        if numero not in concluidos or not os.path.exists(os.path.join(saida, f"parte_{numero:05d}.parquet"))
+    ]
+    print(f"{len(eventos)} eventos em {len(blocos)} blocos; {len(pendentes)} a calcular com {processos} processos.")
+    if not pendentes:
+        return
+
+    # Tudo é carregado antes do fork: os processos do pool herdam as séries e os índices
+    if pluviometricas:
+        sheets.serie_pluviometrica = _ler_serie(pluviometricas, "pluviometros")
+    if hidrologicas:
+        sheets.serie_hidrologica = _ler_serie(hidrologicas, "hidrologicas")
+    sheets.carregar_tudo()
+    shapefiles.carregar_tudo()
+    colunas = _colunas_modelo()
+
+    inicio = time.perf_counter()
+    calculados = 0
+    contexto = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto, initializer=_iniciar_processo, initargs=(processos,)) as pool:
+        futuros = [pool.submit(_calcular, (numero, blocos[numero], colunas)) for numero in pendentes]
+        for futuro in as_completed(futuros):
+            numero, resultado = futuro.result()
+            caminho = os.path.join(saida, f"parte_{numero:05d}.parquet")
+            temporario = os.path.join(saida, f".parte_{numero:05d}.parquet.tmp")
+            resultado.to_parquet(temporario, index=False)
+            os.replace(temporario, caminho)
+
+            concluidos.add(numero)
+            progresso["concluidos"] = sorted(concluidos)
+            _gravar_json(caminho_progresso, progresso)
+
+            calculados += len(resultado)
+            decorrido = time.perf_counter() - inicio
+            taxa = calculados / decorrido
+            restantes = sum(len(blocos[n]) for n in pendentes if n not in concluidos)
+            print(f"{len(concluidos)}/{len(blocos)} blocos, {calculados} eventos em {decorrido:.1f}s "
+                  f"({taxa:.0f} eventos/s, faltam ~{restantes / taxa:.0f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Features de eventos históricos para treino e backtesting.")
+    parser.add_argument("eventos", help="CSV ou Parquet com lat, lon e data/hora de cada evento")
+    parser.add_argument("saida", help="diretório dos arquivos Parquet e do checkpoint")
+    parser.add_argument("--processos", type=int, default=None, help="padrão: um por núcleo")
+    parser.add_argument("--bloco", type=int, default=1000, help="eventos por bloco (unidade de checkpoint)")
+    parser.add_argument("--pluviometricas", nargs="+", help="planilhas CEMADEN de chuva no lugar da de SHEETS")
+    parser.add_argument("--hidrologicas", nargs="+", help="planilhas CEMADEN de nível no lugar da de SHEETS")
+    argumentos = parser.parse_args()
+    backfill(argumentos.eventos, argumentos.saida, argumentos.processos, argumentos.bloco, argumentos.pluviometricas, argumentos.hidrologicas)
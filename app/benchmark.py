@@ -0,0 +1,394 @@
+"""
+Benchmark reprodutível das funções de features e da rota /predict.
+
+Gera dados sintéticos (estações pluviométricas e hidrológicas com medidas
+horárias, trechos inundáveis e unidades de relevo) numa escala configurável,
+troca as chamadas ao OpenWeather e ao Nominatim por respostas fixas, desliga
+o cache de respostas e mede, com a mesma sequência de pontos em toda execução
+(semente fixa; o aquecimento usa outros pontos):
+chuva_idw, consecutive_rainy_days, obter_nivel_rio_proximo,
+analyze_floodable_sections, analyze_local_relief, /predict de ponta a ponta
+(pelo test client do Flask) e o modelo (pipeline contra a inferência
+compilada, com uma linha e em lotes, conferindo a paridade). O resultado é um JSON com vazão e percentis de
+latência, para comparar commits:
+
+    python -m app.benchmark --escala media --saida bench.json
+    python -m app.benchmark --escala media --comparar bench.json
+
+Os dados do diretório data/ não são usados; o modelo é um pipeline sintético
+com as mesmas features, a menos que --modelo aponte para um modelo real.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import geopandas as gpd
+import joblib
+import numpy as np
+import pandas as pd
+import shapely
+import sklearn
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from .config import RELEVO_CACHE_TAMANHO, RELEVO_CACHE_PRECISAO
+from . import create_app, model as modelo, shapefiles, sheets, grade, upstream, utils, ingestao, agendamento, respostas
+from .cache import CacheDisco
+from .indices import IndiceTrechos, IndiceRelevo
+from .medidas import tipar
+from .predicao import montar_features
+from .series import SerieMedidas
+from .utils import chuva_idw, consecutive_rainy_days, obter_nivel_rio_proximo, analyze_floodable_sections, analyze_local_relief
+
+VERSAO = 1
+
+# Retângulo do município de São Paulo (lon_min, lat_min, lon_max, lat_max)
+LIMITES = (-46.83, -23.75, -46.36, -23.36)
+
+# Estações, dias de medidas horárias, trechos, unidades de relevo e iterações por benchmark
+ESCALAS = {
+    "pequena": {"estacoes": 50, "dias": 30, "trechos": 2000, "relevo": 1000, "iteracoes": 200},
+    "media": {"estacoes": 200, "dias": 35, "trechos": 10000, "relevo": 5000, "iteracoes": 500},
+    "grande": {"estacoes": 1000, "dias": 35, "trechos": 50000, "relevo": 20000, "iteracoes": 1000},
+}
+
+CLASSES_RISCO = np.array(["Baixo", "Médio", "Alto"], dtype=object)
+COLUNAS_CATEGORICAS = ["data_evento", "bairro", "NIVEL_1", "GEOL_CPRM", "GEOL_rev"]
+BAIRROS = ["Sé", "Mooca", "Lapa", "Pinheiros", "Butantã", "Santana", "Penha", "Ipiranga", "Jabaquara", "Itaquera"]
+
+
+def _pontos(gerador, n):
+    lon_min, lat_min, lon_max, lat_max = LIMITES
+    return gerador.uniform(lat_min, lat_max, n), gerador.uniform(lon_min, lon_max, n)
+
+
+def gerar_medidas(gerador, estacoes, dias, fim, sensor):
+    """
+    Medidas horárias de `estacoes` estações nos `dias` anteriores a `fim`, nas tabelas tipadas de app/medidas.py.
+
+    Chuva: ~30% das horas com chuva (exponencial, média 2 mm); nível: passeio aleatório em torno de 2 m.
+    """
+    lats, lons = _pontos(gerador, estacoes)
+    codigos = np.array([f"{sensor[:3].upper()}{i:05d}" for i in range(estacoes)], dtype=object)
+    datahoras = pd.date_range(end=fim, periods=dias * 24, freq="h")
+
+    if sensor == "chuva":
+        valores = np.where(gerador.random((estacoes, len(datahoras))) < 0.3, gerador.exponential(2.0, (estacoes, len(datahoras))), 0.0)
+    else:
+        valores = 2.0 + np.cumsum(gerador.normal(0, 0.02, (estacoes, len(datahoras))), axis=1)
+
+    tabelas = tipar(pd.DataFrame({
+        "codEstacao": np.repeat(codigos, len(datahoras)),
+        "latitude": np.repeat(lats, len(datahoras)),
+        "longitude": np.repeat(lons, len(datahoras)),
+        "nomeEstacao": np.repeat(codigos, len(datahoras)),
+        "datahora": np.tile(datahoras, estacoes),
+        "sensor": sensor,
+        "valorMedida": valores.ravel().round(2),
+    }))
+    return tabelas["medidas"], tabelas["estacoes"]
+
+
+def gerar_trechos(gerador, n):
+    """
+    Trechos inundáveis: linhas curtas (~200 m) com classes de frequência, impacto e vulnerabilidade.
+    """
+    lats, lons = _pontos(gerador, n)
+    vertices = gerador.integers(2, 6, n)
+    geometrias = []
+    for lat, lon, k in zip(lats, lons, vertices):
+        passos = gerador.normal(0, 0.001, (k - 1, 2)).cumsum(axis=0)
+        geometrias.append(shapely.LineString(np.vstack([[lon, lat], [lon, lat] + passos])))
+    return gpd.GeoDataFrame({
+        "Frequencia": CLASSES_RISCO[gerador.integers(0, 3, n)],
+        "Impacto": CLASSES_RISCO[gerador.integers(0, 3, n)],
+        "Vulnerabil": CLASSES_RISCO[gerador.integers(0, 3, n)],
+    }, geometry=geometrias, crs="EPSG:4326")
+
+
+def gerar_relevo(gerador, n):
+    """
+    Unidades de relevo: cerca de `n` quadrados cobrindo LIMITES, com os atributos de COLUNAS_RELEVO.
+    """
+    lon_min, lat_min, lon_max, lat_max = LIMITES
+    lado = max(int(np.sqrt(n)), 1)
+    xs = np.linspace(lon_min, lon_max, lado + 1)
+    ys = np.linspace(lat_min, lat_max, lado + 1)
+    geometrias = [shapely.box(xs[j], ys[i], xs[j + 1], ys[i + 1]) for i in range(lado) for j in range(lado)]
+    total = len(geometrias)
+    return gpd.GeoDataFrame({
+        "NIVEL_1": np.array(["Planalto", "Colinas", "Várzea", "Morros"], dtype=object)[gerador.integers(0, 4, total)],
+        "DECLIV_MED": gerador.uniform(0, 30, total).round(2),
+        "AMPLIT_ALT": gerador.uniform(5, 200, total).round(1),
+        "DDREN_MED": gerador.uniform(0.5, 5, total).round(2),
+        "E_HIDR_MED": gerador.uniform(0, 1, total).round(3),
+        "GEOL_CPRM": np.array([f"G{i}" for i in range(12)], dtype=object)[gerador.integers(0, 12, total)],
+        "GEOL_rev": np.array([f"R{i}" for i in range(6)], dtype=object)[gerador.integers(0, 6, total)],
+    }, geometry=geometrias, crs="EPSG:4326")
+
+
+def _get_json_falso(url, params=None, headers=None):
+    """
+    Respostas fixas no lugar do OpenWeather e do Nominatim (sem rede, mesmo resultado a cada execução).
+    """
+    lat, lon = float(params["lat"]), float(params["lon"])
+    if "format" in params:
+        return {"address": {"suburb": BAIRROS[int(abs(lat * 1000 + lon * 1000)) % len(BAIRROS)]}}
+    return {"list": [{"dt": i * 10800, "rain": {"3h": round(abs(np.sin(lat * 100 + lon * 100 + i)) * 3, 2)}} for i in range(8)]}
+
+
+def modelo_sintetico(features, semente):
+    """
+    Pipeline com o mesmo formato do modelo da aplicação (one-hot + imputação + floresta aleatória).
+    """
+    numericas = [coluna for coluna in features.columns if coluna not in COLUNAS_CATEGORICAS]
+    pipeline = Pipeline([
+        ("pre", ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), COLUNAS_CATEGORICAS),
+            ("num", SimpleImputer(strategy="median"), numericas),
+        ])),
+        ("clf", RandomForestClassifier(n_estimators=50, random_state=semente)),
+    ])
+    rotulos = (features["chuva_72h"].fillna(0) + features["risco_medio_trechos_5km"] > features["chuva_72h"].median()).astype(int)
+    return pipeline.fit(features, rotulos)
+
+
+def preparar(parametros, semente, caminho_modelo=None):
+    """
+    Gera os dados sintéticos e os instala nos módulos da aplicação no lugar dos dados de data/.
+
+    Returns:
+        dict: Dados gerados (séries, índices e a data de referência).
+    """
+    gerador = np.random.default_rng(semente)
+    fim = pd.Timestamp("2025-09-30 23:00")
+
+    medidas_chuva, estacoes_chuva = gerar_medidas(gerador, parametros["estacoes"], parametros["dias"], fim, "chuva")
+    medidas_nivel, estacoes_nivel = gerar_medidas(gerador, max(parametros["estacoes"] // 5, 1), parametros["dias"], fim, "nível")
+    dados = {
+        "data_atual": fim.normalize() + pd.Timedelta(hours=12),
+        "serie_pluviometrica": SerieMedidas(medidas_chuva, estacoes_chuva),
+        "serie_hidrologica": SerieMedidas(medidas_nivel, estacoes_nivel, sensor="nível"),
+        "indice_trechos": IndiceTrechos(gerar_trechos(gerador, parametros["trechos"])),
+        "indice_relevo": IndiceRelevo(gerar_relevo(gerador, parametros["relevo"]), tamanho_cache=RELEVO_CACHE_TAMANHO, precisao_cache=RELEVO_CACHE_PRECISAO),
+    }
+
+    # Os atributos preguiçosos definidos aqui não são mais carregados dos arquivos
+    vars(shapefiles).update(indice_trechos=dados["indice_trechos"], indice_relevo=dados["indice_relevo"], indice_bairros=None)
+    vars(sheets).update(serie_pluviometrica=dados["serie_pluviometrica"], serie_hidrologica=dados["serie_hidrologica"])
+    vars(grade).update(grade=None)
+
+    # Sem rede, sem espera entre chamadas ao Nominatim e sem tarefas em segundo plano
+    upstream.get_json = _get_json_falso
+    upstream.limitador_nominatim.intervalo_min = 0
+    utils.cache_nominatim = CacheDisco(os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "nominatim.sqlite"))
+    utils.cache_previsoes.limpar()
+    ingestao.INGESTAO_INTERVALO = 0
+    agendamento.PREVISAO_AGENDADA_INTERVALO = 0
+    # Sem cache de respostas: /predict é medido calculando cada ponto, não devolvendo a resposta da célula
+    respostas.RESPOSTAS_CACHE_JANELA = 0
+    respostas.cache_respostas.limpar()
+
+    # Features de pontos sorteados: treino do modelo sintético e entrada dos benchmarks do modelo
+    lats, lons = _pontos(gerador, 2000)
+    previsoes = [{"chuva_24h": float(chuva), "intensidade_max_24h": float(chuva) / 4} for chuva in gerador.exponential(5.0, len(lats))]
+    bairros = [BAIRROS[i] for i in gerador.integers(0, len(BAIRROS), len(lats))]
+    dados["features"] = montar_features(
+        lats, lons, dados["data_atual"], bairros, previsoes,
+        dados["indice_trechos"], dados["indice_relevo"], dados["serie_pluviometrica"], dados["serie_hidrologica"]
+    )
+    modelo.model = joblib.load(caminho_modelo) if caminho_modelo else modelo_sintetico(dados["features"], semente)
+    vars(modelo).pop("inferencia", None)
+    return dados
+
+
+def medir(funcao, argumentos, aquecimento):
+    """
+    Chama `funcao(*args)` para cada item de `argumentos` e resume as latências.
+
+    Antes da medição, `funcao` é chamada com cada item de `aquecimento`, que não
+    deve repetir os de `argumentos` (os caches aquecidos não entram na medição).
+    """
+    for args in aquecimento:
+        funcao(*args)
+
+    duracoes = np.empty(len(argumentos))
+    inicio_total = time.perf_counter()
+    for i, args in enumerate(argumentos):
+        inicio = time.perf_counter()
+        funcao(*args)
+        duracoes[i] = time.perf_counter() - inicio
+    total = time.perf_counter() - inicio_total
+
+    ms = duracoes * 1000
+    return {
+        "iteracoes": len(argumentos),
+        "total_s": round(total, 6),
+        "vazao_por_s": round(len(argumentos) / total, 2),
+        "media_ms": round(float(ms.mean()), 4),
+        "min_ms": round(float(ms.min()), 4),
+        **{f"p{p}_ms": round(float(np.percentile(ms, p)), 4) for p in (50, 90, 95, 99)},
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def _predict(cliente, lat, lon):
+    resposta = cliente.get(f"/predict?lat={lat}&lon={lon}")
+    if resposta.status_code != 200:
+        raise RuntimeError(f"/predict respondeu {resposta.status_code}: {resposta.get_data(as_text=True)}")
+
+
+def _por_linha(resultado, linhas):
+    resultado["linhas_por_chamada"] = linhas
+    resultado["por_linha_ms"] = round(resultado["media_ms"] / linhas, 5)
+    return resultado
+
+
+def medir_modelo(features, iteracoes, tamanho_lote=256):
+    """
+    Pipeline do scikit-learn (DataFrame) contra a inferência compilada, em chamadas de uma linha e em lotes.
+    """
+    inferencia = modelo.inferencia
+    colunas = list(modelo.model.feature_names_in_)
+    features = features.reindex(columns=colunas)
+    linhas = [{coluna: features[coluna].iloc[i] for coluna in colunas} for i in range(min(iteracoes, len(features)))]
+    # Aquecimento com as linhas seguintes às medidas (ou as últimas, se todas forem medidas)
+    aquecimento = [({coluna: features[coluna].iloc[i] for coluna in colunas},) for i in range(len(features))[len(linhas):][:10] or range(len(features))[-10:]]
+    lotes = [(features.iloc[i:i + tamanho_lote],) for i in range(0, len(features) - tamanho_lote + 1, tamanho_lote)]
+
+    resultados = {
+        "modelo_pipeline_1": _por_linha(medir(lambda linha: modelo.model.predict(pd.DataFrame([linha], columns=colunas)), [(linha,) for linha in linhas], aquecimento), 1),
+        "modelo_compilado_1": _por_linha(medir(inferencia.prever_linha, [(linha,) for linha in linhas], aquecimento), 1),
+        "modelo_pipeline_lote": _por_linha(medir(lambda lote: modelo.model.predict(lote), lotes, lotes[:1]), tamanho_lote),
+        "modelo_compilado_lote": _por_linha(medir(inferencia.prever, lotes, lotes[:1]), tamanho_lote),
+    }
+    esperado = modelo.model.predict(features)
+    paridade = bool(
+        np.array_equal(esperado, inferencia.prever(features))
+        and all(np.array_equal(esperado[i:i + 1], inferencia.prever_linha(linha)) for i, linha in enumerate(linhas))
+    )
+    for nome in ("modelo_compilado_1", "modelo_compilado_lote"):
+        resultados[nome]["compilado"] = inferencia.compilado
+        resultados[nome]["paridade"] = paridade
+    return resultados
+
+
+def executar(parametros, semente=0, caminho_modelo=None, apenas=None):
+    """
+    Roda todos os benchmarks (ou só os de `apenas`) e devolve o relatório.
+    """
+    inicio = time.perf_counter()
+    dados = preparar(parametros, semente, caminho_modelo)
+    tempo_preparo = time.perf_counter() - inicio
+
+    data_atual = dados["data_atual"]
+    inicio_dia = data_atual.normalize()
+    fim_dia = inicio_dia + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    lats, lons = _pontos(np.random.default_rng(semente + 1), parametros["iteracoes"])
+    pontos = list(zip(lats.tolist(), lons.tolist()))
+    # Pontos do aquecimento sorteados à parte: não aquecem os caches dos pontos medidos
+    lats, lons = _pontos(np.random.default_rng(semente + 2), min(20, parametros["iteracoes"]))
+    pontos_aquecimento = list(zip(lats.tolist(), lons.tolist()))
+    cliente = create_app().test_client()
+
+    # Nome -> (função, argumentos da chamada num ponto)
+    benchmarks = {
+        "chuva_idw": (chuva_idw, lambda lat, lon: (lat, lon, data_atual - pd.Timedelta(hours=24), data_atual, dados["serie_pluviometrica"], None)),
+        "consecutive_rainy_days": (consecutive_rainy_days, lambda lat, lon: (lat, lon, data_atual, dados["serie_pluviometrica"], None)),
+        "obter_nivel_rio_proximo": (obter_nivel_rio_proximo, lambda lat, lon: (lat, lon, inicio_dia, fim_dia, dados["serie_hidrologica"], None)),
+        "analyze_floodable_sections": (analyze_floodable_sections, lambda lat, lon: (lat, lon, dados["indice_trechos"])),
+        "analyze_local_relief": (analyze_local_relief, lambda lat, lon: (lat, lon, dados["indice_relevo"])),
+        "predict": (lambda lat, lon: _predict(cliente, lat, lon), lambda lat, lon: (lat, lon)),
+    }
+
+    resultados = {}
+    for nome, (funcao, argumentos) in benchmarks.items():
+        if apenas and nome not in apenas:
+            continue
+        resultados[nome] = medir(funcao, [argumentos(*ponto) for ponto in pontos], [argumentos(*ponto) for ponto in pontos_aquecimento])
+    if not apenas or "modelo" in apenas:
+        resultados.update(medir_modelo(dados["features"], parametros["iteracoes"]))
+
+    return {
+        "versao": VERSAO,
+        "commit": _commit(),
+        "data": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "shapely": shapely.__version__,
+            "sklearn": sklearn.__version__,
+        },
+        "parametros": {**parametros, "semente": semente, "modelo": caminho_modelo or "sintetico"},
+        "preparo_s": round(tempo_preparo, 3),
+        "resultados": resultados,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    """
+    Linhas de texto com a variação da mediana e do p95 de cada benchmark em relação a um relatório anterior.
+    """
+    linhas = [f"{'benchmark':<28}{'p50 antes':>11}{'p50 agora':>11}{'var.':>9}{'p95 antes':>11}{'p95 agora':>11}{'var.':>9}"]
+    for nome, resultado in atual["resultados"].items():
+        base = anterior.get("resultados", {}).get(nome)
+        if base is None:
+            continue
+        variacoes = [resultado[chave] / base[chave] - 1 if base[chave] else float("nan") for chave in ("p50_ms", "p95_ms")]
+        linhas.append(
+            f"{nome:<28}{base['p50_ms']:>11.3f}{resultado['p50_ms']:>11.3f}{variacoes[0]:>+9.1%}"
+            f"{base['p95_ms']:>11.3f}{resultado['p95_ms']:>11.3f}{variacoes[1]:>+9.1%}"
+        )
+    return linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das funções de features e de /predict com dados sintéticos.")
+    parser.add_argument("--escala", choices=ESCALAS, default="pequena")
+    for nome in ESCALAS["pequena"]:
+        parser.add_argument(f"--{nome}", type=int, help=f"sobrescreve '{nome}' da escala")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--modelo", help="modelo (joblib) no lugar do pipeline sintético")
+    parser.add_argument("--apenas", nargs="+", help="roda só estes benchmarks")
+    parser.add_argument("--saida", help="arquivo JSON do relatório (padrão: stdout)")
+    parser.add_argument("--comparar", help="relatório JSON anterior para comparar")
+    argumentos = parser.parse_args()
+
+    parametros = dict(ESCALAS[argumentos.escala])
+    parametros.update({nome: getattr(argumentos, nome) for nome in parametros if getattr(argumentos, nome) is not None})
+    parametros["escala"] = argumentos.escala
+
+    relatorio = executar(parametros, argumentos.semente, argumentos.modelo, argumentos.apenas)
+
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+    if argumentos.comparar:
+        with open(argumentos.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        print("\n".join(comparar(relatorio, anterior)), file=sys.stderr)
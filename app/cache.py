@@ -0,0 +1,316 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lon, precisao=5):
+    """
+    Codifica uma coordenada como geohash (precisão 5 ~ 4,9 km x 4,9 km; 6 ~ 1,2 km x 0,6 km).
+    """
+    intervalo_lat = [-90.0, 90.0]
+    intervalo_lon = [-180.0, 180.0]
+    caracteres = []
+    bits, bit, par = 0, 0, True
+    while len(caracteres) < precisao:
+        intervalo, valor = (intervalo_lon, lon) if par else (intervalo_lat, lat)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        if valor >= meio:
+            bits = (bits << 1) | 1
+            intervalo[0] = meio
+        else:
+            bits <<= 1
+            intervalo[1] = meio
+        par = not par
+        bit += 1
+        if bit == 5:
+            caracteres.append(_BASE32[bits])
+            bits, bit = 0, 0
+    return "".join(caracteres)
+
+
+def centro_geohash(codigo):
+    """
+    Coordenada (lat, lon) do centro da célula de um geohash.
+    """
+    intervalo_lat = [-90.0, 90.0]
+    intervalo_lon = [-180.0, 180.0]
+    par = True
+    for caractere in codigo:
+        valor = _BASE32.index(caractere)
+        for deslocamento in range(4, -1, -1):
+            intervalo = intervalo_lon if par else intervalo_lat
+            meio = (intervalo[0] + intervalo[1]) / 2
+            if (valor >> deslocamento) & 1:
+                intervalo[0] = meio
+            else:
+                intervalo[1] = meio
+            par = not par
+    return (intervalo_lat[0] + intervalo_lat[1]) / 2, (intervalo_lon[0] + intervalo_lon[1]) / 2
+
+
+def celulas_geohash(limites, precisao):
+    """
+    Geohashes das células cujos centros caem no retângulo (lon_min, lat_min, lon_max, lat_max).
+    """
+    lon_min, lat_min, lon_max, lat_max = limites
+    bits = 5 * precisao
+    passo_lon = 360.0 / 2 ** ((bits + 1) // 2)
+    passo_lat = 180.0 / 2 ** (bits // 2)
+
+    codigos = []
+    for i in range(int((lat_min + 90) // passo_lat), int((lat_max + 90) // passo_lat) + 1):
+        lat = -90 + (i + 0.5) * passo_lat
+        if not lat_min <= lat <= lat_max:
+            continue
+        for j in range(int((lon_min + 180) // passo_lon), int((lon_max + 180) // passo_lon) + 1):
+            lon = -180 + (j + 0.5) * passo_lon
+            if lon_min <= lon <= lon_max:
+                codigos.append(geohash(lat, lon, precisao))
+    return codigos
+
+
+class CacheTTL:
+    """
+    Cache em memória com expiração (TTL), despejo LRU e coalescência de chamadas.
+
+    Se várias threads pedem a mesma chave ausente ao mesmo tempo, só a primeira
+    calcula o valor; as demais esperam pelo mesmo resultado. Resultados None
+    (falhas) não são armazenados.
+    """
+
+    def __init__(self, tamanho_max, ttl_segundos, relogio=time.monotonic):
+        self.tamanho_max = tamanho_max
+        self.ttl_segundos = ttl_segundos
+        self.relogio = relogio
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self._em_andamento = {}      # chave -> Future
+        self._lock = threading.Lock()
+        self._contadores = {"hits": 0, "misses": 0, "coalescidas": 0, "expiradas": 0, "despejadas": 0}
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave):
+        """
+        Valor válido da chave, ou None (sem contar nas estatísticas).
+        """
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] <= self.relogio():
+                return None
+            return item[1]
+
+    def armazenar(self, chave, valor):
+        with self._lock:
+            self._armazenar(chave, valor)
+
+    def _armazenar(self, chave, valor):
+        self._itens[chave] = (self.relogio() + self.ttl_segundos, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.tamanho_max:
+            self._itens.popitem(last=False)
+            self._contadores["despejadas"] += 1
+
+    def obter_ou_calcular(self, chave, calcular):
+        """
+        Retorna o valor da chave, calculando-o com `calcular()` em caso de ausência ou expiração.
+        """
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                if item[0] > self.relogio():
+                    self._itens.move_to_end(chave)
+                    self._contadores["hits"] += 1
+                    return item[1]
+                del self._itens[chave]
+                self._contadores["expiradas"] += 1
+
+            futuro = self._em_andamento.get(chave)
+            if futuro is not None:
+                self._contadores["coalescidas"] += 1
+                responsavel = False
+            else:
+                futuro = Future()
+                self._em_andamento[chave] = futuro
+                self._contadores["misses"] += 1
+                responsavel = True
+
+        if not responsavel:
+            return futuro.result()
+
+        try:
+            valor = calcular()
+        except BaseException as e:
+            with self._lock:
+                del self._em_andamento[chave]
+            futuro.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._em_andamento[chave]
+            if valor is not None:
+                self._armazenar(chave, valor)
+        futuro.set_result(valor)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            estatisticas = dict(self._contadores)
+            estatisticas["tamanho"] = len(self._itens)
+        consultas = estatisticas["hits"] + estatisticas["misses"] + estatisticas["coalescidas"]
+        estatisticas["taxa_acerto"] = (estatisticas["hits"] + estatisticas["coalescidas"]) / consultas if consultas else 0.0
+        return estatisticas
+
+
+class CacheDisco:
+    """
+    Cache persistente chave -> valor (JSON) num arquivo SQLite, compartilhável entre processos.
+
+    A conexão é aberta no primeiro uso; `ttl_segundos=None` guarda os valores sem expiração.
+    """
+
+    def __init__(self, caminho, ttl_segundos=None):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos
+        self._conexao = None
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self.caminho, timeout=5, check_same_thread=False)
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, valor TEXT, expira_em REAL)")
+            self._conexao.commit()
+        return self._conexao
+
+    def obter(self, chave):
+        with self._lock:
+            linha = self._conectar().execute("SELECT valor, expira_em FROM cache WHERE chave = ?", (chave,)).fetchone()
+        if linha is None or (linha[1] is not None and linha[1] <= time.time()):
+            return None
+        return json.loads(linha[0])
+
+    def armazenar(self, chave, valor):
+        expira_em = time.time() + self.ttl_segundos if self.ttl_segundos is not None else None
+        with self._lock:
+            conexao = self._conectar()
+            conexao.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (chave, json.dumps(valor), expira_em))
+            conexao.commit()
+
+    def remover_expiradas(self):
+        """
+        Apaga as entradas vencidas (o arquivo não cresce com chaves que não serão mais lidas).
+        """
+        with self._lock:
+            conexao = self._conectar()
+            conexao.execute("DELETE FROM cache WHERE expira_em IS NOT NULL AND expira_em <= ?", (time.time(),))
+            conexao.commit()
+
+
+class CacheRedis:
+    """
+    Cache chave -> valor (JSON) num servidor compatível com Redis (Redis, Valkey, KeyDB...).
+
+    Fala o protocolo RESP diretamente (só GET e SET com EX), sem depender de
+    um cliente Redis; cada thread mantém a sua conexão. A expiração e o
+    despejo ficam a cargo do servidor (configure maxmemory/maxmemory-policy).
+    """
+
+    def __init__(self, url, ttl_segundos=None, prefixo="floodguard:", timeout=1.0):
+        partes = urlparse(url)
+        self.endereco = (partes.hostname or "localhost", partes.port or 6379)
+        self.senha = partes.password
+        self.banco = int(partes.path.lstrip("/") or 0)
+        self.ttl_segundos = ttl_segundos
+        self.prefixo = prefixo
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conectar(self):
+        conexao = socket.create_connection(self.endereco, timeout=self.timeout)
+        leitor = conexao.makefile("rb")
+        try:
+            if self.senha:
+                self._enviar(conexao, leitor, "AUTH", self.senha)
+            if self.banco:
+                self._enviar(conexao, leitor, "SELECT", str(self.banco))
+        except BaseException:
+            # AUTH ou SELECT recusados: a conexão não fica guardada
+            leitor.close()
+            conexao.close()
+            raise
+        return conexao, leitor
+
+    def _fechar(self):
+        conexao, leitor = getattr(self._local, "conexao", None), getattr(self._local, "leitor", None)
+        self._local.conexao = self._local.leitor = None
+        for recurso in (leitor, conexao):
+            if recurso is not None:
+                try:
+                    recurso.close()
+                except OSError:
+                    pass
+
+    def _comando(self, *partes):
+        if getattr(self._local, "conexao", None) is None:
+            self._local.conexao, self._local.leitor = self._conectar()
+        try:
+            return self._enviar(self._local.conexao, self._local.leitor, *partes)
+        except RuntimeError:
+            # Erro devolvido pelo servidor: a conexão continua em ordem
+            raise
+        except Exception:
+            # Conexão perdida, timeout ou resposta fora do protocolo: o que vier depois nela estaria
+            # fora de ordem, então ela é fechada e a próxima chamada reconecta
+            self._fechar()
+            raise
+
+    def _enviar(self, conexao, leitor, *partes):
+        dados = [f"*{len(partes)}\r\n".encode()]
+        for parte in partes:
+            parte = parte.encode() if isinstance(parte, str) else parte
+            dados.append(b"$%d\r\n%s\r\n" % (len(parte), parte))
+        conexao.sendall(b"".join(dados))
+        return self._resposta(leitor)
+
+    @staticmethod
+    def _resposta(leitor):
+        linha = leitor.readline()
+        if not linha.endswith(b"\r\n"):
+            raise ConnectionError("conexão fechada pelo servidor")
+        tipo, conteudo = linha[:1], linha[1:-2]
+        if tipo == b"-":
+            raise RuntimeError(conteudo.decode(errors="replace"))
+        if tipo == b"$":
+            tamanho = int(conteudo)
+            if tamanho < 0:
+                return None
+            dados = leitor.read(tamanho + 2)
+            if len(dados) != tamanho + 2 or not dados.endswith(b"\r\n"):
+                raise ConnectionError("resposta incompleta do servidor")
+            return dados[:-2]
+        if tipo == b":":
+            return int(conteudo)
+        if tipo == b"+":
+            return conteudo
+        raise ValueError(f"resposta inesperada do servidor: {linha[:40]!r}")
+
+    def obter(self, chave):
+        valor = self._comando("GET", self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def armazenar(self, chave, valor):
+        partes = ["SET", self.prefixo + chave, json.dumps(valor)]
+        if self.ttl_segundos is not None:
+            partes += ["EX", str(max(int(self.ttl_segundos), 1))]
+        self._comando(*partes)
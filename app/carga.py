@@ -0,0 +1,237 @@
+"""
+Teste de carga: vazão e latência de cauda do servidor Flask contra o modo ASGI, sob a mesma carga.
+
+Sobe cada modo (python run.py com SERVIDOR=flask e SERVIDOR=asgi, este no
+uvicorn, numa porta livre) ou usa os servidores já rodando de --url, e dispara por --duracao
+segundos --conexoes clientes simultâneos (conexões persistentes) contra
+--rota, com pontos sorteados entre --pontos coordenadas fixas na caixa de
+--limites (semente fixa: a mesma sequência nos dois modos). Cada requisição
+tem o timeout de um cliente (--timeout); a que estoura conta como timeout e
+a conexão é refeita.
+
+Para cada modo: respostas por segundo, p50/p95/p99/máximo da latência das
+respostas 200 (e de todas as respostas), e contagem de 200, degradadas
+(X-Degraded), 503, outros status, timeouts e erros de conexão. As variáveis
+de ambiente passam para os servidores: para simular a latência dos serviços
+externos, aponte OPENWEATHER_URL/NOMINATIM_URL para um servidor de teste lento.
+
+Uso:
+    python -m app.carga [--modos flask asgi] [--conexoes 64] [--duracao 20] [--rota /predict]
+        [--url flask=http://127.0.0.1:5000 ...] [--saida carga.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def subir(modo, porta, espera=180):
+    """
+    Inicia `python run.py` no modo dado e espera /status responder.
+    """
+    ambiente = {**os.environ, "SERVIDOR": modo, "SERVIDOR_HOST": "127.0.0.1", "SERVIDOR_PORTA": str(porta), "FLASK_DEBUG": "0"}
+    processo = subprocess.Popen([sys.executable, "run.py"], cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL)
+    limite = time.monotonic() + espera
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise SystemExit(f"o servidor {modo} terminou com código {processo.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{porta}/status", timeout=1).read()
+            return processo
+        except OSError:
+            time.sleep(0.5)
+    processo.kill()
+    raise SystemExit(f"o servidor {modo} não respondeu em {espera}s")
+
+
+async def _ler_resposta(leitor):
+    linha_status = await leitor.readline()
+    if not linha_status:
+        raise ConnectionResetError("conexão fechada pelo servidor")
+    status = int(linha_status.split(b" ", 2)[1])
+    cabecalhos = {}
+    while True:
+        linha = await leitor.readline()
+        if linha in (b"\r\n", b"\n", b""):
+            break
+        nome, _, valor = linha.decode("latin-1").partition(":")
+        cabecalhos[nome.strip().lower()] = valor.strip()
+
+    if "content-length" in cabecalhos:
+        await leitor.readexactly(int(cabecalhos["content-length"]))
+    elif cabecalhos.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            tamanho = int((await leitor.readline()).split(b";")[0], 16)
+            await leitor.readexactly(tamanho + 2)
+            if tamanho == 0:
+                break
+    else:
+        await leitor.read()
+        cabecalhos["connection"] = "close"
+    return status, cabecalhos
+
+
+async def _cliente(host, porta, caminhos, fim, timeout, resultados):
+    conexao = None
+    while time.monotonic() < fim:
+        caminho = next(caminhos)
+        inicio = time.perf_counter()
+        try:
+            if conexao is None:
+                conexao = await asyncio.wait_for(asyncio.open_connection(host, porta), timeout)
+            leitor, escritor = conexao
+            escritor.write(f"GET {caminho} HTTP/1.1\r\nHost: {host}:{porta}\r\n\r\n".encode("latin-1"))
+            status, cabecalhos = await asyncio.wait_for(_ler_resposta(leitor), timeout)
+        except asyncio.TimeoutError:
+            resultados["timeouts"] += 1
+            conexao = _fechar(conexao)
+            continue
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            resultados["erros"] += 1
+            conexao = _fechar(conexao)
+            await asyncio.sleep(0.05)
+            continue
+
+        latencia = time.perf_counter() - inicio
+        resultados["latencias"].append(latencia)
+        if "x-degraded" in cabecalhos:
+            resultados["degradadas"] += 1
+        elif status == 200:
+            resultados["latencias_200"].append(latencia)
+        resultados["status"][status] = resultados["status"].get(status, 0) + 1
+        if cabecalhos.get("connection", "").lower() == "close":
+            conexao = _fechar(conexao)
+
+
+def _fechar(conexao):
+    if conexao is not None:
+        conexao[1].close()
+    return None
+
+
+def _percentis(latencias):
+    if not latencias:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    valores = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(valores.max())}
+
+
+async def _disparar(url, caminhos, conexoes, duracao, timeout):
+    partes = urlsplit(url)
+    resultados = {"latencias": [], "latencias_200": [], "status": {}, "degradadas": 0, "timeouts": 0, "erros": 0}
+    inicio = time.monotonic()
+    fim = inicio + duracao
+    iteradores = [itertools.cycle(caminhos[i::conexoes]) for i in range(conexoes)]
+    await asyncio.gather(*(_cliente(partes.hostname, partes.port or 80, iterador, fim, timeout, resultados) for iterador in iteradores))
+    decorrido = time.monotonic() - inicio
+
+    status = resultados["status"]
+    return {
+        "requisicoes": len(resultados["latencias"]) + resultados["timeouts"] + resultados["erros"],
+        "respostas_por_s": len(resultados["latencias"]) / decorrido,
+        "ok_por_s": len(resultados["latencias_200"]) / decorrido,
+        "ok": len(resultados["latencias_200"]),
+        "degradadas": resultados["degradadas"],
+        "descartadas_503": status.get(503, 0),
+        "outros_status": {str(codigo): n for codigo, n in status.items() if codigo not in (200, 503)},
+        "timeouts": resultados["timeouts"],
+        "erros": resultados["erros"],
+        "latencia_ok": _percentis(resultados["latencias_200"]),
+        "latencia_todas": _percentis(resultados["latencias"]),
+    }
+
+
+def gerar_caminhos(rota, pontos, limites, total, semente=0):
+    """
+    Sequência de `total` caminhos da rota com lat e lon sorteados entre `pontos` coordenadas fixas.
+    """
+    aleatorio = random.Random(semente)
+    lat_min, lon_min, lat_max, lon_max = limites
+    coordenadas = [(aleatorio.uniform(lat_min, lat_max), aleatorio.uniform(lon_min, lon_max)) for _ in range(pontos)]
+    return [f"{rota}?lat={lat:.6f}&lon={lon:.6f}" for lat, lon in (aleatorio.choice(coordenadas) for _ in range(total))]
+
+
+def executar(modos, urls, rota, conexoes, duracao, aquecimento, timeout, pontos, limites, semente=0):
+    caminhos = gerar_caminhos(rota, pontos, limites, 200_000, semente)
+    relatorio = {"rota": rota, "conexoes": conexoes, "duracao_s": duracao, "timeout_s": timeout, "pontos": pontos, "modos": {}}
+    for modo in modos:
+        processo = None
+        url = urls.get(modo)
+        if url is None:
+            porta = _porta_livre()
+            print(f"Subindo o servidor {modo} na porta {porta}...", file=sys.stderr)
+            processo = subir(modo, porta)
+            url = f"http://127.0.0.1:{porta}"
+        try:
+            if aquecimento:
+                asyncio.run(_disparar(url, caminhos, min(conexoes, 4), aquecimento, timeout))
+            print(f"{modo}: {conexoes} conexões por {duracao}s em {url}{rota}", file=sys.stderr)
+            relatorio["modos"][modo] = asyncio.run(_disparar(url, caminhos, conexoes, duracao, timeout))
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait(10)
+    return relatorio
+
+
+def tabela(relatorio):
+    """
+    Linhas de texto comparando os modos do relatório.
+    """
+    def ms(valor):
+        return f"{valor:>9.1f}" if valor is not None else f"{'-':>9}"
+
+    linhas = [f"{'modo':<8}{'resp/s':>9}{'ok/s':>9}{'p50 ok':>9}{'p95 ok':>9}{'p99 ok':>9}{'p99 tod.':>9}"
+              f"{'degrad.':>9}{'503':>7}{'timeout':>9}{'erros':>7}"]
+    for modo, r in relatorio["modos"].items():
+        linhas.append(
+            f"{modo:<8}{r['respostas_por_s']:>9.1f}{r['ok_por_s']:>9.1f}{ms(r['latencia_ok']['p50_ms'])}{ms(r['latencia_ok']['p95_ms'])}"
+            f"{ms(r['latencia_ok']['p99_ms'])}{ms(r['latencia_todas']['p99_ms'])}{r['degradadas']:>9}{r['descartadas_503']:>7}"
+            f"{r['timeouts']:>9}{r['erros']:>7}"
+        )
+    return linhas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor Flask contra o modo ASGI.")
+    parser.add_argument("--modos", nargs="+", choices=["flask", "asgi"], default=["flask", "asgi"])
+    parser.add_argument("--url", nargs="+", default=[], help="modo=URL de um servidor já rodando (não sobe o processo)")
+    parser.add_argument("--rota", default="/predict")
+    parser.add_argument("--conexoes", type=int, default=64, help="clientes simultâneos")
+    parser.add_argument("--duracao", type=float, default=20, help="segundos de carga por modo")
+    parser.add_argument("--aquecimento", type=float, default=3, help="segundos de carga leve antes da medição")
+    parser.add_argument("--timeout", type=float, default=10, help="timeout de cada requisição (s)")
+    parser.add_argument("--pontos", type=int, default=500, help="coordenadas distintas sorteadas")
+    parser.add_argument("--limites", type=float, nargs=4, default=[-23.75, -46.80, -23.40, -46.40], metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", help="arquivo JSON do relatório")
+    argumentos = parser.parse_args()
+
+    urls = dict(item.split("=", 1) for item in argumentos.url)
+    relatorio = executar(
+        argumentos.modos, urls, argumentos.rota, argumentos.conexoes, argumentos.duracao, argumentos.aquecimento,
+        argumentos.timeout, argumentos.pontos, argumentos.limites, argumentos.semente
+    )
+    if argumentos.saida:
+        with open(argumentos.saida, "w", encoding="utf-8") as f:
+            f.write(json.dumps(relatorio, ensure_ascii=False, indent=2) + "\n")
+    print("\n".join(tabela(relatorio)))
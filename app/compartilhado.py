@@ -0,0 +1,127 @@
+"""
+Arrays compartilhados entre os workers de um mesmo nó.
+
+No modo "mmap" (MODO_DADOS), os arrays das séries de medidas, das estações e
+das geometrias (WKB) são gravados uma vez em MMAP_DIR como arquivos .npy e
+abertos por todos os workers com np.load(mmap_mode="r"): as páginas ficam no
+cache do sistema operacional e são compartilhadas, somente leitura. No modo
+"prefork", os dados são carregados no processo mestre antes do fork
+(preload_app do gunicorn) e os buffers NumPy são compartilhados por
+copy-on-write.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import shapely
+
+from .config import MMAP_DIR
+from .snapshots import assinatura
+
+# Versão do formato dos arrays: arquivos de outra versão são regerados
+VERSAO_FORMATO = 2
+
+
+def _diretorio(nome):
+    return os.path.join(MMAP_DIR, nome)
+
+
+def _assinatura(origem):
+    # A origem pode ser um arquivo ou uma lista de arquivos (arrays derivados de várias camadas)
+    origens = [origem] if isinstance(origem, str) else origem
+    return {chave: valor for caminho in origens for chave, valor in assinatura(caminho).items()}
+
+
+def ler_arrays(nome, origem):
+    """
+    Abre os arrays gravados em memória mapeada, ou None se não existirem ou estiverem desatualizados.
+    """
+    diretorio = _diretorio(nome)
+    try:
+        with open(os.path.join(diretorio, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("versao") != VERSAO_FORMATO or meta["assinatura"] != _assinatura(origem):
+        return None
+    return {
+        chave: np.load(os.path.join(diretorio, f"{chave}.npy"), mmap_mode="r", allow_pickle=False)
+        for chave in meta["arrays"]
+    }
+
+
+def gravar_arrays(nome, origem, arrays):
+    """
+    Grava os arrays num diretório temporário e o troca de lugar atomicamente com o anterior.
+    """
+    os.makedirs(MMAP_DIR, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix=f".{nome}.", dir=MMAP_DIR)
+    for chave, array in arrays.items():
+        np.save(os.path.join(temporario, f"{chave}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    with open(os.path.join(temporario, "meta.json"), "w") as f:
+        json.dump({"versao": VERSAO_FORMATO, "assinatura": _assinatura(origem), "arrays": list(arrays)}, f)
+
+    destino = _diretorio(nome)
+    antigo = None
+    if os.path.exists(destino):
+        antigo = destino + ".antigo"
+        shutil.rmtree(antigo, ignore_errors=True)
+        os.replace(destino, antigo)
+    os.replace(temporario, destino)
+    if antigo is not None:
+        shutil.rmtree(antigo, ignore_errors=True)
+
+
+def ler_ou_gravar_arrays(nome, origem, gerar):
+    """
+    Abre os arrays em memória mapeada, gerando-os com `gerar()` quando ausentes ou desatualizados.
+    """
+    arrays = ler_arrays(nome, origem)
+    if arrays is None:
+        gravar_arrays(nome, origem, gerar())
+        arrays = ler_arrays(nome, origem)
+    return arrays
+
+
+def geometrias_para_wkb(geometrias):
+    """
+    Serializa as geometrias num único buffer WKB (uint8) mais os deslocamentos de cada uma.
+
+    Geometrias nulas ocupam zero bytes e voltam como None.
+    """
+    wkbs = [wkb or b"" for wkb in shapely.to_wkb(geometrias)]
+    tamanhos = np.fromiter((len(wkb) for wkb in wkbs), dtype=np.int64, count=len(wkbs))
+    deslocamentos = np.concatenate([[0], np.cumsum(tamanhos)])
+    buffer = np.frombuffer(b"".join(wkbs), dtype=np.uint8)
+    return buffer, deslocamentos
+
+
+def wkb_para_geometrias(buffer, deslocamentos):
+    dados = memoryview(buffer)
+    wkbs = np.array([bytes(dados[a:b]) if b > a else None for a, b in zip(deslocamentos[:-1], deslocamentos[1:])], dtype=object)
+    return shapely.from_wkb(wkbs)
+
+
+def uso_memoria():
+    """
+    Memória do processo (em bytes), separando a parte residente compartilhada da privada (Linux).
+    """
+    campos = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for linha in f:
+                partes = linha.split()
+                if len(partes) == 3 and partes[2] == "kB":
+                    campos[partes[0].rstrip(":")] = int(partes[1]) * 1024
+    except OSError:
+        import resource
+        return {"residente": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+    return {
+        "residente": campos.get("Rss", 0),
+        "proporcional": campos.get("Pss", 0),
+        "compartilhada": campos.get("Shared_Clean", 0) + campos.get("Shared_Dirty", 0),
+        "privada": campos.get("Private_Clean", 0) + campos.get("Private_Dirty", 0),
+    }
@@ -6,12 +6,154 @@ load_dotenv()
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
+# Serviços externos (URLs configuráveis para apontar para instâncias próprias ou servidores locais de teste)
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/forecast")
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "meu_app_previsao_enchente_sp")
+# Intervalo mínimo entre chamadas ao Nominatim (a instância pública exige 1 s; 0 desativa), respeitado por todos os
+# processos que compartilham NOMINATIM_LIMITE_CAMINHO (vazio: cada processo por si). Uma chamada que teria de esperar
+# mais de NOMINATIM_ESPERA_MAX segundos pela vez não é feita (o bairro fica sem resposta)
+NOMINATIM_INTERVALO_MIN = float(os.getenv("NOMINATIM_INTERVALO_MIN", "1"))
+NOMINATIM_LIMITE_CAMINHO = os.getenv("NOMINATIM_LIMITE_CAMINHO", "data/nominatim.limite")
+NOMINATIM_ESPERA_MAX = float(os.getenv("NOMINATIM_ESPERA_MAX", "5"))
+
+# Geocodificação reversa: "auto" (camada local de bairros, com o Nominatim como fallback),
+# "local" (só a camada local) ou "nominatim" (só o Nominatim)
+GEOCODIFICACAO_MODO = os.getenv("GEOCODIFICACAO_MODO", "auto")
+BAIRROS_COLUNA_NOME = os.getenv("BAIRROS_COLUNA_NOME", "nome")
+# Cache persistente das respostas do Nominatim, por célula de geohash (precisão 7 ~ 150 m)
+NOMINATIM_CACHE_PATH = os.getenv("NOMINATIM_CACHE_PATH", "data/cache_nominatim.sqlite")
+NOMINATIM_CACHE_PRECISAO = int(os.getenv("NOMINATIM_CACHE_PRECISAO", "7"))
+
+UPSTREAM_TIMEOUT_CONEXAO = float(os.getenv("UPSTREAM_TIMEOUT_CONEXAO", "3.05"))
+UPSTREAM_TIMEOUT_LEITURA = float(os.getenv("UPSTREAM_TIMEOUT_LEITURA", "10"))
+UPSTREAM_CONEXOES = int(os.getenv("UPSTREAM_CONEXOES", "20"))
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", "16"))
+# Threads da geocodificação reversa, separadas das demais chamadas externas (a espera pelo limite do
+# Nominatim não ocupa o pool da previsão do tempo), e espera máxima pelo resultado de uma chamada externa
+UPSTREAM_GEOCODIFICACAO_WORKERS = int(os.getenv("UPSTREAM_GEOCODIFICACAO_WORKERS", "4"))
+UPSTREAM_ESPERA_MAX = float(os.getenv("UPSTREAM_ESPERA_MAX", "15"))
+
 MODEL_PATH = "data/modelo.pkl"
 SHAPEFILES = {
     "vulnerabilidade": "data/trechos_inundaveis.shp",
-    "relevo": "data/UBC_v2.shp"
+    "relevo": "data/UBC_v2.shp",
+    # Camada opcional de polígonos de bairros (shapefile ou GeoJSON) para a geocodificação reversa local
+    "bairros": os.getenv("BAIRROS_PATH", "data/bairros.geojson")
 }
 SHEETS = {
     "pluviometros": "data/pluviometrica_setembro.csv",
     "hidrologicas": "data/hidrologica_setembro.csv",
-}
\ No newline at end of file
+}
+
+# Snapshots binários (GeoParquet/Parquet/joblib) gravados ao lado das origens para acelerar a carga
+SNAPSHOTS_ATIVOS = os.getenv("SNAPSHOTS_ATIVOS", "1") == "1"
+
+# Cache LRU das consultas de relevo (0 desativa); coordenadas arredondadas
+# para RELEVO_CACHE_PRECISAO casas decimais (4 casas ~ 11 m)
+RELEVO_CACHE_TAMANHO = int(os.getenv("RELEVO_CACHE_TAMANHO", "65536"))
+RELEVO_CACHE_PRECISAO = int(os.getenv("RELEVO_CACHE_PRECISAO", "4"))
+
+# Máximo de pontos aceitos por requisição em /predict/batch
+PREDICT_LOTE_MAX = int(os.getenv("PREDICT_LOTE_MAX", "1000"))
+# Pontos calculados de cada vez em /predict/batch: as linhas de um sub-lote saem antes do próximo ser calculado
+PREDICT_SUBLOTE = int(os.getenv("PREDICT_SUBLOTE", "64"))
+
+# Cache das previsões do OpenWeather: células de geohash (precisão 5 ~ 4,9 km),
+# válidas pelo ciclo de atualização da previsão (3 h), com despejo LRU
+PREVISAO_GEOHASH_PRECISAO = int(os.getenv("PREVISAO_GEOHASH_PRECISAO", "5"))
+PREVISAO_CACHE_TTL = float(os.getenv("PREVISAO_CACHE_TTL", "10800"))
+PREVISAO_CACHE_TAMANHO = int(os.getenv("PREVISAO_CACHE_TAMANHO", "4096"))
+
+# Como os workers mantêm os dados em memória: "preguicoso" (cada worker carrega no primeiro acesso),
+# "prefork" (carga no processo mestre antes do fork, com preload_app do gunicorn) ou
+# "mmap" (arrays gravados em MMAP_DIR e abertos em memória mapeada, compartilhados entre os workers)
+MODO_DADOS = os.getenv("MODO_DADOS", "preguicoso")
+MMAP_DIR = os.getenv("MMAP_DIR", "data/mmap")
+
+# Ingestão incremental de medidas: arquivos CEMADEN (";") acompanhados a cada INGESTAO_INTERVALO
+# segundos (0 desativa) — as planilhas de SHEETS e os arquivos pluviometrica_*.csv/hidrologica_*.csv
+# de INGESTAO_PASTA —, lidos em blocos de INGESTAO_BLOCO linhas. Medidas mais antigas que
+# INGESTAO_RETENCAO_DIAS antes de agora são descartadas (0 mantém tudo), e medidas com datahora mais de
+# INGESTAO_TOLERANCIA_FUTURO_MIN minutos à frente do relógio são recusadas. POST /ingest/<destino> exige o
+# cabeçalho "Authorization: Bearer <INGESTAO_TOKEN>" (sem token configurado, a rota fica desativada); os lotes
+# recebidos são gravados num arquivo por dia em INGESTAO_PASTA, apagado quando sai da retenção
+INGESTAO_INTERVALO = float(os.getenv("INGESTAO_INTERVALO", "60"))
+INGESTAO_PASTA = os.getenv("INGESTAO_PASTA", "data/ingestao")
+INGESTAO_BLOCO = int(os.getenv("INGESTAO_BLOCO", "50000"))
+INGESTAO_RETENCAO_DIAS = float(os.getenv("INGESTAO_RETENCAO_DIAS", "35"))
+INGESTAO_TOLERANCIA_FUTURO_MIN = float(os.getenv("INGESTAO_TOLERANCIA_FUTURO_MIN", "60"))
+INGESTAO_TOKEN = os.getenv("INGESTAO_TOKEN", "")
+
+# Grade pré-calculada das features estáticas (python -m app.preprocessar grade [processos]): passo em graus (0,005 ~ 550 m)
+# e limites "lon_min,lat_min,lon_max,lat_max" (vazio usa a extensão da camada de relevo)
+GRADE_PASSO = float(os.getenv("GRADE_PASSO", "0.005"))
+GRADE_LIMITES = os.getenv("GRADE_LIMITES", "")
+
+# Predições agendadas: a cada PREVISAO_AGENDADA_INTERVALO segundos (0 desativa), recalcula em lote os
+# pontos do arquivo PREVISAO_AGENDADA_PONTOS (mesmo formato de /predict/batch) e o centro de cada célula
+# de geohash (precisão PREVISAO_AGENDADA_PRECISAO, 6 ~ 1,2 km x 0,6 km) dentro de PREVISAO_AGENDADA_LIMITES
+# ("lon_min,lat_min,lon_max,lat_max"). Os pontos do arquivo respondem só pela própria coordenada; as células, por
+# qualquer ponto dentro delas. A tabela é gravada em PREVISAO_AGENDADA_CAMINHO e compartilhada pelos workers
+PREVISAO_AGENDADA_INTERVALO = float(os.getenv("PREVISAO_AGENDADA_INTERVALO", "0"))
+PREVISAO_AGENDADA_PONTOS = os.getenv("PREVISAO_AGENDADA_PONTOS", "")
+PREVISAO_AGENDADA_LIMITES = os.getenv("PREVISAO_AGENDADA_LIMITES", "")
+PREVISAO_AGENDADA_PRECISAO = int(os.getenv("PREVISAO_AGENDADA_PRECISAO", "6"))
+PREVISAO_AGENDADA_CAMINHO = os.getenv("PREVISAO_AGENDADA_CAMINHO", "data/predicoes_agendadas.json")
+
+# Nível dos logs da aplicação (DEBUG, INFO, WARNING, ERROR; OFF desliga)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Inferência pelo caminho compilado (app/inferencia.py); 0 usa sempre o pipeline do scikit-learn
+INFERENCIA_COMPILADA = os.getenv("INFERENCIA_COMPILADA", "1") == "1"
+
+# Cache de respostas de /predict, /floodable_stretches, /local_relief e /weather_forecast_24h: a chave é a
+# célula de geohash do ponto (precisão RESPOSTAS_CACHE_PRECISAO, 7 ~ 150 m) e a janela de tempo de
+# RESPOSTAS_CACHE_JANELA segundos (0 desativa). Até RESPOSTAS_CACHE_TAMANHO respostas em memória por worker;
+# RESPOSTAS_CACHE_BACKEND "disco" (SQLite em RESPOSTAS_CACHE_URL) ou "redis" (servidor compatível com Redis,
+# RESPOSTAS_CACHE_URL=redis://host:6379/0) compartilha as respostas entre workers e reinícios
+RESPOSTAS_CACHE_JANELA = float(os.getenv("RESPOSTAS_CACHE_JANELA", "300"))
+RESPOSTAS_CACHE_PRECISAO = int(os.getenv("RESPOSTAS_CACHE_PRECISAO", "7"))
+RESPOSTAS_CACHE_TAMANHO = int(os.getenv("RESPOSTAS_CACHE_TAMANHO", "10000"))
+RESPOSTAS_CACHE_BACKEND = os.getenv("RESPOSTAS_CACHE_BACKEND", "memoria")
+RESPOSTAS_CACHE_URL = os.getenv("RESPOSTAS_CACHE_URL", "data/cache_respostas.sqlite")
+
+# Alertas de enchente (app/alertas.py): vigias gravados em ALERTAS_CAMINHO e reavaliados quando chegam medidas
+# das estações a até ALERTAS_RAIO_KM deles ou quando a previsão da célula vence; a thread de avaliação verifica
+# o arquivo e as previsões a cada ALERTAS_INTERVALO segundos (0 desativa). Os últimos ALERTAS_HISTORICO eventos
+# ficam em ALERTAS_EVENTOS_CAMINHO (SQLite, com o estado de cada vigia), numerados em sequência única: um só worker
+# avalia e grava, e os demais leem os eventos novos a cada ALERTAS_LEITURA_INTERVALO segundos. O long-poll e o
+# server-sent events esperam no máximo ALERTAS_ESPERA_MAX segundos por resposta
+ALERTAS_INTERVALO = float(os.getenv("ALERTAS_INTERVALO", "5"))
+ALERTAS_CAMINHO = os.getenv("ALERTAS_CAMINHO", "data/alertas.json")
+ALERTAS_EVENTOS_CAMINHO = os.getenv("ALERTAS_EVENTOS_CAMINHO", "data/alertas_eventos.sqlite")
+ALERTAS_LEITURA_INTERVALO = float(os.getenv("ALERTAS_LEITURA_INTERVALO", "0.5"))
+ALERTAS_RAIO_KM = float(os.getenv("ALERTAS_RAIO_KM", "20"))
+ALERTAS_HISTORICO = int(os.getenv("ALERTAS_HISTORICO", "1000"))
+ALERTAS_ESPERA_MAX = float(os.getenv("ALERTAS_ESPERA_MAX", "30"))
+
+# Servidor de run.py: "flask" (servidor de desenvolvimento do Flask; FLASK_DEBUG=1 liga o modo debug, só em desenvolvimento)
+# ou "asgi" (app/asgi.py no uvicorn; "uvicorn" é sinônimo), em SERVIDOR_HOST:SERVIDOR_PORTA. Uma conexão persistente
+# ociosa é fechada depois de SERVIDOR_TIMEOUT_OCIOSO segundos
+SERVIDOR = os.getenv("SERVIDOR", "flask")
+SERVIDOR_HOST = os.getenv("SERVIDOR_HOST", "127.0.0.1")
+SERVIDOR_PORTA = int(os.getenv("SERVIDOR_PORTA", "5000"))
+SERVIDOR_TIMEOUT_OCIOSO = float(os.getenv("SERVIDOR_TIMEOUT_OCIOSO", "5"))
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
+
+# Modo ASGI: as rotas rodam num pool de ASGI_WORKERS threads, com no máximo ASGI_LIMITES ("rota=n,...";
+# ASGI_LIMITE_PADRAO nas demais) requisições simultâneas por rota. Até ASGI_FILA_MAX requisições por rota esperam
+# vaga, por no máximo ASGI_ESPERA_MAX segundos; além disso a requisição é descartada na hora: com ASGI_DEGRADADO,
+# recebe a resposta já guardada no cache (ou a predição agendada) do ponto, senão 503 com Retry-After de
+# ASGI_RETRY_AFTER segundos. Acima dos limites por rota, no máximo ASGI_ADMISSAO_MAX requisições (nunca mais que
+# ASGI_WORKERS; padrão: ASGI_WORKERS) ocupam o pool ao mesmo tempo, com até ASGI_ADMISSAO_FILA_MAX esperando vaga
+# dentro do mesmo ASGI_ESPERA_MAX; a soma dos limites por rota pode passar do pool sem formar fila escondida nele
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", "16"))
+ASGI_ADMISSAO_MAX = int(os.getenv("ASGI_ADMISSAO_MAX", "0")) or ASGI_WORKERS
+ASGI_ADMISSAO_FILA_MAX = int(os.getenv("ASGI_ADMISSAO_FILA_MAX", "64"))
+ASGI_LIMITES = os.getenv("ASGI_LIMITES", "/predict=8,/predict/batch=2")
+ASGI_LIMITE_PADRAO = int(os.getenv("ASGI_LIMITE_PADRAO", "16"))
+ASGI_FILA_MAX = int(os.getenv("ASGI_FILA_MAX", "32"))
+ASGI_ESPERA_MAX = float(os.getenv("ASGI_ESPERA_MAX", "5"))
+ASGI_RETRY_AFTER = int(os.getenv("ASGI_RETRY_AFTER", "2"))
+ASGI_DEGRADADO = os.getenv("ASGI_DEGRADADO", "1") == "1"
@@ -0,0 +1,248 @@
+"""
+Grade regular pré-calculada com as features estáticas de cada célula.
+
+Os trechos inundáveis num raio de 5 km e o relevo só mudam quando os
+shapefiles mudam, então são calculados uma vez sobre uma grade de passo
+GRADE_PASSO (em graus) e gravados em MMAP_DIR/grade como arrays .npy,
+abertos em memória mapeada. Uma consulta vira o cálculo do índice da célula:
+os pontos dentro da grade recebem as features do centro da célula (erro de
+até meio passo), e os de fora são calculados na hora.
+
+A grade fica desatualizada (e deixa de ser usada) assim que um dos shapefiles
+muda. Geração, usando um processo por núcleo:
+    python -m app.preprocessar grade [processos]
+"""
+import logging
+import math
+import multiprocessing
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .config import SHAPEFILES, GRADE_PASSO, GRADE_LIMITES
+from .compartilhado import ler_arrays, gravar_arrays
+from .snapshots import atributos_preguicosos
+from . import shapefiles
+from .utils import COLUNAS_RELEVO_DESCONHECIDO, analyze_floodable_sections_batch, analyze_local_relief_batch
+
+logger = logging.getLogger(__name__)
+
+ORIGENS = [SHAPEFILES["vulnerabilidade"], SHAPEFILES["relevo"]]
+CAMADAS_TRECHOS = ["n_trechos_vulneraveis_5km", "n_trechos_alto_impacto_5km", "risco_medio_trechos_5km"]
+TAMANHO_TILE = 256
+
+
+class GradeEstatica:
+    """
+    Features estáticas de uma grade regular em lat/lon.
+
+    Cada célula guarda as features de trechos inundáveis e a posição do
+    polígono de relevo (-1 fora do relevo) no IndiceRelevo da mesma camada.
+    """
+
+    def __init__(self, arrays):
+        self.lat_min, self.lon_min, self.passo, n_lat, n_lon = arrays["parametros"]
+        self.n_lat, self.n_lon = int(n_lat), int(n_lon)
+        self.arrays = arrays
+        self._maximos = {}
+
+    def __len__(self):
+        return self.n_lat * self.n_lon
+
+    def celulas(self, lats, lons):
+        """
+        Índice (linear) da célula de cada ponto, ou -1 para pontos fora da grade.
+        """
+        i = np.floor((np.asarray(lats, dtype=float) - self.lat_min) / self.passo)
+        j = np.floor((np.asarray(lons, dtype=float) - self.lon_min) / self.passo)
+        dentro = (i >= 0) & (i < self.n_lat) & (j >= 0) & (j < self.n_lon)
+        return np.where(dentro, i * self.n_lon + j, -1).astype(np.int64)
+
+    def consultar(self, lat, lon, indice_relevo):
+        """
+        Features estáticas de um ponto (dicionário), ou None se ele cair fora da grade.
+        """
+        celula = int(self.celulas(lat, lon))
+        if celula < 0:
+            return None
+
+        features = {
+            "n_trechos_vulneraveis_5km": int(self.arrays["n_trechos_vulneraveis_5km"][celula]),
+            "n_trechos_alto_impacto_5km": int(self.arrays["n_trechos_alto_impacto_5km"][celula]),
+            "risco_medio_trechos_5km": float(self.arrays["risco_medio_trechos_5km"][celula]),
+        }
+        posicao = int(self.arrays["relevo_posicao"][celula])
+        if posicao >= 0:
+            features.update(indice_relevo.atributos(posicao))
+        else:
+            features.update({coluna: np.nan for coluna in indice_relevo.colunas})
+            features.update({coluna: 'Desconhecido' for coluna in COLUNAS_RELEVO_DESCONHECIDO})
+        return features
+
+    def features(self, celulas, indice_relevo):
+        """
+        Features de trechos e de relevo das células (todas dentro da grade), numa linha por célula.
+        """
+        colunas = {
+            "n_trechos_vulneraveis_5km": self.arrays["n_trechos_vulneraveis_5km"][celulas].astype(int),
+            "n_trechos_alto_impacto_5km": self.arrays["n_trechos_alto_impacto_5km"][celulas].astype(int),
+            "risco_medio_trechos_5km": self.arrays["risco_medio_trechos_5km"][celulas].astype(float),
+        }
+        posicoes = self.arrays["relevo_posicao"][celulas]
+        relevo = indice_relevo.atributos_varios(posicoes)
+        for coluna in relevo.columns:
+            valores = relevo[coluna].to_numpy()
+            if coluna in COLUNAS_RELEVO_DESCONHECIDO:
+                valores = np.where(posicoes < 0, 'Desconhecido', valores)
+            colunas[coluna] = valores
+        return pd.DataFrame(colunas)
+
+    def maximo(self, camada):
+        if camada not in self._maximos:
+            self._maximos[camada] = float(np.nanmax(self.arrays[camada])) if len(self) else 0.0
+        return self._maximos[camada]
+
+    def tile(self, z, x, y, camada):
+        """
+        Tile XYZ (Web Mercator, 256 x 256) da camada como mapa de calor PNG (transparente fora da grade).
+        """
+        n = TAMANHO_TILE * 2 ** z
+        px = (x * TAMANHO_TILE + np.arange(TAMANHO_TILE) + 0.5) / n
+        py = (y * TAMANHO_TILE + np.arange(TAMANHO_TILE) + 0.5) / n
+        lons = px * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+        celulas = self.celulas(np.repeat(lats, TAMANHO_TILE), np.tile(lons, TAMANHO_TILE))
+
+        valores = np.zeros(len(celulas))
+        dentro = celulas >= 0
+        valores[dentro] = self.arrays[camada][celulas[dentro]]
+        intensidade = np.clip(np.nan_to_num(valores) / (self.maximo(camada) or 1.0), 0.0, 1.0)
+
+        # Amarelo (pouco) -> vermelho (muito); células sem valor ficam transparentes
+        rgba = np.zeros((len(celulas), 4), dtype=np.uint8)
+        rgba[:, 0] = 255
+        rgba[:, 1] = (255 * (1 - intensidade)).astype(np.uint8)
+        rgba[:, 3] = np.where(intensidade > 0, (80 + 150 * intensidade).astype(np.uint8), 0)
+        return _png(rgba.reshape(TAMANHO_TILE, TAMANHO_TILE, 4))
+
+
+def _png(rgba):
+    """
+    Codifica uma imagem RGBA (altura, largura, 4) em PNG, sem dependências externas.
+    """
+    altura, largura, _ = rgba.shape
+    # Cada linha começa com o byte de filtro (0 = nenhum)
+    linhas = np.concatenate([np.zeros((altura, 1), dtype=np.uint8), rgba.reshape(altura, -1)], axis=1)
+
+    def bloco(tipo, dados):
+        return struct.pack(">I", len(dados)) + tipo + dados + struct.pack(">I", zlib.crc32(tipo + dados))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + bloco(b"IHDR", struct.pack(">IIBBBBB", largura, altura, 8, 6, 0, 0, 0))
+        + bloco(b"IDAT", zlib.compress(linhas.tobytes(), 6))
+        + bloco(b"IEND", b"")
+    )
+
+
+def features_estaticas(lats, lons, indice_trechos, indice_relevo, grade=None):
+    """
+    Features de trechos inundáveis e de relevo de vários pontos, numa linha por ponto.
+
+    Com a grade, os pontos dentro dela saem por indexação; os demais (ou todos,
+    sem a grade) são calculados com os índices espaciais.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    celulas = grade.celulas(lats, lons) if grade is not None else np.full(len(lats), -1)
+    dentro = celulas >= 0
+
+    if dentro.all():
+        return grade.features(celulas, indice_relevo)
+
+    partes = []
+    if dentro.any():
+        partes.append(grade.features(celulas[dentro], indice_relevo).set_index(np.flatnonzero(dentro)))
+    if not dentro.all():
+        fora = np.flatnonzero(~dentro)
+        calculadas = pd.concat([
+            analyze_floodable_sections_batch(lats[fora], lons[fora], indice_trechos),
+            analyze_local_relief_batch(lats[fora], lons[fora], indice_relevo)
+        ], axis=1)
+        partes.append(calculadas.set_index(fora))
+    return pd.concat(partes).sort_index().reset_index(drop=True)
+
+
+def _carregar_grade():
+    # Sem grade gerada (ou com shapefiles mais novos que ela), as features são calculadas na hora
+    arrays = ler_arrays("grade", ORIGENS)
+    if arrays is None:
+        return {"grade": None}
+    grade = GradeEstatica(arrays)
+    logger.info("Grade estática carregada (%d x %d células).", grade.n_lat, grade.n_lon)
+    return {"grade": grade}
+
+
+__getattr__ = atributos_preguicosos(globals(), {"grade": _carregar_grade})
+
+
+def _limites():
+    if GRADE_LIMITES:
+        return [float(valor) for valor in GRADE_LIMITES.split(",")]
+    return shapefiles.gdf_relevo_sp.to_crs("EPSG:4326").total_bounds.tolist()
+
+
+def _calcular_linhas(argumentos):
+    """
+    Features das células de um bloco de linhas da grade (roda num processo do pool).
+    """
+    lats, lons = argumentos
+    lats_celulas = np.repeat(lats, len(lons))
+    lons_celulas = np.tile(lons, len(lats))
+    trechos = analyze_floodable_sections_batch(lats_celulas, lons_celulas, shapefiles.indice_trechos)
+    posicoes = shapefiles.indice_relevo.localizar_varios(lats_celulas, lons_celulas)
+    return trechos, posicoes
+
+
+def gerar_grade(processos=None, passo=GRADE_PASSO, linhas_por_bloco=16):
+    """
+    Calcula as features de todas as células num pool de processos e grava a grade em MMAP_DIR.
+    """
+    lon_min, lat_min, lon_max, lat_max = _limites()
+    n_lat = int(math.ceil((lat_max - lat_min) / passo))
+    n_lon = int(math.ceil((lon_max - lon_min) / passo))
+    lats = lat_min + (np.arange(n_lat) + 0.5) * passo
+    lons = lon_min + (np.arange(n_lon) + 0.5) * passo
+    blocos = [(lats[i:i + linhas_por_bloco], lons) for i in range(0, n_lat, linhas_por_bloco)]
+    print(f"Grade de {n_lat} x {n_lon} células ({n_lat * n_lon} pontos) em {len(blocos)} blocos.")
+
+    arrays = {
+        "parametros": np.array([lat_min, lon_min, passo, n_lat, n_lon], dtype=float),
+        "n_trechos_vulneraveis_5km": np.empty(n_lat * n_lon, dtype=np.int32),
+        "n_trechos_alto_impacto_5km": np.empty(n_lat * n_lon, dtype=np.int32),
+        "risco_medio_trechos_5km": np.empty(n_lat * n_lon, dtype=np.float64),
+        "relevo_posicao": np.empty(n_lat * n_lon, dtype=np.int32),
+    }
+
+    # Índices carregados antes do fork: os processos do pool os herdam em vez de ler os shapefiles cada um
+    shapefiles.carregar_tudo()
+
+    inicio = time.perf_counter()
+    contexto = multiprocessing.get_context("fork")
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as pool:
+        for numero, (trechos, posicoes) in enumerate(pool.map(_calcular_linhas, blocos), start=1):
+            a = (numero - 1) * linhas_por_bloco * n_lon
+            b = a + len(posicoes)
+            for camada in CAMADAS_TRECHOS:
+                arrays[camada][a:b] = trechos[camada].to_numpy()
+            arrays["relevo_posicao"][a:b] = posicoes
+            if numero % 10 == 0 or numero == len(blocos):
+                print(f"{numero}/{len(blocos)} blocos ({time.perf_counter() - inicio:.1f}s)")
+
+    gravar_arrays("grade", ORIGENS, arrays)
+    tamanho = sum(array.nbytes for array in arrays.values())
+    print(f"Grade gravada: {tamanho / 2**20:.1f} MiB em {time.perf_counter() - inicio:.1f}s.")
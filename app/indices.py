@@ -0,0 +1,235 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from .compartilhado import geometrias_para_wkb, wkb_para_geometrias
+
+# CRS métrico usado nas buscas por raio (SIRGAS 2000 / Brazil Polyconic)
+CRS_METRICO = "EPSG:5880"
+
+# Mapeamento das classes de risco dos trechos (valores fora do mapa valem 0)
+MAPEAMENTO_RISCO = {"Baixo": 1, "Médio": 2, "Alto": 3}
+
+# Atributos extraídos das unidades de relevo (UBC)
+COLUNAS_RELEVO = [
+    'NIVEL_1', 'DECLIV_MED', 'AMPLIT_ALT',
+    'DDREN_MED', 'E_HIDR_MED', 'GEOL_CPRM', 'GEOL_rev'
+]
+
+
+class IndiceTrechos:
+    """
+    Índice espacial dos trechos vulneráveis, construído uma única vez na carga.
+
+    As geometrias são projetadas para o CRS métrico, os scores de risco
+    (Frequencia + Impacto + Vulnerabil) são pré-calculados como inteiros e
+    uma STRtree persistente responde às buscas por raio. O custo de cada
+    consulta depende apenas da quantidade de trechos próximos.
+    """
+
+    def __init__(self, gdf_trechos):
+        trechos_proj = gdf_trechos.to_crs(CRS_METRICO)
+
+        score = np.zeros(len(gdf_trechos), dtype=np.int16)
+        for coluna in ["Frequencia", "Impacto", "Vulnerabil"]:
+            score += gdf_trechos[coluna].map(MAPEAMENTO_RISCO).fillna(0).to_numpy(dtype=np.int16)
+        alto_impacto = (gdf_trechos["Impacto"] == "Alto").to_numpy()
+
+        self._montar(np.asarray(trechos_proj.geometry.array, dtype=object), score, alto_impacto)
+
+    def _montar(self, geometrias, score, alto_impacto):
+        self.geometrias = geometrias
+        self.arvore = shapely.STRtree(self.geometrias)
+        self.score = score
+        self.alto_impacto = alto_impacto
+
+        # Os pontos de consulta chegam em WGS84 (lat/lon)
+        self.transformador = Transformer.from_crs("EPSG:4326", CRS_METRICO, always_xy=True)
+
+    def para_arrays(self):
+        """
+        Arrays que reconstroem o índice (geometrias projetadas em WKB e scores), para memória mapeada.
+        """
+        wkb, deslocamentos = geometrias_para_wkb(self.geometrias)
+        return {"wkb": wkb, "wkb_deslocamentos": deslocamentos, "score": self.score, "alto_impacto": self.alto_impacto}
+
+    @classmethod
+    def de_arrays(cls, arrays):
+        indice = cls.__new__(cls)
+        geometrias = wkb_para_geometrias(arrays["wkb"], arrays["wkb_deslocamentos"])
+        indice._montar(geometrias, arrays["score"], arrays["alto_impacto"])
+        return indice
+
+    def __len__(self):
+        return len(self.geometrias)
+
+    def consultar(self, lat, lon, raio_km=5):
+        """
+        Retorna os índices dos trechos a até `raio_km` quilômetros do ponto.
+        """
+        x, y = self.transformador.transform(lon, lat)
+        return self.arvore.query(shapely.Point(x, y), predicate="dwithin", distance=raio_km * 1000)
+
+    def consultar_varios(self, lats, lons, raio_km=5):
+        """
+        Busca por raio para vários pontos de uma só vez.
+
+        Returns:
+            tuple: Arrays (pontos, trechos) com um par para cada trecho a até
+            `raio_km` quilômetros de cada ponto.
+        """
+        x, y = self.transformador.transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+        pontos, trechos = self.arvore.query(shapely.points(x, y), predicate="dwithin", distance=raio_km * 1000)
+        return pontos, trechos
+
+
+class IndicePoligonos:
+    """
+    Estrutura de busca ponto-em-polígono sobre uma camada de polígonos em lat/lon.
+
+    Os polígonos ficam numa STRtree e são preparados uma única vez; os
+    atributos de `colunas` são guardados em forma colunar (arrays numéricos
+    ou códigos inteiros + categorias). Opcionalmente, as consultas passam
+    por um cache LRU com as coordenadas arredondadas para `precisao_cache`
+    casas decimais, o que limita o uso de memória mesmo com muitos pontos.
+    """
+
+    def __init__(self, gdf_poligonos, colunas, tamanho_cache=0, precisao_cache=4):
+        valores = {}
+        categorias = {}
+        for coluna in colunas:
+            serie = gdf_poligonos[coluna]
+            if pd.api.types.is_numeric_dtype(serie):
+                valores[coluna] = serie.to_numpy()
+            else:
+                codigos, categorias_coluna = pd.factorize(serie)
+                valores[coluna] = codigos.astype(np.int32)
+                categorias[coluna] = np.asarray(categorias_coluna, dtype=object)
+
+        geometrias = np.asarray(gdf_poligonos.geometry.array, dtype=object)
+        self._montar(geometrias, colunas, valores, categorias, tamanho_cache, precisao_cache)
+
+    def _montar(self, geometrias, colunas, valores, categorias, tamanho_cache, precisao_cache):
+        self.geometrias = geometrias
+        shapely.prepare(self.geometrias)
+        self.arvore = shapely.STRtree(self.geometrias)
+
+        self.colunas = list(colunas)
+        self.valores = valores
+        self.categorias = categorias
+
+        self.precisao_cache = precisao_cache
+        if tamanho_cache:
+            self._localizar_celula = lru_cache(maxsize=tamanho_cache)(self._localizar)
+        else:
+            self._localizar_celula = None
+
+    def __len__(self):
+        return len(self.geometrias)
+
+    def _localizar(self, lat, lon):
+        candidatos = self.arvore.query(shapely.Point(lon, lat))
+        if len(candidatos) == 0:
+            return -1
+        dentro = candidatos[shapely.contains_xy(self.geometrias[candidatos], lon, lat)]
+        # Se houver sobreposição, vale o primeiro polígono da camada
+        return int(dentro.min()) if len(dentro) else -1
+
+    def localizar(self, lat, lon):
+        """
+        Retorna a posição do polígono que contém o ponto (ou -1).
+        """
+        if self._localizar_celula is None:
+            return self._localizar(lat, lon)
+        return self._localizar_celula(round(lat, self.precisao_cache), round(lon, self.precisao_cache))
+
+    def localizar_varios(self, lats, lons):
+        """
+        Posição do polígono que contém cada ponto (ou -1), para vários pontos de uma só vez.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if self._localizar_celula is not None:
+            # Mesmo arredondamento das consultas individuais com cache
+            lats = np.round(lats, self.precisao_cache)
+            lons = np.round(lons, self.precisao_cache)
+
+        pontos, candidatos = self.arvore.query(shapely.points(lons, lats))
+        dentro = shapely.contains_xy(self.geometrias[candidatos], lons[pontos], lats[pontos])
+
+        posicoes = np.full(len(lats), len(self.geometrias), dtype=np.int64)
+        np.minimum.at(posicoes, pontos[dentro], candidatos[dentro])
+        posicoes[posicoes == len(self.geometrias)] = -1
+        return posicoes
+
+    def atributos(self, posicao):
+        """
+        Monta o dicionário de atributos do polígono na posição dada.
+        """
+        atributos = {}
+        for coluna in self.colunas:
+            valor = self.valores[coluna][posicao]
+            if coluna in self.categorias:
+                atributos[coluna] = self.categorias[coluna][valor] if valor >= 0 else np.nan
+            else:
+                atributos[coluna] = valor.item()
+        return atributos
+
+    def atributos_varios(self, posicoes):
+        """
+        Monta um DataFrame com os atributos dos polígonos nas posições dadas (NaN para -1).
+        """
+        posicoes = np.asarray(posicoes)
+        encontrado = posicoes >= 0
+        colunas = {}
+        for coluna in self.colunas:
+            valores = self.valores[coluna][np.where(encontrado, posicoes, 0)]
+            if coluna in self.categorias:
+                categorias = np.append(self.categorias[coluna], np.nan)
+                valores = categorias[np.where(encontrado & (valores >= 0), valores, -1)]
+            else:
+                valores = np.where(encontrado, valores, np.nan)
+            colunas[coluna] = valores
+        return pd.DataFrame(colunas, columns=self.colunas)
+
+    def para_arrays(self):
+        """
+        Arrays que reconstroem o índice (geometrias em WKB e atributos colunares), para memória mapeada.
+        """
+        wkb, deslocamentos = geometrias_para_wkb(self.geometrias)
+        arrays = {"wkb": wkb, "wkb_deslocamentos": deslocamentos}
+        for coluna in self.colunas:
+            arrays[f"valores__{coluna}"] = self.valores[coluna]
+            if coluna in self.categorias:
+                arrays[f"categorias__{coluna}"] = self.categorias[coluna].astype(str)
+        return arrays
+
+    @classmethod
+    def de_arrays(cls, arrays, colunas, tamanho_cache=0, precisao_cache=4):
+        indice = cls.__new__(cls)
+        geometrias = wkb_para_geometrias(arrays["wkb"], arrays["wkb_deslocamentos"])
+        valores = {coluna: arrays[f"valores__{coluna}"] for coluna in colunas}
+        # As categorias são poucas: voltam para objetos Python (str) em memória própria
+        categorias = {
+            coluna: arrays[f"categorias__{coluna}"].astype(object)
+            for coluna in colunas if f"categorias__{coluna}" in arrays
+        }
+        indice._montar(geometrias, colunas, valores, categorias, tamanho_cache, precisao_cache)
+        return indice
+
+    def info_cache(self):
+        if self._localizar_celula is None:
+            return None
+        return self._localizar_celula.cache_info()._asdict()
+
+
+class IndiceRelevo(IndicePoligonos):
+    """
+    Busca ponto-em-polígono das unidades de relevo (atributos de COLUNAS_RELEVO).
+    """
+
+    def __init__(self, gdf_relevo, colunas=COLUNAS_RELEVO, tamanho_cache=0, precisao_cache=4):
+        super().__init__(gdf_relevo, colunas, tamanho_cache, precisao_cache)
@@ -0,0 +1,329 @@
+"""
+Caminho de inferência compilado para o pipeline do scikit-learn.
+
+O modelo é um Pipeline (ColumnTransformer de codificadores/imputadores +
+estimador final). Passar um DataFrame por ele a cada requisição custa mais
+que a própria floresta: validação das colunas, conversões de tipo e a busca
+das categorias de cada codificador. O pipeline é inspecionado uma única vez
+e vira uma receita: tabelas categoria -> código para cada coluna
+categórica, passos de imputação e escala para as numéricas e a posição de
+cada uma na matriz de saída. As features preenchem uma matriz NumPy
+pré-alocada (uma por thread), entregue direto ao estimador final.
+
+Na carga, o modelo é aquecido com linhas sintéticas e o resultado é
+comparado com `model.predict`; se a receita não cobrir algum passo do
+pipeline ou divergir, a inferência volta a usar o pipeline inteiro.
+"""
+import logging
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, MinMaxScaler, OneHotEncoder, OrdinalEncoder, StandardScaler
+
+logger = logging.getLogger(__name__)
+
+
+class NaoSuportado(Exception):
+    """
+    Passo do pipeline que a receita compilada não reproduz.
+    """
+
+
+def _colunas(colunas, nomes_entrada):
+    if isinstance(colunas, str):
+        colunas = [colunas]
+    resolvidas = []
+    for coluna in colunas:
+        if isinstance(coluna, str):
+            resolvidas.append(coluna)
+        elif isinstance(coluna, (int, np.integer)) and not isinstance(coluna, (bool, np.bool_)):
+            resolvidas.append(nomes_entrada[coluna])
+        else:
+            raise NaoSuportado(f"seleção de colunas {colunas!r}")
+    return resolvidas
+
+
+def _identidade(passo):
+    # "passthrough" vira um FunctionTransformer sem função depois do fit
+    return passo is None or (isinstance(passo, str) and passo == "passthrough") or (
+        isinstance(passo, FunctionTransformer) and passo.func is None
+    )
+
+
+def _passos(transformador):
+    passos = [passo for _, passo in transformador.steps] if isinstance(transformador, Pipeline) else [transformador]
+    return [passo for passo in passos if not _identidade(passo)]
+
+
+def _preenchimento(imputador):
+    if not (isinstance(imputador.missing_values, float) and np.isnan(imputador.missing_values)):
+        raise NaoSuportado("SimpleImputer com missing_values diferente de NaN")
+    if imputador.add_indicator:
+        raise NaoSuportado("SimpleImputer com add_indicator")
+    estatisticas = imputador.statistics_
+    if not getattr(imputador, "keep_empty_features", False) and pd.isna(estatisticas).any():
+        raise NaoSuportado("SimpleImputer com colunas descartadas")
+    return estatisticas
+
+
+def _receita_numerica(passos):
+    """
+    Operações (na mesma ordem e aritmética do scikit-learn) sobre um bloco de colunas numéricas.
+    """
+    operacoes = []
+    for passo in passos:
+        if isinstance(passo, SimpleImputer):
+            operacoes.append(("preencher", _preenchimento(passo).astype(float)))
+        elif isinstance(passo, StandardScaler):
+            # mean_ é calculado mesmo com with_mean=False; o que vale é a opção, como no transform
+            if passo.with_mean:
+                operacoes.append(("subtrair", passo.mean_))
+            if passo.with_std:
+                operacoes.append(("dividir", passo.scale_))
+        elif isinstance(passo, MinMaxScaler):
+            if passo.clip:
+                raise NaoSuportado("MinMaxScaler com clip")
+            operacoes.append(("multiplicar", passo.scale_))
+            operacoes.append(("somar", passo.min_))
+        else:
+            raise NaoSuportado(type(passo).__name__)
+    return operacoes
+
+
+class _Categorica:
+    """
+    Codificação de uma coluna categórica: tabela categoria -> código e o que fazer com ausentes e desconhecidas.
+    """
+
+    def __init__(self, coluna, categorias, inicio, one_hot, desconhecida, preenchimento=None, codigo_ausente=None):
+        self.coluna = coluna
+        self.inicio = inicio
+        self.one_hot = one_hot
+        self.largura = len(categorias) if one_hot else 1
+        # "erro", "ignorar" (linha de zeros no one-hot) ou o valor usado pelo OrdinalEncoder
+        self.desconhecida = desconhecida
+        self.preenchimento = preenchimento
+        self.tabela = {}
+        self.codigo_nan = -1
+        for codigo, categoria in enumerate(categorias):
+            if pd.isna(categoria):
+                self.codigo_nan = codigo
+            else:
+                self.tabela[categoria] = codigo
+        self.codigo_ausente = codigo_ausente
+
+    def codigos(self, valores):
+        """
+        Código de cada valor (-1 para categorias desconhecidas).
+        """
+        ausentes = pd.isna(valores)
+        if self.preenchimento is not None and ausentes.any():
+            valores = np.where(ausentes, self.preenchimento, valores)
+            ausentes = np.zeros(len(valores), dtype=bool)
+        codigos = np.fromiter((self.tabela.get(valor, -1) for valor in valores), dtype=np.int64, count=len(valores))
+        codigos[ausentes] = self.codigo_nan
+        if self.desconhecida == "erro" and (codigos < 0).any():
+            desconhecidas = sorted({str(valor) for valor, codigo in zip(valores, codigos) if codigo < 0})
+            raise ValueError(f"Categorias desconhecidas na coluna {self.coluna}: {desconhecidas}")
+        return codigos, ausentes
+
+    def preencher(self, X, valores):
+        codigos, ausentes = self.codigos(valores)
+        if self.one_hot:
+            linhas = np.flatnonzero(codigos >= 0)
+            X[linhas, self.inicio + codigos[linhas]] = 1.0
+        else:
+            saida = codigos.astype(float)
+            if self.codigo_ausente is not None and self.codigo_nan >= 0:
+                saida[ausentes] = self.codigo_ausente
+            saida[codigos < 0] = self.desconhecida
+            X[:, self.inicio] = saida
+
+
+def _receita_categorica(colunas, passos, inicio):
+    preenchimento = None
+    if passos and isinstance(passos[0], SimpleImputer):
+        preenchimento = _preenchimento(passos[0])
+        passos = passos[1:]
+    if len(passos) != 1:
+        raise NaoSuportado("bloco categórico com mais de um codificador")
+    codificador = passos[0]
+
+    categoricas = []
+    if isinstance(codificador, OneHotEncoder):
+        if codificador.drop_idx_ is not None or getattr(codificador, "_infrequent_enabled", False):
+            raise NaoSuportado("OneHotEncoder com drop ou categorias infrequentes")
+        desconhecida = "erro" if codificador.handle_unknown == "error" else "ignorar"
+        for i, (coluna, categorias) in enumerate(zip(colunas, codificador.categories_)):
+            fill = preenchimento[i] if preenchimento is not None else None
+            categoricas.append(_Categorica(coluna, categorias, inicio, True, desconhecida, fill))
+            inicio += len(categorias)
+    else:
+        if getattr(codificador, "_infrequent_enabled", False):
+            raise NaoSuportado("OrdinalEncoder com categorias infrequentes")
+        desconhecida = "erro" if codificador.handle_unknown == "error" else float(codificador.unknown_value)
+        for i, (coluna, categorias) in enumerate(zip(colunas, codificador.categories_)):
+            fill = preenchimento[i] if preenchimento is not None else None
+            categoricas.append(_Categorica(coluna, categorias, inicio, False, desconhecida, fill, float(codificador.encoded_missing_value)))
+            inicio += 1
+    return categoricas, inicio
+
+
+class ModeloCompilado:
+    """
+    Inferência sobre o pipeline do modelo, pela receita compilada quando possível.
+
+    `prever(features)` recebe um DataFrame (uma linha por ponto) e
+    `prever_linha(features)` um dicionário; ambos devolvem o mesmo que
+    `model.predict`. `compilado` diz se a receita está em uso.
+    """
+
+    def __init__(self, modelo, linhas_iniciais=1024):
+        self.modelo = modelo
+        self.colunas = list(modelo.feature_names_in_)
+        self.compilado = False
+        self._local = threading.local()
+        self._linhas_iniciais = linhas_iniciais
+        try:
+            self._compilar()
+            self.compilado = True
+        except NaoSuportado as e:
+            logger.warning("Inferência compilada indisponível (%s); usando o pipeline.", e)
+
+    def _compilar(self):
+        if not isinstance(self.modelo, Pipeline) or len(self.modelo.steps) != 2:
+            raise NaoSuportado("o modelo não é um Pipeline(ColumnTransformer, estimador)")
+        transformador = self.modelo.steps[0][1]
+        self.estimador = self.modelo.steps[-1][1]
+        if not isinstance(transformador, ColumnTransformer):
+            raise NaoSuportado(f"primeiro passo {type(transformador).__name__}")
+
+        self.categoricas = []
+        self.numericas = []  # (colunas de entrada, posições na saída, operações)
+        inicio = 0
+        with warnings.catch_warnings():
+            # Aviso do scikit-learn sobre o formato das colunas do "remainder" (índices ou nomes, ambos aceitos aqui)
+            warnings.simplefilter("ignore", FutureWarning)
+            transformadores = transformador.transformers_
+        for _, passo, colunas in transformadores:
+            if isinstance(passo, str) and passo == "drop":
+                continue
+            colunas = _colunas(colunas, self.colunas)
+            if not colunas:
+                continue
+            passos = _passos(passo)
+            if any(isinstance(p, (OneHotEncoder, OrdinalEncoder)) for p in passos):
+                categoricas, inicio = _receita_categorica(colunas, passos, inicio)
+                self.categoricas.extend(categoricas)
+            else:
+                self.numericas.append((colunas, np.arange(inicio, inicio + len(colunas)), _receita_numerica(passos)))
+                inicio += len(colunas)
+        self.n_saida = inicio
+
+        n_esperado = getattr(self.estimador, "n_features_in_", self.n_saida)
+        if n_esperado != self.n_saida:
+            raise NaoSuportado(f"{self.n_saida} colunas montadas, o estimador espera {n_esperado}")
+
+    def _matriz(self, n):
+        # Matriz pré-alocada por thread (as requisições rodam em threads do servidor)
+        matriz = getattr(self._local, "matriz", None)
+        if matriz is None or len(matriz) < n:
+            matriz = np.empty((max(n, self._linhas_iniciais), self.n_saida))
+            self._local.matriz = matriz
+        X = matriz[:n]
+        X.fill(0.0)
+        return X
+
+    def _montar(self, n, coluna):
+        """
+        Matriz de entrada do estimador para `n` linhas; `coluna(nome)` devolve os valores de uma feature.
+        """
+        X = self._matriz(n)
+        for categorica in self.categoricas:
+            categorica.preencher(X, coluna(categorica.coluna))
+        for colunas, posicoes, operacoes in self.numericas:
+            valores = np.column_stack([np.asarray(coluna(nome), dtype=float) for nome in colunas])
+            for operacao, parametro in operacoes:
+                if operacao == "preencher":
+                    valores = np.where(np.isnan(valores), parametro, valores)
+                elif operacao == "subtrair":
+                    valores -= parametro
+                elif operacao == "dividir":
+                    valores /= parametro
+                elif operacao == "multiplicar":
+                    valores *= parametro
+                else:
+                    valores += parametro
+            X[:, posicoes] = valores
+        return X
+
+    def prever(self, features):
+        """
+        Predição de várias linhas (DataFrame com as colunas de feature_names_in_).
+        """
+        if not self.compilado:
+            return self.modelo.predict(features.reindex(columns=self.colunas))
+        X = self._montar(len(features), lambda nome: features[nome].to_numpy(dtype=object) if nome in features else np.full(len(features), np.nan, dtype=object))
+        return self.estimador.predict(X)
+
+    def prever_linha(self, features):
+        """
+        Predição de uma linha (dicionário feature -> valor), sem passar pelo pandas.
+        """
+        if not self.compilado:
+            return self.modelo.predict(pd.DataFrame([features], columns=self.colunas))
+        X = self._montar(1, lambda nome: np.array([_valor(features.get(nome))], dtype=object))
+        return self.estimador.predict(X)
+
+    def linhas_sinteticas(self, n=64, semente=0):
+        """
+        Linhas de teste cobrindo as categorias conhecidas, uma desconhecida, valores ausentes e numéricos variados.
+        """
+        gerador = np.random.default_rng(semente)
+        dados = {}
+        for categorica in self.categoricas:
+            valores = list(categorica.tabela) or ["?"]
+            coluna = [valores[i % len(valores)] for i in range(n)]
+            if categorica.desconhecida != "erro":
+                coluna[-2] = "__categoria_desconhecida__"
+            if categorica.desconhecida != "erro" or categorica.codigo_nan >= 0 or categorica.preenchimento is not None:
+                coluna[-1] = np.nan
+            dados[categorica.coluna] = pd.Series(coluna, dtype=object)
+        for colunas, _, _ in self.numericas:
+            for nome in colunas:
+                valores = gerador.lognormal(0, 1.5, n) * gerador.choice([-1, 1, 1, 1], n)
+                valores[gerador.random(n) < 0.1] = np.nan
+                dados[nome] = valores
+        return pd.DataFrame(dados).reindex(columns=self.colunas)
+
+    def aquecer(self):
+        """
+        Aquece o estimador e confere a receita contra `model.predict`; se divergir, volta ao pipeline.
+
+        Returns:
+            bool: Se a inferência compilada está em uso.
+        """
+        if not self.compilado:
+            return False
+        linhas = self.linhas_sinteticas()
+        try:
+            esperado = self.modelo.predict(linhas)
+            obtido = self.prever(linhas)
+            uma = self.prever_linha({coluna: linhas[coluna].iloc[0] for coluna in self.colunas})
+            paridade = np.array_equal(esperado, obtido) and np.array_equal(esperado[:1], uma)
+        except (ValueError, TypeError) as e:
+            logger.warning("Inferência compilada falhou no aquecimento (%s); usando o pipeline.", e)
+            paridade = False
+        if not paridade:
+            logger.warning("Inferência compilada diverge de model.predict; usando o pipeline.")
+            self.compilado = False
+        return self.compilado
+
+
+def _valor(valor):
+    return np.nan if valor is None else valor
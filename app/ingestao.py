@@ -0,0 +1,278 @@
+"""
+Ingestão incremental de medidas pluviométricas e hidrológicas.
+
+Medidas novas chegam de duas formas:
+- arquivos CEMADEN (";") acompanhados como um `tail`: as planilhas de SHEETS
+  (a partir do ponto em que foram carregadas) e os arquivos
+  pluviometrica_*.csv / hidrologica_*.csv que aparecerem em INGESTAO_PASTA;
+- lotes enviados para POST /ingest/<destino> (JSON ou CSV ";"), autenticados
+  por INGESTAO_TOKEN e gravados em INGESTAO_PASTA (um arquivo por dia) para
+  os demais workers.
+
+Cada lote é lido em blocos e acrescentado à série em memória
+(SerieMedidas.acrescentar) sem reconstruí-la; a nova série substitui a
+anterior em sheets com uma única atribuição, então cada requisição que pegou
+uma referência à série vê um retrato consistente até o fim. Medidas repetidas
+(mesma estação, datahora e valor) são ignoradas, o que torna a releitura de um
+trecho de arquivo inofensiva; com outro valor, a medida mais recente
+substitui a anterior (correções da origem). A retenção conta a partir do
+relógio, não da medida mais recente, e medidas datadas no futuro são
+recusadas: um lote com uma data errada não apaga a série.
+"""
+import io
+import glob
+import hmac
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .config import (
+    SHEETS, INGESTAO_INTERVALO, INGESTAO_PASTA, INGESTAO_BLOCO, INGESTAO_RETENCAO_DIAS,
+    INGESTAO_TOLERANCIA_FUTURO_MIN, INGESTAO_TOKEN
+)
+from . import sheets, alertas, metricas
+from .interpolacao import para_float
+
+logger = logging.getLogger(__name__)
+
+# Destino -> (atributo da série em sheets, sensor aceito, prefixo dos arquivos em INGESTAO_PASTA)
+DESTINOS = {
+    "pluviometros": ("serie_pluviometrica", "chuva", "pluviometrica"),
+    "hidrologicas": ("serie_hidrologica", "nível", "hidrologica"),
+}
+COLUNAS = ["codEstacao", "latitude", "longitude", "nomeEstacao", "datahora", "sensor", "valorMedida"]
+COLUNAS_OBRIGATORIAS = ["codEstacao", "latitude", "longitude", "datahora", "valorMedida"]
+
+_lock_series = threading.Lock()
+_lock_arquivos = threading.Lock()
+_acompanhadores = {}  # caminho -> Acompanhador
+_pid_acompanhamento = None
+
+
+def tipar_medidas(medidas, destino):
+    """
+    Valida as colunas de um lote e converte a datahora e os números (o sensor padrão é o do destino).
+    """
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in medidas.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes: {', '.join(faltando)}")
+
+    medidas = medidas[[coluna for coluna in COLUNAS if coluna in medidas.columns]].copy()
+    if "sensor" not in medidas.columns:
+        medidas["sensor"] = DESTINOS[destino][1]
+    medidas["datahora"] = pd.to_datetime(medidas["datahora"], errors="coerce")
+    for coluna in ("latitude", "longitude", "valorMedida"):
+        medidas[coluna] = para_float(medidas[coluna]).astype(np.float32)
+
+    futuras = (medidas["datahora"] > pd.Timestamp.now() + pd.Timedelta(minutes=INGESTAO_TOLERANCIA_FUTURO_MIN)).to_numpy()
+    if futuras.any():
+        logger.warning("%d medidas de %s com datahora no futuro recusadas (a mais adiantada: %s)",
+                       futuras.sum(), destino, medidas["datahora"][futuras].max())
+        metricas.incrementar("ingestao_futuras_recusadas_total", "Medidas recusadas por datahora no futuro.", int(futuras.sum()), destino=destino)
+        medidas = medidas[~futuras]
+    return medidas
+
+
+def autorizado(cabecalho):
+    """
+    Se o cabeçalho Authorization de um POST /ingest traz o INGESTAO_TOKEN (sem token configurado, nenhum traz).
+    """
+    if not INGESTAO_TOKEN or not cabecalho:
+        return False
+    tipo, _, token = cabecalho.partition(" ")
+    return tipo.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), INGESTAO_TOKEN.encode())
+
+
+def ler_blocos(fonte, destino, tamanho_bloco=INGESTAO_BLOCO):
+    """
+    Lê um CSV CEMADEN (";") em blocos de `tamanho_bloco` linhas, já tipados.
+    """
+    for bloco in pd.read_csv(fonte, sep=";", decimal=",", chunksize=tamanho_bloco, usecols=lambda coluna: coluna in COLUNAS):
+        yield tipar_medidas(bloco, destino)
+
+
+def ingerir(destino, medidas):
+    """
+    Acrescenta um lote de medidas à série do destino e aplica a retenção.
+
+    Returns:
+        int: Número de medidas novas ou corrigidas (as repetidas e as de outros sensores não contam).
+    """
+    atributo, sensor, _ = DESTINOS[destino]
+    with _lock_series:
+        serie = getattr(sheets, atributo)
+        nova, recebidas = serie.acrescentar(medidas, sensor=sensor, contar=True)
+
+        if INGESTAO_RETENCAO_DIAS > 0:
+            nova = nova.reter(pd.Timestamp.now() - pd.Timedelta(days=INGESTAO_RETENCAO_DIAS))
+
+        setattr(sheets, atributo, nova)
+    if recebidas:
+        # Vigias próximos das estações do lote são reavaliados (app/alertas.py)
+        alertas.medidas_recebidas(destino, medidas["codEstacao"].dropna().unique())
+    return recebidas
+
+
+def ingerir_arquivo(fonte, destino):
+    return sum(ingerir(destino, bloco) for bloco in ler_blocos(fonte, destino))
+
+
+class Acompanhador:
+    """
+    Lê as linhas acrescentadas a um arquivo desde a última leitura (como um `tail`).
+
+    Só linhas completas (terminadas em quebra de linha) são consumidas; se o
+    arquivo encolher (rotação ou truncamento), a leitura recomeça do início.
+    """
+
+    def __init__(self, caminho, destino, posicao=0):
+        self.caminho = caminho
+        self.destino = destino
+        self.posicao = posicao
+
+    def ler_novas(self):
+        try:
+            tamanho = os.path.getsize(self.caminho)
+        except OSError:
+            return 0
+        if tamanho < self.posicao:
+            self.posicao = 0
+        if tamanho == self.posicao:
+            return 0
+
+        with open(self.caminho, "rb") as f:
+            cabecalho = f.readline()
+            inicio = max(self.posicao, f.tell())
+            f.seek(inicio)
+            dados = f.read(tamanho - inicio)
+
+        fim = dados.rfind(b"\n") + 1
+        if fim == 0:
+            return 0
+        self.posicao = inicio + fim
+        return ingerir_arquivo(io.BytesIO(cabecalho + dados[:fim]), self.destino)
+
+
+def _destino_arquivo(caminho):
+    nome = os.path.basename(caminho)
+    for destino, (_, _, prefixo) in DESTINOS.items():
+        if nome.startswith(prefixo):
+            return destino
+    return None
+
+
+def verificar_arquivos():
+    """
+    Lê as linhas novas de todos os arquivos acompanhados.
+
+    Returns:
+        dict: Número de medidas novas por destino.
+    """
+    with _lock_arquivos:
+        for destino, (atributo, _, _) in DESTINOS.items():
+            caminho = SHEETS[destino]
+            if caminho in _acompanhadores:
+                continue
+            # A série é carregada antes: a leitura continua do tamanho que a planilha tinha na carga
+            try:
+                getattr(sheets, atributo)
+            except Exception as e:
+                logger.error("Erro ao carregar %s; nova tentativa no próximo ciclo: %s", caminho, e)
+                continue
+            _acompanhadores[caminho] = Acompanhador(caminho, destino, sheets.posicoes_carregadas.get(caminho, 0))
+
+        arquivos = sorted(glob.glob(os.path.join(INGESTAO_PASTA, "*.csv")))
+        for caminho in arquivos:
+            destino = _destino_arquivo(caminho)
+            if caminho not in _acompanhadores and destino is not None:
+                _acompanhadores[caminho] = Acompanhador(caminho, destino)
+        # Arquivos recebidos apagados pela retenção deixam de ser acompanhados
+        for caminho in [caminho for caminho in _acompanhadores if caminho.startswith(os.path.join(INGESTAO_PASTA, "")) and caminho not in arquivos]:
+            del _acompanhadores[caminho]
+
+        novas = {destino: 0 for destino in DESTINOS}
+        for acompanhador in _acompanhadores.values():
+            try:
+                novas[acompanhador.destino] += acompanhador.ler_novas()
+            except Exception as e:
+                logger.error("Erro ao ler medidas novas de %s: %s", acompanhador.caminho, e)
+        return novas
+
+
+def gravar_recebidas(destino, medidas):
+    """
+    Acrescenta um lote recebido a INGESTAO_PASTA, para que os demais workers também o leiam.
+
+    Cada dia tem o seu arquivo; ao começar um novo, os dos dias fora da retenção são apagados.
+    """
+    os.makedirs(INGESTAO_PASTA, exist_ok=True)
+    prefixo = DESTINOS[destino][2]
+    caminho = os.path.join(INGESTAO_PASTA, f"{prefixo}_recebidas_{pd.Timestamp.now():%Y%m%d}.csv")
+    with open(caminho, "a", encoding="utf-8") as f:
+        novo = f.tell() == 0
+        # Uma única escrita em modo append: as linhas de workers diferentes não se misturam
+        f.write(medidas.reindex(columns=COLUNAS).to_csv(sep=";", decimal=",", index=False, header=novo))
+    if novo:
+        _remover_recebidas_antigas(prefixo)
+
+
+def _remover_recebidas_antigas(prefixo):
+    if INGESTAO_RETENCAO_DIAS <= 0:
+        return
+    # Um arquivo do dia D só tem medidas até D (mais a tolerância): fora da retenção um dia depois do limite
+    limite = f"{pd.Timestamp.now() - pd.Timedelta(days=INGESTAO_RETENCAO_DIAS + 1):%Y%m%d}"
+    for caminho in glob.glob(os.path.join(INGESTAO_PASTA, f"{prefixo}_recebidas_*.csv")):
+        dia = os.path.basename(caminho)[len(prefixo) + len("_recebidas_"):-len(".csv")]
+        if dia < limite:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+
+def _acompanhar():
+    while True:
+        time.sleep(INGESTAO_INTERVALO)
+        try:
+            verificar_arquivos()
+        except Exception as e:
+            # Planilha ausente ou corrompida na carga: a thread continua e tenta de novo no próximo ciclo
+            logger.exception("Erro no acompanhamento das medidas: %s", e)
+
+
+def iniciar():
+    """
+    Inicia o acompanhamento dos arquivos neste processo (uma vez por processo).
+
+    É chamado a cada requisição, e não em create_app, para que a thread nasça
+    em cada worker e não no processo mestre do gunicorn (preload_app).
+    """
+    global _pid_acompanhamento
+    if INGESTAO_INTERVALO <= 0 or _pid_acompanhamento == os.getpid():
+        return
+    with _lock_arquivos:
+        if _pid_acompanhamento == os.getpid():
+            return
+        _pid_acompanhamento = os.getpid()
+        _acompanhadores.clear()
+    threading.Thread(target=_acompanhar, name="ingestao", daemon=True).start()
+
+
+def estatisticas():
+    resumo = {}
+    for destino, (atributo, _, _) in DESTINOS.items():
+        serie = getattr(sheets, atributo)
+        ultima = serie.ultima_datahora()
+        resumo[destino] = {
+            "medidas": len(serie),
+            "estacoes": len(serie.motor),
+            "segmentos": len(serie.segmentos),
+            "ultima_datahora": ultima.isoformat() if ultima is not None else None,
+        }
+    with _lock_arquivos:
+        resumo["arquivos"] = {caminho: acompanhador.posicao for caminho, acompanhador in _acompanhadores.items()}
+    return resumo
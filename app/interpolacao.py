@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# Raio médio da Terra (IUGG), em km
+RAIO_TERRA_KM = 6371.0088
+
+
+def para_float(serie):
+    """
+    Converte uma coluna numérica que pode vir como texto com vírgula decimal ("-23,5176").
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    return pd.to_numeric(serie.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+
+def haversine_km(lats, lons, lats_estacoes_rad, lons_estacoes_rad):
+    """
+    Distâncias (km) de cada ponto para cada estação, em uma matriz (n_pontos, n_estacoes).
+    """
+    lat = np.radians(np.atleast_1d(np.asarray(lats, dtype=float)))[:, None]
+    lon = np.radians(np.atleast_1d(np.asarray(lons, dtype=float)))[:, None]
+    dlat = lats_estacoes_rad[None, :] - lat
+    dlon = lons_estacoes_rad[None, :] - lon
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lats_estacoes_rad[None, :]) * np.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class MotorIDW:
+    """
+    Motor de interpolação (IDW) sobre um conjunto fixo de estações.
+
+    As coordenadas das estações são pré-calculadas em radianos e as distâncias
+    são obtidas com haversine vetorizado, para vários pontos de uma só vez.
+    """
+
+    def __init__(self, estacoes):
+        self._montar(
+            estacoes["codEstacao"].to_numpy(),
+            para_float(estacoes["latitude"]).to_numpy(dtype=float),
+            para_float(estacoes["longitude"]).to_numpy(dtype=float)
+        )
+
+    def _montar(self, codigos, latitudes, longitudes):
+        self.codigos = codigos
+        self.posicao = {}
+        for i, codigo in enumerate(self.codigos):
+            self.posicao.setdefault(codigo, i)
+
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.lat_rad = np.radians(self.latitudes)
+        self.lon_rad = np.radians(self.longitudes)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def para_arrays(self):
+        return {"codigos": self.codigos.astype(str), "latitudes": self.latitudes, "longitudes": self.longitudes}
+
+    @classmethod
+    def de_arrays(cls, arrays):
+        motor = cls.__new__(cls)
+        motor._montar(arrays["codigos"].astype(object), arrays["latitudes"], arrays["longitudes"])
+        return motor
+
+    def com_estacoes(self, estacoes):
+        """
+        Novo motor com as estações ainda desconhecidas acrescentadas ao final (as posições existentes não mudam).
+        """
+        novas = estacoes[~estacoes["codEstacao"].isin(self.posicao)].drop_duplicates(subset="codEstacao")
+        if novas.empty:
+            return self
+
+        motor = MotorIDW.__new__(MotorIDW)
+        motor._montar(
+            np.concatenate([self.codigos, novas["codEstacao"].to_numpy()]),
+            np.concatenate([self.latitudes, para_float(novas["latitude"]).to_numpy(dtype=float)]),
+            np.concatenate([self.longitudes, para_float(novas["longitude"]).to_numpy(dtype=float)])
+        )
+        return motor
+
+    def posicoes(self, codigos):
+        """
+        Posição de cada código de estação no motor (-1 para estações desconhecidas).
+        """
+        return pd.Series(codigos).map(self.posicao).fillna(-1).to_numpy(dtype=np.int64)
+
+    def distancias(self, lats, lons):
+        return haversine_km(lats, lons, self.lat_rad, self.lon_rad)
+
+    def interpolar(self, distancias, valores, k=5, p=2, max_dist_km=20):
+        """
+        Interpola os valores das estações nos pontos.
+
+        Args:
+            distancias (ndarray): Matriz (n_pontos, n_estacoes) de `distancias()`.
+            valores (ndarray): Matriz (n_janelas, n_estacoes); NaN indica estação sem medida na janela.
+            k (int): Número máximo de estações vizinhas usadas.
+            p (int): Expoente do inverso da distância.
+            max_dist_km (float): Distância máxima das estações consideradas.
+
+        Returns:
+            ndarray: Matriz (n_pontos, n_janelas), com NaN onde não há estação no raio.
+        """
+        n_pontos, n_estacoes = distancias.shape
+        no_raio = (distancias <= max_dist_km).sum(axis=1)
+        if n_estacoes == 0 or not no_raio.any():
+            return np.full((n_pontos, len(valores)), np.nan)
+        valores = np.asarray(valores, dtype=float).T  # (n_estacoes, n_janelas)
+
+        # Só as m estações mais próximas de cada ponto (argpartition, sem ordenar todas): m começa em k
+        # e dobra enquanto alguma janela tem menos de k medidas entre elas e o ponto tem mais estações no raio
+        m = max(min(k, int(no_raio.max())), 1)
+        while True:
+            proximas = np.sort(np.argpartition(distancias, m - 1, axis=1)[:, :m] if m < n_estacoes
+                               else np.broadcast_to(np.arange(n_estacoes), distancias.shape), axis=1)
+            dist = np.take_along_axis(distancias, proximas, axis=1)
+            ordem = np.argsort(dist, axis=1, kind="stable")
+            proximas = np.take_along_axis(proximas, ordem, axis=1)
+            dist = np.take_along_axis(dist, ordem, axis=1)[:, :, None]  # (n_pontos, m, 1)
+            vals = valores[proximas]                                     # (n_pontos, m, n_janelas)
+
+            # Até k estações mais próximas com medida na janela e dentro do raio
+            validas = ~np.isnan(vals) & (dist <= max_dist_km)
+            usadas = validas & (np.cumsum(validas, axis=1) <= k)
+            completas = (usadas.sum(axis=1) >= k) | (no_raio <= m)[:, None]
+            if completas.all():
+                break
+            m = min(2 * m, int(no_raio.max()))
+        vals = np.where(usadas, vals, 0.0)
+
+        with np.errstate(divide="ignore"):
+            pesos = np.where(usadas & (dist > 0), 1.0 / dist ** p, 0.0)
+        soma_pesos = pesos.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultado = (vals * pesos).sum(axis=1) / soma_pesos
+        resultado[~usadas.any(axis=1)] = np.nan
+
+        # Se tiver estação exatamente no ponto, vale a medida dela
+        no_ponto = usadas & (dist == 0)
+        tem_no_ponto = no_ponto.any(axis=1)
+        if tem_no_ponto.any():
+            primeira = np.argmax(no_ponto, axis=1)
+            valor_no_ponto = np.take_along_axis(vals, primeira[:, None, :], axis=1)[:, 0, :]
+            resultado = np.where(tem_no_ponto, valor_no_ponto, resultado)
+
+        return resultado
+
+    def mais_proxima(self, distancias, valores, max_dist_km=20):
+        """
+        Valor da estação mais próxima (com medida) de cada ponto, dentro do raio.
+
+        Args:
+            distancias (ndarray): Matriz (n_pontos, n_estacoes) de `distancias()`.
+            valores (ndarray): Vetor (n_estacoes,); NaN indica estação sem medida.
+
+        Returns:
+            ndarray: Vetor (n_pontos,), com NaN onde não há estação no raio.
+        """
+        valores = np.asarray(valores, dtype=float)
+        if distancias.shape[1] == 0:
+            return np.full(distancias.shape[0], np.nan)
+        dist = np.where(np.isnan(valores)[None, :] | (distancias > max_dist_km), np.inf, distancias)
+        mais_proxima = np.argmin(dist, axis=1)
+        resultado = valores[mais_proxima]
+        resultado[np.isinf(dist[np.arange(len(dist)), mais_proxima])] = np.nan
+        return resultado
@@ -0,0 +1,144 @@
+"""
+Representação tipada e compacta das planilhas de medidas das estações (CEMADEN).
+
+As planilhas trazem os números com vírgula decimal ("-23,5176") e repetem em
+cada linha os dados da estação (município, nome, coordenadas, uf, offset).
+Lidas como texto, as colunas numéricas ficavam como strings, convertidas de
+novo a cada consulta. Aqui cada planilha vira duas tabelas:
+- medidas: codEstacao e sensor categóricos (códigos inteiros), datahora e
+  valorMedida float32, ordenadas por sensor, estação e datahora (as leituras
+  de chuva e de nível ficam em blocos contíguos, ver `por_sensor`);
+- estacoes: uma linha por estação, com municipio e nomeEstacao categóricos e
+  latitude e longitude float32.
+
+A leitura usa o parser CSV do pyarrow (multithread, com a vírgula decimal e
+os tipos definidos de antemão); uma planilha com valores malformados cai no
+pandas, com os valores inválidos convertidos em NaN/NaT.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from .interpolacao import para_float
+
+COLUNAS_MEDIDAS = ["codEstacao", "datahora", "sensor", "valorMedida"]
+COLUNAS_ESTACOES = ["codEstacao", "municipio", "nomeEstacao", "latitude", "longitude"]
+
+_TIPOS_ARROW = {
+    "latitude": pa.float32(),
+    "longitude": pa.float32(),
+    "valorMedida": pa.float32(),
+    "datahora": pa.timestamp("ms"),
+}
+
+
+def _ler_arrow(fonte):
+    with open(fonte, encoding="utf-8-sig") as f:
+        colunas = f.readline().rstrip("\r\n").split(";")
+    tabela = pa_csv.read_csv(
+        fonte,
+        parse_options=pa_csv.ParseOptions(delimiter=";"),
+        convert_options=pa_csv.ConvertOptions(
+            decimal_point=",",
+            column_types={coluna: tipo for coluna, tipo in _TIPOS_ARROW.items() if coluna in colunas},
+            include_columns=[coluna for coluna in dict.fromkeys(COLUNAS_ESTACOES + COLUNAS_MEDIDAS) if coluna in colunas],
+            auto_dict_encode=True,
+            auto_dict_max_cardinality=2**16,
+            strings_can_be_null=True,
+        ),
+    )
+    return tabela.to_pandas()
+
+
+def _ler_pandas(fonte):
+    bruto = pd.read_csv(fonte, sep=";", decimal=",", usecols=lambda coluna: coluna in COLUNAS_ESTACOES + COLUNAS_MEDIDAS)
+    bruto["datahora"] = pd.to_datetime(bruto["datahora"], errors="coerce")
+    return bruto
+
+
+def tipar(bruto, sensor=None):
+    """
+    Separa medidas e estações de uma tabela no formato das planilhas, já com os tipos compactos.
+
+    Args:
+        bruto (DataFrame): Colunas das planilhas CEMADEN (municipio e nomeEstacao são opcionais).
+        sensor (str): Sensor das medidas sem a coluna "sensor".
+
+    Returns:
+        dict: {"medidas": DataFrame, "estacoes": DataFrame}.
+    """
+    bruto = bruto.dropna(subset=["datahora"])
+
+    estacoes = bruto.drop_duplicates("codEstacao").reindex(columns=COLUNAS_ESTACOES).reset_index(drop=True)
+    for coluna in ("codEstacao", "municipio", "nomeEstacao"):
+        estacoes[coluna] = estacoes[coluna].astype("category")
+    for coluna in ("latitude", "longitude"):
+        estacoes[coluna] = para_float(estacoes[coluna]).astype(np.float32)
+
+    medidas = pd.DataFrame({
+        "codEstacao": bruto["codEstacao"].astype(pd.CategoricalDtype(estacoes["codEstacao"].cat.categories)),
+        "datahora": pd.to_datetime(bruto["datahora"]),
+        "sensor": (bruto["sensor"] if "sensor" in bruto.columns else pd.Series(sensor, index=bruto.index)).astype("category"),
+        "valorMedida": para_float(bruto["valorMedida"]).astype(np.float32),
+    })
+    # Um bloco contíguo por sensor, cada um ordenado por estação e datahora (como a série)
+    medidas = medidas.sort_values(["sensor", "codEstacao", "datahora"], kind="stable", ignore_index=True)
+    return {"medidas": medidas, "estacoes": estacoes}
+
+
+def ler(fonte):
+    """
+    Lê uma planilha CEMADEN (";", vírgula decimal) nas tabelas tipadas de `tipar`.
+    """
+    try:
+        bruto = _ler_arrow(fonte)
+    except pa.ArrowInvalid:
+        bruto = _ler_pandas(fonte)
+    return tipar(bruto)
+
+
+def por_sensor(medidas, sensor):
+    """
+    Medidas de um sensor; nas tabelas de `tipar`, uma fatia (sem cópia) do bloco contíguo do sensor.
+    """
+    sensores = medidas["sensor"]
+    if isinstance(sensores.dtype, pd.CategoricalDtype):
+        if sensor not in sensores.cat.categories:
+            return medidas.iloc[:0]
+        codigos = sensores.cat.codes.to_numpy()
+        if np.all(codigos[1:] >= codigos[:-1]):
+            codigo = sensores.cat.categories.get_loc(sensor)
+            inicio, fim = np.searchsorted(codigos, [codigo, codigo + 1])
+            return medidas.iloc[inicio:fim]
+    return medidas[sensores == sensor]
+
+
+def bytes_em_memoria(*tabelas):
+    return int(sum(tabela.memory_usage(index=True, deep=True).sum() for tabela in tabelas))
+
+
+def relatorio_memoria(fonte):
+    """
+    Memória e tempo de leitura de uma planilha lida como texto (como antes) e nas tabelas tipadas.
+    """
+    inicio = time.perf_counter()
+    texto = pd.read_csv(fonte, sep=";")
+    texto["datahora"] = pd.to_datetime(texto["datahora"], errors="coerce")
+    tempo_texto = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    tabelas = ler(fonte)
+    tempo_tipado = time.perf_counter() - inicio
+
+    return {
+        "linhas": len(texto),
+        "estacoes": len(tabelas["estacoes"]),
+        "bytes_texto": bytes_em_memoria(texto),
+        "bytes_tipado": bytes_em_memoria(*tabelas.values()),
+        "bytes_medidas": bytes_em_memoria(tabelas["medidas"]),
+        "leitura_texto_s": tempo_texto,
+        "leitura_tipada_s": tempo_tipado,
+    }
@@ -0,0 +1,117 @@
+"""
+Métricas no formato de texto do Prometheus, expostas em /metrics.
+
+Contadores e histogramas de latência são acumulados em memória por processo
+(com vários workers do gunicorn, cada um expõe os seus). Valores que já são
+mantidos em outro lugar (estatísticas de cache, por exemplo) entram como
+medidores calculados na hora da coleta.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIXO = "floodguard_"
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_contadores = {}   # nome -> {"ajuda": str, "valores": {rotulos: float}}
+_histogramas = {}  # nome -> {"ajuda": str, "valores": {rotulos: [contagens por bucket..., soma, total]}}
+_medidores = {}    # nome -> (ajuda, tipo, função que devolve [(rotulos, valor), ...])
+
+
+def _rotulos(rotulos):
+    return tuple(sorted(rotulos.items()))
+
+
+def incrementar(nome, ajuda, valor=1, **rotulos):
+    with _lock:
+        metrica = _contadores.setdefault(nome, {"ajuda": ajuda, "valores": {}})
+        chave = _rotulos(rotulos)
+        metrica["valores"][chave] = metrica["valores"].get(chave, 0) + valor
+
+
+def observar(nome, ajuda, valor, **rotulos):
+    with _lock:
+        metrica = _histogramas.setdefault(nome, {"ajuda": ajuda, "valores": {}})
+        chave = _rotulos(rotulos)
+        contagens = metrica["valores"].get(chave)
+        if contagens is None:
+            contagens = metrica["valores"][chave] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                contagens[i] += 1
+        contagens[-2] += valor
+        contagens[-1] += 1
+
+
+def valores(nome):
+    """
+    Valores atuais de um contador, por rótulos: {chave: (dicionário de rótulos, valor)}.
+    """
+    with _lock:
+        metrica = _contadores.get(nome)
+        return {chave: (dict(chave), valor) for chave, valor in metrica["valores"].items()} if metrica else {}
+
+
+def registrar_medidor(nome, ajuda, coletar, tipo="gauge"):
+    """
+    Registra uma métrica calculada na coleta: `coletar()` devolve uma lista de (rótulos, valor).
+    """
+    _medidores[nome] = (ajuda, tipo, coletar)
+
+
+@contextmanager
+def medir(etapa, **rotulos):
+    """
+    Mede a duração de um trecho (ou de uma função, usado como decorador) no histograma das etapas.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar("etapa_duracao_segundos", "Duração de cada etapa do pipeline de predição.", time.perf_counter() - inicio, etapa=etapa, **rotulos)
+
+
+def _formatar_rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ""
+    texto = ",".join(f'{chave}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for chave, valor in pares)
+    return "{" + texto + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if valor == valor else "NaN"
+
+
+def exportar():
+    """
+    Texto de todas as métricas no formato de exposição do Prometheus (text/plain; version=0.0.4).
+    """
+    linhas = []
+    with _lock:
+        contadores = {nome: (m["ajuda"], dict(m["valores"])) for nome, m in _contadores.items()}
+        histogramas = {nome: (m["ajuda"], {k: list(v) for k, v in m["valores"].items()}) for nome, m in _histogramas.items()}
+
+    for nome, (ajuda, valores) in sorted(contadores.items()):
+        linhas += [f"# HELP {PREFIXO}{nome} {ajuda}", f"# TYPE {PREFIXO}{nome} counter"]
+        for rotulos, valor in sorted(valores.items()):
+            linhas.append(f"{PREFIXO}{nome}{_formatar_rotulos(rotulos)} {_numero(valor)}")
+
+    for nome, (ajuda, valores) in sorted(histogramas.items()):
+        linhas += [f"# HELP {PREFIXO}{nome} {ajuda}", f"# TYPE {PREFIXO}{nome} histogram"]
+        for rotulos, contagens in sorted(valores.items()):
+            for limite, contagem in zip(BUCKETS, contagens):
+                linhas.append(f"{PREFIXO}{nome}_bucket{_formatar_rotulos(rotulos, [('le', limite)])} {contagem}")
+            linhas.append(f"{PREFIXO}{nome}_bucket{_formatar_rotulos(rotulos, [('le', '+Inf')])} {contagens[-1]}")
+            linhas.append(f"{PREFIXO}{nome}_sum{_formatar_rotulos(rotulos)} {_numero(contagens[-2])}")
+            linhas.append(f"{PREFIXO}{nome}_count{_formatar_rotulos(rotulos)} {contagens[-1]}")
+
+    for nome, (ajuda, tipo, coletar) in sorted(_medidores.items()):
+        linhas += [f"# HELP {PREFIXO}{nome} {ajuda}", f"# TYPE {PREFIXO}{nome} {tipo}"]
+        for rotulos, valor in coletar():
+            linhas.append(f"{PREFIXO}{nome}{_formatar_rotulos(sorted(rotulos.items()))} {_numero(valor)}")
+
+    return "\n".join(linhas) + "\n"
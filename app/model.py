@@ -1,6 +1,27 @@
-import joblib
-from .config import MODEL_PATH
+import logging
+from .config import MODEL_PATH, INFERENCIA_COMPILADA
+from .inferencia import ModeloCompilado
+from .snapshots import carregar_modelo, atributos_preguicosos
 
-print("Carregando modelo...")
-model = joblib.load(MODEL_PATH)
-print("Modelo carregado com sucesso.")
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+
+def _carregar_modelo():
+    logger.info("Carregando modelo...")
+    model = carregar_modelo(MODEL_PATH)
+    logger.info("Modelo carregado com sucesso.")
+    return {"model": model}
+
+
+def _carregar_inferencia():
+    inferencia = ModeloCompilado(__getattr__("model"))
+    if not INFERENCIA_COMPILADA:
+        inferencia.compilado = False
+    elif inferencia.aquecer():
+        logger.info("Inferência compilada pronta (%d colunas na matriz do estimador).", inferencia.n_saida)
+    return {"inferencia": inferencia}
+
+
+# O modelo é lido no primeiro acesso a `model`; `inferencia` o envolve no caminho compilado
+# (app/inferencia.py), aquecido e conferido contra model.predict na carga
+__getattr__ = atributos_preguicosos(globals(), {"model": _carregar_modelo, "inferencia": _carregar_inferencia})
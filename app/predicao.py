@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from . import model as modelo, shapefiles, sheets, grade, upstream, metricas
+from .grade import features_estaticas
+from .utils import get_neighbourhood, get_weather_forecast_24h, accumulated_rain_batch, consecutive_rainy_days_batch, niveis_rio_proximos
+
+
+def ler_pontos(corpo):
+    """
+    Lê os pontos de um lote: uma lista de objetos {"lat", "lon"} (com "id" opcional)
+    ou uma FeatureCollection GeoJSON de pontos.
+
+    Returns:
+        list: Dicionários com lat, lon (e id, quando informado).
+    """
+    if isinstance(corpo, dict) and corpo.get("type") == "FeatureCollection":
+        pontos = []
+        for feature in corpo["features"]:
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            ponto = {"lat": float(lat), "lon": float(lon)}
+            identificador = feature.get("id", (feature.get("properties") or {}).get("id"))
+            if identificador is not None:
+                ponto["id"] = identificador
+            pontos.append(ponto)
+        return pontos
+
+    if not isinstance(corpo, list):
+        raise ValueError("esperada uma lista de pontos ou uma FeatureCollection")
+
+    pontos = []
+    for item in corpo:
+        ponto = {"lat": float(item["lat"]), "lon": float(item["lon"])}
+        if "id" in item:
+            ponto["id"] = item["id"]
+        pontos.append(ponto)
+    return pontos
+
+
+def montar_features(lats, lons, data_atual, bairros, previsoes, indice_trechos, indice_relevo, serie_pluviometrica, serie_hidrologica, grade=None):
+    """
+    Calcula as features do modelo para vários pontos, em passadas vetorizadas.
+
+    Args:
+        lats, lons (array): Coordenadas dos pontos.
+        data_atual (Timestamp): Data de referência (data_evento).
+        bairros (list): Bairro de cada ponto.
+        previsoes (list): Previsão de cada ponto (dicionários com chuva_24h e intensidade_max_24h).
+        indice_trechos (IndiceTrechos): Índice dos trechos vulneráveis.
+        indice_relevo (IndiceRelevo): Índice das unidades de relevo.
+        serie_pluviometrica (SerieMedidas): Série dos pluviômetros.
+        serie_hidrologica (SerieMedidas): Série de nível das estações hidrológicas.
+        grade (GradeEstatica): Grade pré-calculada das features estáticas (opcional).
+
+    Returns:
+        DataFrame: Uma linha por ponto, com todas as features.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    previsoes = pd.DataFrame(list(previsoes), columns=["chuva_24h", "intensidade_max_24h"])
+
+    inicio_dia = data_atual.normalize()
+    fim_dia = inicio_dia + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+    features = pd.concat([
+        pd.DataFrame({"data_evento": data_atual.to_pydatetime().strftime("%Y-%m-%d"), "bairro": list(bairros)}),
+        # n_trechos_alto_impacto_5km, n_trechos_vulneraveis_5km, risco_medio_trechos_5km,
+        # AMPLIT_ALT, DDREN_MED, DECLIV_MED, E_HIDR_MED, GEOL_CPRM, GEOL_rev, NIVEL_1
+        features_estaticas(lats, lons, indice_trechos, indice_relevo, grade),
+        previsoes, # chuva_24h, intensidade_max_24h
+        accumulated_rain_batch(lats, lons, data_atual, serie_pluviometrica, None, previsoes["chuva_24h"].to_numpy()), # chuva_48h, chuva_72h
+    ], axis=1)
+    features["dias_consec_chuva"] = consecutive_rainy_days_batch(lats, lons, data_atual, serie_pluviometrica, None)
+    features["nivel_rio_24h"] = niveis_rio_proximos(lats, lons, inicio_dia, fim_dia, serie_hidrologica, None)
+
+    return features
+
+
+def prever(features):
+    """
+    Roda o modelo uma única vez sobre a matriz de features (uma linha por ponto).
+    """
+    return modelo.inferencia.prever(features)
+
+
+def prever_pontos(pontos, data_atual):
+    """
+    Predição de vários pontos: bairro e previsão buscados em paralelo, features vetorizadas e uma chamada ao modelo.
+
+    Returns:
+        list: Um dicionário por ponto, na ordem de entrada, com "bairro" e "prediction"
+            (ou "error", quando a previsão do tempo não pôde ser obtida).
+    """
+    # Bairro e previsão de todos os pontos buscados em paralelo nos serviços externos
+    futuros_bairros = [upstream.executor_geocodificacao.submit(get_neighbourhood, p["lat"], p["lon"], shapefiles.indice_bairros) for p in pontos]
+    futuros_previsoes = [upstream.executor.submit(get_weather_forecast_24h, p["lat"], p["lon"]) for p in pontos]
+    with metricas.medir("espera_externa", pipeline="lote"):
+        bairros = [upstream.resultado(futuro, "geocodificacao") for futuro in futuros_bairros]
+        previsoes = [upstream.resultado(futuro, "previsao") for futuro in futuros_previsoes]
+    ok = [i for i, previsao in enumerate(previsoes) if previsao is not None]
+
+    # Features de todos os pontos em passadas vetorizadas e uma única chamada ao modelo
+    predicoes = {}
+    if ok:
+        with metricas.medir("features", pipeline="lote"):
+            features = montar_features(
+                [pontos[i]["lat"] for i in ok], [pontos[i]["lon"] for i in ok], data_atual,
+                [bairros[i] for i in ok], [previsoes[i] for i in ok],
+                shapefiles.indice_trechos, shapefiles.indice_relevo, sheets.serie_pluviometrica, sheets.serie_hidrologica,
+                grade.grade
+            )
+        with metricas.medir("modelo", pipeline="lote"):
+            predicoes = dict(zip(ok, prever(features).tolist()))
+
+    resultados = []
+    for i, ponto in enumerate(pontos):
+        if i in predicoes:
+            resultados.append({**ponto, "bairro": bairros[i], "prediction": predicoes[i]})
+        else:
+            resultados.append({**ponto, "error": "Erro ao obter a previsão do tempo"})
+    return resultados
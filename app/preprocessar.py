@@ -0,0 +1,94 @@
+"""
+Pré-processamento: gera os snapshots binários de todas as entradas e mede o ganho na carga,
+e grava os arrays em memória mapeada usados no modo MODO_DADOS=mmap.
+
+Uso:
+    python -m app.preprocessar
+    python -m app.preprocessar grade [processos]   (grade das features estáticas, ver app/grade.py)
+    python -m app.preprocessar memoria             (memória das planilhas como texto e tipadas, ver app/medidas.py)
+"""
+import os
+import sys
+import time
+
+import geopandas as gpd
+import joblib
+
+from .config import MODEL_PATH, SHAPEFILES, SHEETS, MMAP_DIR, BAIRROS_COLUNA_NOME
+from . import sheets, medidas
+from .compartilhado import gravar_arrays
+from .grade import gerar_grade
+from .indices import IndiceTrechos, IndiceRelevo, IndicePoligonos
+from .series import SerieMedidas
+from .snapshots import carregar_geodataframe, carregar_tabelas, carregar_modelo
+
+
+def _serie(caminho, ler_origem, sensor=None):
+    tabelas = carregar_tabelas(caminho, ler_origem)
+    return SerieMedidas(tabelas["medidas"], tabelas["estacoes"], sensor)
+
+
+def preprocessar():
+    entradas = [
+        (SHAPEFILES["vulnerabilidade"], lambda: gpd.read_file(SHAPEFILES["vulnerabilidade"]), lambda: carregar_geodataframe(SHAPEFILES["vulnerabilidade"])),
+        (SHAPEFILES["relevo"], lambda: gpd.read_file(SHAPEFILES["relevo"]), lambda: carregar_geodataframe(SHAPEFILES["relevo"])),
+        (SHEETS["pluviometros"], sheets.ler_pluviometros, lambda: carregar_tabelas(SHEETS["pluviometros"], sheets.ler_pluviometros)),
+        (SHEETS["hidrologicas"], sheets.ler_hidrologicas, lambda: carregar_tabelas(SHEETS["hidrologicas"], sheets.ler_hidrologicas)),
+        (MODEL_PATH, lambda: joblib.load(MODEL_PATH), lambda: carregar_modelo(MODEL_PATH)),
+    ]
+    if os.path.exists(SHAPEFILES["bairros"]):
+        entradas.append((SHAPEFILES["bairros"], lambda: gpd.read_file(SHAPEFILES["bairros"]), lambda: carregar_geodataframe(SHAPEFILES["bairros"])))
+
+    for caminho, ler_origem, carregar in entradas:
+        if not os.path.exists(caminho):
+            print(f"{caminho}: arquivo não encontrado, ignorado")
+            continue
+        carregar()  # gera (ou confirma) o snapshot
+
+        inicio = time.perf_counter()
+        ler_origem()
+        tempo_origem = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        carregar()
+        tempo_snapshot = time.perf_counter() - inicio
+
+        print(f"{caminho}: origem {tempo_origem:.3f}s, snapshot {tempo_snapshot:.3f}s ({tempo_origem / tempo_snapshot:.1f}x)")
+
+    arrays = [
+        ("trechos", SHAPEFILES["vulnerabilidade"], lambda: IndiceTrechos(carregar_geodataframe(SHAPEFILES["vulnerabilidade"]))),
+        ("relevo", SHAPEFILES["relevo"], lambda: IndiceRelevo(carregar_geodataframe(SHAPEFILES["relevo"]))),
+        ("bairros", SHAPEFILES["bairros"], lambda: IndicePoligonos(carregar_geodataframe(SHAPEFILES["bairros"]).to_crs("EPSG:4326"), [BAIRROS_COLUNA_NOME])),
+        ("pluviometros", SHEETS["pluviometros"], lambda: _serie(SHEETS["pluviometros"], sheets.ler_pluviometros)),
+        ("hidrologicas", SHEETS["hidrologicas"], lambda: _serie(SHEETS["hidrologicas"], sheets.ler_hidrologicas, sensor="nível")),
+    ]
+    for nome, caminho, construir in arrays:
+        if not os.path.exists(caminho):
+            continue
+        dados = construir().para_arrays()
+        gravar_arrays(nome, caminho, dados)
+        tamanho = sum(array.nbytes for array in dados.values())
+        print(f"{caminho}: {tamanho / 2**20:.1f} MiB em arrays ({os.path.join(MMAP_DIR, nome)})")
+
+
+def relatorio_memoria():
+    for caminho in SHEETS.values():
+        if not os.path.exists(caminho):
+            print(f"{caminho}: arquivo não encontrado, ignorado")
+            continue
+        r = medidas.relatorio_memoria(caminho)
+        print(
+            f"{caminho}: {r['linhas']} medidas de {r['estacoes']} estações; "
+            f"texto {r['bytes_texto'] / 2**20:.2f} MiB ({r['bytes_texto'] / r['linhas']:.0f} B/medida, leitura {r['leitura_texto_s']:.3f}s), "
+            f"tipado {r['bytes_tipado'] / 2**20:.2f} MiB ({r['bytes_medidas'] / r['linhas']:.0f} B/medida, leitura {r['leitura_tipada_s']:.3f}s), "
+            f"{r['bytes_texto'] / r['bytes_tipado']:.1f}x menor"
+        )
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["grade"]:
+        gerar_grade(int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
+    elif sys.argv[1:2] == ["memoria"]:
+        relatorio_memoria()
+    else:
+        preprocessar()
@@ -0,0 +1,181 @@
+"""
+Cache das respostas das rotas consultadas por coordenada.
+
+Clientes que consultam a mesma região várias vezes por minuto recebem a
+resposta já calculada. A chave é a rota, a célula de geohash do ponto
+(RESPOSTAS_CACHE_PRECISAO) e a janela de tempo (RESPOSTAS_CACHE_JANELA
+segundos): a resposta é calculada no centro da célula, então todo ponto da
+célula recebe a mesma resposta até a janela virar.
+
+Cada worker guarda até RESPOSTAS_CACHE_TAMANHO respostas em memória (LRU com
+TTL), e requisições simultâneas da mesma chave esperam um único cálculo.
+Com RESPOSTAS_CACHE_BACKEND "disco" ou "redis", as respostas também são
+compartilhadas entre os workers. As respostas levam ETag (If-None-Match
+devolve 304) e Cache-Control até o fim da janela.
+"""
+import functools
+import hashlib
+import logging
+import time
+
+from flask import request, g, make_response, Response
+
+from .config import (
+    RESPOSTAS_CACHE_JANELA, RESPOSTAS_CACHE_PRECISAO, RESPOSTAS_CACHE_TAMANHO,
+    RESPOSTAS_CACHE_BACKEND, RESPOSTAS_CACHE_URL
+)
+from .cache import CacheTTL, CacheDisco, CacheRedis, geohash, centro_geohash
+
+logger = logging.getLogger(__name__)
+
+cache_respostas = CacheTTL(RESPOSTAS_CACHE_TAMANHO, RESPOSTAS_CACHE_JANELA)
+
+# Cabeçalhos da resposta original guardados junto com o corpo
+_CABECALHOS_GUARDADOS = ("X-Prediction-Computed-At",)
+
+# A cada quantas gravações as entradas vencidas do backend em disco são apagadas
+_LIMPEZA_DISCO = 1000
+
+
+def _criar_backend():
+    if RESPOSTAS_CACHE_BACKEND == "disco":
+        return CacheDisco(RESPOSTAS_CACHE_URL, ttl_segundos=RESPOSTAS_CACHE_JANELA)
+    if RESPOSTAS_CACHE_BACKEND == "redis":
+        return CacheRedis(RESPOSTAS_CACHE_URL, ttl_segundos=RESPOSTAS_CACHE_JANELA)
+    return None
+
+
+backend = _criar_backend()
+_gravacoes = 0
+
+
+def coordenadas():
+    """
+    lat e lon da requisição: o centro da célula quando a resposta vai para o cache, ou os da query string.
+
+    Levanta TypeError (parâmetro ausente) ou ValueError (não numérico), como float().
+    """
+    if "coordenadas" in g:
+        return g.coordenadas
+    return float(request.args.get("lat")), float(request.args.get("lon"))
+
+
+def _obter_backend(chave):
+    try:
+        return backend.obter(chave)
+    except Exception as e:
+        logger.warning("Erro ao ler o cache de respostas (%s): %s", RESPOSTAS_CACHE_BACKEND, e)
+        return None
+
+
+def _armazenar_backend(chave, item):
+    global _gravacoes
+    try:
+        backend.armazenar(chave, item)
+        _gravacoes += 1
+        if isinstance(backend, CacheDisco) and _gravacoes % _LIMPEZA_DISCO == 0:
+            backend.remover_expiradas()
+    except Exception as e:
+        logger.warning("Erro ao gravar o cache de respostas (%s): %s", RESPOSTAS_CACHE_BACKEND, e)
+
+
+def _chave(endpoint, lat, lon, agora):
+    celula = geohash(lat, lon, RESPOSTAS_CACHE_PRECISAO)
+    return f"{endpoint}:{celula}:{int(agora // RESPOSTAS_CACHE_JANELA)}", celula
+
+
+def guardada(endpoint, lat, lon, compartilhado=True):
+    """
+    Resposta da rota já guardada para a célula do ponto na janela atual, ou None (nada é calculado).
+
+    Com compartilhado=False, só a memória deste worker é consultada (sem E/S no backend).
+    """
+    if RESPOSTAS_CACHE_JANELA <= 0:
+        return None
+    chave, _ = _chave(endpoint, lat, lon, time.time())
+    item = cache_respostas.obter(chave)
+    if item is None and compartilhado and backend is not None:
+        item = _obter_backend(chave)
+    return item
+
+
+def _item(resposta):
+    corpo = resposta.get_data()
+    return {
+        "corpo": corpo.decode("utf-8"),
+        "mimetype": resposta.mimetype,
+        "cabecalhos": {nome: resposta.headers[nome] for nome in _CABECALHOS_GUARDADOS if nome in resposta.headers},
+        "etag": hashlib.blake2b(corpo, digest_size=12).hexdigest(),
+    }
+
+
+def em_cache(visao=None, *, direta=None):
+    """
+    Decorador das rotas GET que dependem só de lat e lon.
+
+    Só respostas 200 são guardadas; parâmetros inválidos e erros seguem direto para a rota.
+    `direta(lat, lon)`, se dada, é consultada antes do cache com a coordenada pedida: uma
+    resposta dela vale só para aquele ponto, então é devolvida sem ser guardada para a célula.
+    """
+    if visao is None:
+        return functools.partial(em_cache, direta=direta)
+
+    @functools.wraps(visao)
+    def envolvida(*args, **kwargs):
+        try:
+            lat = float(request.args["lat"])
+            lon = float(request.args["lon"])
+        except (KeyError, ValueError):
+            return visao(*args, **kwargs)
+        if direta is not None:
+            resposta = direta(lat, lon)
+            if resposta is not None:
+                return resposta
+        if RESPOSTAS_CACHE_JANELA <= 0:
+            return visao(*args, **kwargs)
+
+        agora = time.time()
+        janela = int(agora // RESPOSTAS_CACHE_JANELA)
+        chave, celula = _chave(request.endpoint, lat, lon, agora)
+        g.coordenadas = centro_geohash(celula)
+        nao_guardada = {}
+
+        def calcular():
+            item = _obter_backend(chave) if backend is not None else None
+            if item is not None:
+                return item
+            try:
+                resposta = make_response(visao(*args, **kwargs))
+            except Exception as e:
+                # Levantada de novo só nesta requisição; as que esperavam calculam por conta própria
+                nao_guardada["erro"] = e
+                return None
+            if resposta.status_code != 200:
+                nao_guardada["resposta"] = resposta
+                return None
+            item = _item(resposta)
+            if backend is not None:
+                _armazenar_backend(chave, item)
+            return item
+
+        item = cache_respostas.obter_ou_calcular(chave, calcular)
+        if "erro" in nao_guardada:
+            raise nao_guardada["erro"]
+        if item is None:
+            # Erro nesta requisição (ou na que ela esperava, que não é repassada a outros clientes)
+            return nao_guardada.get("resposta") or visao(*args, **kwargs)
+
+        resposta = Response(item["corpo"], mimetype=item["mimetype"])
+        resposta.headers.update(item["cabecalhos"])
+        resposta.set_etag(item["etag"])
+        resposta.cache_control.public = True
+        resposta.cache_control.max_age = max(int((janela + 1) * RESPOSTAS_CACHE_JANELA - agora), 0)
+        return resposta.make_conditional(request)
+
+    # Marca das rotas que têm resposta guardada (usada pelo modo degradado do ASGI)
+    envolvida.em_cache = True
+    return envolvida
+
+
+def estatisticas():
+    return {**cache_respostas.estatisticas(), "backend": RESPOSTAS_CACHE_BACKEND}
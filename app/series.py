@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+
+from .interpolacao import MotorIDW, para_float
+from .medidas import por_sensor
+
+# Cada medida é indexada pela chave (posição da estação * _ESCALA + segundos desde 1970),
+# de modo que um único array ordenado guarda as séries de todas as estações lado a lado
+_ESCALA = np.int64(1 << 34)
+
+
+def _segundos(datahora):
+    return np.int64(pd.Timestamp(datahora).floor("s").value // 10**9)
+
+
+def _chaves_valores(motor, medidas, sensor=None):
+    """
+    Chaves e valores das medidas de estações conhecidas pelo motor (medidas sem data são descartadas).
+    """
+    if sensor is not None:
+        medidas = por_sensor(medidas, sensor)
+    medidas = medidas.dropna(subset=["datahora"])
+
+    codigos = medidas["codEstacao"]
+    if isinstance(codigos.dtype, pd.CategoricalDtype):
+        # Tabelas tipadas (app/medidas.py): uma consulta por estação, e não por medida
+        posicoes = np.append(motor.posicoes(codigos.cat.categories.to_numpy()), -1)[codigos.cat.codes.to_numpy()]
+    else:
+        posicoes = motor.posicoes(codigos.to_numpy())
+    conhecidas = posicoes >= 0
+    segundos = medidas["datahora"].to_numpy().astype("datetime64[s]").astype(np.int64)
+    chaves = posicoes[conhecidas] * _ESCALA + segundos[conhecidas]
+    valores = para_float(medidas["valorMedida"]).to_numpy(dtype=np.float32)[conhecidas]
+    return chaves, valores
+
+
+class _Segmento:
+    """
+    Bloco imutável de medidas ordenadas pela chave, com somas e contagens acumuladas.
+
+    Os valores ficam em float32; as somas acumuladas, em float64.
+    """
+
+    def __init__(self, chaves, valores, soma_acumulada=None, validos_acumulados=None):
+        self.chaves = chaves
+        self.valores = valores
+        if soma_acumulada is None:
+            validos = ~np.isnan(valores)
+            soma_acumulada = np.concatenate([[0.0], np.cumsum(np.where(validos, valores, 0.0), dtype=np.float64)])
+            validos_acumulados = np.concatenate([[0], np.cumsum(validos)])
+        self.soma_acumulada = soma_acumulada
+        self.validos_acumulados = validos_acumulados
+
+    @classmethod
+    def ordenar(cls, chaves, valores):
+        ordem = np.argsort(chaves, kind="stable")
+        return cls(chaves[ordem], valores[ordem])
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def procurar(self, chaves):
+        """
+        Quais `chaves` estão no segmento e o valor guardado de cada uma (NaN nas ausentes).
+        """
+        if not len(self.chaves):
+            return np.zeros(len(chaves), dtype=bool), np.full(len(chaves), np.nan, dtype=np.float32)
+        posicoes = np.minimum(np.searchsorted(self.chaves, chaves), len(self.chaves) - 1)
+        presentes = self.chaves[posicoes] == chaves
+        return presentes, np.where(presentes, self.valores[posicoes], np.nan).astype(np.float32)
+
+    def unir(self, outro):
+        return _Segmento.ordenar(np.concatenate([self.chaves, outro.chaves]), np.concatenate([self.valores, outro.valores]))
+
+    def filtrar(self, manter):
+        return _Segmento(self.chaves[manter], self.valores[manter])
+
+    def acumulados(self, chaves_inicio, chaves_fim):
+        """
+        Soma, número de medidas e número de medidas válidas em cada intervalo [inicio, fim] de chaves.
+        """
+        a = np.searchsorted(self.chaves, chaves_inicio, side="left")
+        b = np.searchsorted(self.chaves, chaves_fim, side="right")
+        return self.soma_acumulada[b] - self.soma_acumulada[a], b - a, self.validos_acumulados[b] - self.validos_acumulados[a]
+
+
+class SerieMedidas:
+    """
+    Medidas das estações organizadas por estação e ordenadas no tempo, com somas acumuladas.
+
+    O total (ou a média) de qualquer janela [inicio, fim] em todas as estações
+    sai de uma busca binária e de uma subtração, sem varrer as medidas.
+
+    A série é imutável: `acrescentar` e `reter` devolvem uma nova série que
+    reaproveita os blocos (segmentos) da anterior, então quem já tem uma
+    referência continua vendo um retrato consistente. As medidas novas entram
+    num segmento próprio; segmentos vizinhos de tamanho parecido são unidos
+    (como num contador binário), o que mantém O(log n) segmentos sem
+    reconstruir a série a cada lote.
+    """
+
+    def __init__(self, medidas, estacoes, sensor=None):
+        self.motor = estacoes if isinstance(estacoes, MotorIDW) else MotorIDW(estacoes)
+        self.segmentos = (_Segmento.ordenar(*_chaves_valores(self.motor, medidas, sensor)),)
+
+    @classmethod
+    def _de_segmentos(cls, motor, segmentos):
+        serie = cls.__new__(cls)
+        serie.motor = motor
+        serie.segmentos = tuple(segmentos)
+        return serie
+
+    def __len__(self):
+        return sum(len(segmento) for segmento in self.segmentos)
+
+    def para_arrays(self):
+        """
+        Arrays que reconstroem a série (medidas e estações), para memória mapeada.
+        """
+        segmento = self.compactar().segmentos[0]
+        arrays = {
+            "chaves": segmento.chaves,
+            "valores": segmento.valores,
+            "soma_acumulada": segmento.soma_acumulada,
+            "validos_acumulados": segmento.validos_acumulados,
+        }
+        arrays.update({f"estacoes__{chave}": array for chave, array in self.motor.para_arrays().items()})
+        return arrays
+
+    @classmethod
+    def de_arrays(cls, arrays):
+        motor = MotorIDW.de_arrays({
+            chave.split("__", 1)[1]: array for chave, array in arrays.items() if chave.startswith("estacoes__")
+        })
+        segmento = _Segmento(arrays["chaves"], arrays["valores"], arrays["soma_acumulada"], arrays["validos_acumulados"])
+        return cls._de_segmentos(motor, [segmento])
+
+    def acrescentar(self, medidas, sensor=None, contar=False):
+        """
+        Nova série com as medidas acrescentadas (estações novas entram no motor).
+
+        Vale a última medida de cada estação e datahora: uma medida já presente
+        com o mesmo valor é ignorada (reenviar um lote não duplica as somas), e
+        com outro valor substitui a anterior (correções enviadas pela origem).
+        Com contar=True, devolve (série, número de medidas novas ou corrigidas).
+        """
+        motor = self.motor.com_estacoes(medidas[["codEstacao", "latitude", "longitude"]])
+        chaves, valores = _chaves_valores(motor, medidas, sensor)
+
+        # Dentro do lote, vale a última medida de cada chave
+        chaves, indices = np.unique(chaves[::-1], return_index=True)
+        valores = valores[::-1][indices]
+        novas = np.ones(len(chaves), dtype=bool)
+        segmentos = []
+        for segmento in self.segmentos:
+            presentes, atuais = segmento.procurar(chaves)
+            iguais = presentes & ((atuais == valores) | (np.isnan(atuais) & np.isnan(valores)))
+            novas &= ~iguais
+            corrigidas = presentes & ~iguais
+            if corrigidas.any():
+                # O valor antigo sai do segmento (somas refeitas) e o novo entra com as medidas novas
+                segmento = segmento.filtrar(~np.isin(segmento.chaves, chaves[corrigidas]))
+            if len(segmento):
+                segmentos.append(segmento)
+        if not novas.any():
+            serie = self if motor is self.motor else SerieMedidas._de_segmentos(motor, self.segmentos)
+            return (serie, 0) if contar else serie
+
+        segmentos.append(_Segmento(chaves[novas], valores[novas]))
+        while len(segmentos) > 1 and len(segmentos[-2]) <= 2 * len(segmentos[-1]):
+            ultimo = segmentos.pop()
+            segmentos[-1] = segmentos[-1].unir(ultimo)
+        serie = SerieMedidas._de_segmentos(motor, segmentos)
+        return (serie, int(novas.sum())) if contar else serie
+
+    def reter(self, desde):
+        """
+        Nova série só com as medidas a partir de `desde` (a própria série, se nada for descartado).
+        """
+        limite = _segundos(desde)
+        segmentos = []
+        alterada = False
+        for segmento in self.segmentos:
+            manter = segmento.chaves % _ESCALA >= limite
+            if manter.all():
+                segmentos.append(segmento)
+            else:
+                alterada = True
+                if manter.any():
+                    segmentos.append(segmento.filtrar(manter))
+        if not alterada:
+            return self
+        return SerieMedidas._de_segmentos(self.motor, segmentos)
+
+    def compactar(self):
+        """
+        Nova série com todos os segmentos unidos num só.
+        """
+        if len(self.segmentos) == 1:
+            return self
+        if not self.segmentos:
+            return SerieMedidas._de_segmentos(self.motor, [_Segmento(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))])
+        unido = self.segmentos[0]
+        for segmento in self.segmentos[1:]:
+            unido = unido.unir(segmento)
+        return SerieMedidas._de_segmentos(self.motor, [unido])
+
+    def ultima_datahora(self):
+        """
+        Datahora da medida mais recente (None se a série estiver vazia).
+        """
+        maximos = [int((segmento.chaves % _ESCALA).max()) for segmento in self.segmentos if len(segmento)]
+        return pd.Timestamp(max(maximos), unit="s") if maximos else None
+
+    def _acumulados(self, janelas):
+        """
+        Soma, número de medidas e de medidas válidas de cada estação em cada janela, em matrizes (n_janelas, n_estacoes).
+        """
+        base = np.arange(len(self.motor), dtype=np.int64) * _ESCALA
+        inicios = np.array([_segundos(inicio) for inicio, _ in janelas], dtype=np.int64)
+        fins = np.array([_segundos(fim) for _, fim in janelas], dtype=np.int64)
+        chaves_inicio = base[None, :] + inicios[:, None]
+        chaves_fim = base[None, :] + fins[:, None]
+
+        soma = np.zeros(chaves_inicio.shape)
+        n_medidas = np.zeros(chaves_inicio.shape, dtype=np.int64)
+        n_validos = np.zeros(chaves_inicio.shape, dtype=np.int64)
+        for segmento in self.segmentos:
+            s, n, v = segmento.acumulados(chaves_inicio, chaves_fim)
+            soma += s
+            n_medidas += n
+            n_validos += v
+        return soma, n_medidas, n_validos
+
+    def somas(self, janelas):
+        """
+        Soma de cada estação em cada janela (NaN para estações sem medida na janela).
+        """
+        soma, n_medidas, _ = self._acumulados(janelas)
+        return np.where(n_medidas > 0, soma, np.nan)
+
+    def medias(self, janelas):
+        """
+        Média de cada estação em cada janela (NaN para estações sem medida válida na janela).
+        """
+        soma, _, n_validos = self._acumulados(janelas)
+        return np.where(n_validos > 0, soma / np.maximum(n_validos, 1), np.nan)
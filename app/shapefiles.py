@@ -1,10 +1,98 @@
-import geopandas as gpd
-from .config import SHAPEFILES
+import logging
+import os
+from .config import SHAPEFILES, RELEVO_CACHE_TAMANHO, RELEVO_CACHE_PRECISAO, BAIRROS_COLUNA_NOME, MODO_DADOS
+from .compartilhado import ler_ou_gravar_arrays
+from .indices import IndiceTrechos, IndiceRelevo, IndicePoligonos, COLUNAS_RELEVO
+from .snapshots import carregar_geodataframe, atributos_preguicosos
 
-print("Carregando shapefiles...")
+logger = logging.getLogger(__name__)
 
-gdf_trechos_vulneraveis = gpd.read_file(SHAPEFILES["vulnerabilidade"])
-print("Shapefile de trechos vulneráveis lido com sucesso.")
 
-gdf_relevo_sp = gpd.read_file(SHAPEFILES["relevo"])
-print("Shapefile de relevo lido com sucesso.")
\ No newline at end of file
+def _carregar_trechos():
+    gdf_trechos_vulneraveis = carregar_geodataframe(SHAPEFILES["vulnerabilidade"])
+    logger.info("Shapefile de trechos vulneráveis lido com sucesso.")
+    return {"gdf_trechos_vulneraveis": gdf_trechos_vulneraveis}
+
+
+def _carregar_indice_trechos():
+    if MODO_DADOS == "mmap":
+        # O GeoDataFrame só é lido se os arrays em MMAP_DIR estiverem ausentes ou desatualizados
+        arrays = ler_ou_gravar_arrays(
+            "trechos", SHAPEFILES["vulnerabilidade"],
+            lambda: IndiceTrechos(__getattr__("gdf_trechos_vulneraveis")).para_arrays()
+        )
+        indice_trechos = IndiceTrechos.de_arrays(arrays)
+    else:
+        indice_trechos = IndiceTrechos(__getattr__("gdf_trechos_vulneraveis"))
+    logger.info("Índice espacial de trechos vulneráveis construído.")
+    return {"indice_trechos": indice_trechos}
+
+
+def _carregar_relevo():
+    gdf_relevo_sp = carregar_geodataframe(SHAPEFILES["relevo"])
+    logger.info("Shapefile de relevo lido com sucesso.")
+    return {"gdf_relevo_sp": gdf_relevo_sp}
+
+
+def _carregar_indice_relevo():
+    if MODO_DADOS == "mmap":
+        arrays = ler_ou_gravar_arrays(
+            "relevo", SHAPEFILES["relevo"],
+            lambda: IndiceRelevo(__getattr__("gdf_relevo_sp")).para_arrays()
+        )
+        indice_relevo = IndiceRelevo.de_arrays(arrays, COLUNAS_RELEVO, RELEVO_CACHE_TAMANHO, RELEVO_CACHE_PRECISAO)
+    else:
+        indice_relevo = IndiceRelevo(__getattr__("gdf_relevo_sp"), tamanho_cache=RELEVO_CACHE_TAMANHO, precisao_cache=RELEVO_CACHE_PRECISAO)
+    logger.info("Índice espacial de relevo construído.")
+    return {"indice_relevo": indice_relevo}
+
+
+def _carregar_bairros():
+    # Camada de bairros é opcional: sem ela, a geocodificação reversa usa só o Nominatim
+    if not os.path.exists(SHAPEFILES["bairros"]):
+        return {"gdf_bairros": None}
+
+    gdf_bairros = carregar_geodataframe(SHAPEFILES["bairros"]).to_crs("EPSG:4326")
+    if BAIRROS_COLUNA_NOME not in gdf_bairros.columns:
+        colunas = ", ".join(str(coluna) for coluna in gdf_bairros.columns if coluna != gdf_bairros.geometry.name)
+        raise ValueError(
+            f"A camada de bairros {SHAPEFILES['bairros']} não tem a coluna {BAIRROS_COLUNA_NOME!r} "
+            f"(BAIRROS_COLUNA_NOME); colunas disponíveis: {colunas}"
+        )
+    logger.info("Camada de bairros lida com sucesso.")
+    return {"gdf_bairros": gdf_bairros}
+
+
+def _carregar_indice_bairros():
+    if not os.path.exists(SHAPEFILES["bairros"]):
+        return {"indice_bairros": None}
+
+    if MODO_DADOS == "mmap":
+        arrays = ler_ou_gravar_arrays(
+            "bairros", SHAPEFILES["bairros"],
+            lambda: IndicePoligonos(__getattr__("gdf_bairros"), [BAIRROS_COLUNA_NOME]).para_arrays()
+        )
+        indice_bairros = IndicePoligonos.de_arrays(arrays, [BAIRROS_COLUNA_NOME])
+    else:
+        indice_bairros = IndicePoligonos(__getattr__("gdf_bairros"), [BAIRROS_COLUNA_NOME])
+    return {"indice_bairros": indice_bairros}
+
+
+# Cada camada é lida (do snapshot, quando atualizado) no primeiro acesso; os índices
+# não dependem dos GeoDataFrames no modo "mmap" (ver app/compartilhado.py)
+__getattr__ = atributos_preguicosos(globals(), {
+    "gdf_trechos_vulneraveis": _carregar_trechos,
+    "indice_trechos": _carregar_indice_trechos,
+    "gdf_relevo_sp": _carregar_relevo,
+    "indice_relevo": _carregar_indice_relevo,
+    "gdf_bairros": _carregar_bairros,
+    "indice_bairros": _carregar_indice_bairros,
+})
+
+
+def carregar_tudo():
+    """
+    Carrega todos os índices (modo "prefork", antes do fork dos workers).
+    """
+    for nome in ("indice_trechos", "indice_relevo", "indice_bairros"):
+        __getattr__(nome)
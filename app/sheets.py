@@ -1,15 +1,84 @@
-import pandas as pd
-from .config import SHEETS
-
-medidas_pluviometros = pd.read_csv(SHEETS["pluviometros"], sep=";")
-medidas_pluviometros["datahora"] = pd.to_datetime(medidas_pluviometros["datahora"], errors="coerce")
-medidas_pluviometros.drop("uf", axis=1, inplace=True) # Todas as estações são de SP
-estacoes_pluviometricas = medidas_pluviometros[["codEstacao", "latitude", "longitude", "nomeEstacao"]].drop_duplicates().reset_index(drop=True)
-
-medidas_hidrologicas = pd.read_csv(SHEETS["hidrologicas"], sep=";")
-medidas_hidrologicas['datahora'] = pd.to_datetime(medidas_hidrologicas['datahora'], errors='coerce')
-medidas_hidrologicas.dropna(subset=['datahora'], inplace=True)
-estacoes_hidrologicas = medidas_hidrologicas[["codEstacao", "latitude", "longitude", "nomeEstacao"]].drop_duplicates().reset_index(drop=True)
+import os
+from .config import SHEETS, MODO_DADOS
+from . import medidas
+from .compartilhado import ler_ou_gravar_arrays
+from .series import SerieMedidas
+from .snapshots import carregar_tabelas, atributos_preguicosos
+
+# Tamanho de cada planilha logo antes da carga das séries: a ingestão incremental
+# (app/ingestao.py) continua a leitura daí, e as medidas lidas duas vezes são ignoradas
+posicoes_carregadas = {}
+
+def ler_pluviometros():
+    # Medidas e estações tipadas (ver app/medidas.py); uf e offset são descartados
+    return medidas.ler(SHEETS["pluviometros"])
+
+
+def ler_hidrologicas():
+    return medidas.ler(SHEETS["hidrologicas"])
+
+
+def _carregar_pluviometros():
+    tabelas = carregar_tabelas(SHEETS["pluviometros"], ler_pluviometros)
+    return {
+        "medidas_pluviometros": tabelas["medidas"],
+        "estacoes_pluviometricas": tabelas["estacoes"],
+    }
+
+
+def _carregar_serie_pluviometrica():
+    posicoes_carregadas[SHEETS["pluviometros"]] = os.path.getsize(SHEETS["pluviometros"])
+
+    def gerar():
+        # Série por estação, ordenada no tempo e com somas acumuladas (consultas por janela em O(log n))
+        return SerieMedidas(__getattr__("medidas_pluviometros"), __getattr__("estacoes_pluviometricas"))
+
+    if MODO_DADOS == "mmap":
+        # As planilhas só são lidas se os arrays em MMAP_DIR estiverem ausentes ou desatualizados
+        arrays = ler_ou_gravar_arrays("pluviometros", SHEETS["pluviometros"], lambda: gerar().para_arrays())
+        return {"serie_pluviometrica": SerieMedidas.de_arrays(arrays)}
+    return {"serie_pluviometrica": gerar()}
+
+
+def _carregar_hidrologicas():
+    tabelas = carregar_tabelas(SHEETS["hidrologicas"], ler_hidrologicas)
+    return {
+        "medidas_hidrologicas": tabelas["medidas"],
+        "estacoes_hidrologicas": tabelas["estacoes"],
+    }
+
+
+def _carregar_serie_hidrologica():
+    posicoes_carregadas[SHEETS["hidrologicas"]] = os.path.getsize(SHEETS["hidrologicas"])
+
+    def gerar():
+        return SerieMedidas(__getattr__("medidas_hidrologicas"), __getattr__("estacoes_hidrologicas"), sensor="nível")
+
+    if MODO_DADOS == "mmap":
+        arrays = ler_ou_gravar_arrays("hidrologicas", SHEETS["hidrologicas"], lambda: gerar().para_arrays())
+        return {"serie_hidrologica": SerieMedidas.de_arrays(arrays)}
+    return {"serie_hidrologica": gerar()}
+
+
+# As planilhas são lidas (do snapshot, quando atualizado) no primeiro acesso; as séries
+# não dependem das planilhas no modo "mmap" (ver app/compartilhado.py). As séries
+# recebem as medidas novas da ingestão incremental; as planilhas ficam como foram carregadas
+__getattr__ = atributos_preguicosos(globals(), {
+    "medidas_pluviometros": _carregar_pluviometros,
+    "estacoes_pluviometricas": _carregar_pluviometros,
+    "serie_pluviometrica": _carregar_serie_pluviometrica,
+    "medidas_hidrologicas": _carregar_hidrologicas,
+    "estacoes_hidrologicas": _carregar_hidrologicas,
+    "serie_hidrologica": _carregar_serie_hidrologica,
+})
+
+
+def carregar_tudo():
+    """
+    Carrega as séries (modo "prefork", antes do fork dos workers).
+    """
+    for nome in ("serie_pluviometrica", "serie_hidrologica"):
+        __getattr__(nome)
 
 
 # class DadosMeteorologicos:
@@ -0,0 +1,174 @@
+"""
+Snapshots binários dos dados de entrada (shapefiles, planilhas e modelo).
+
+Cada snapshot fica ao lado do arquivo de origem, com um arquivo .meta.json que
+guarda o mtime e o tamanho das origens. Na carga, um snapshot desatualizado (ou
+ausente) é refeito a partir da origem; se não for possível gravá-lo (disco
+somente leitura, por exemplo), a origem é usada diretamente.
+
+O pré-processamento (gerar todos os snapshots de uma vez) fica em app/preprocessar.py.
+"""
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import geopandas as gpd
+import joblib
+import pandas as pd
+
+from .config import SNAPSHOTS_ATIVOS
+
+logger = logging.getLogger(__name__)
+
+
+def _origens(caminho):
+    # Um shapefile é formado por vários arquivos com o mesmo nome (.shp, .dbf, .shx, .prj, ...)
+    if caminho.lower().endswith(".shp"):
+        return sorted(glob.glob(os.path.splitext(caminho)[0] + ".*"))
+    return [caminho]
+
+
+def assinatura(caminho):
+    """
+    mtime e tamanho dos arquivos de origem, usados para saber se o snapshot está desatualizado.
+    """
+    return {
+        os.path.basename(origem): [os.stat(origem).st_mtime_ns, os.stat(origem).st_size]
+        for origem in _origens(caminho)
+        if ".snapshot." not in origem
+    }
+
+
+def caminho_snapshot(caminho, extensao):
+    return f"{os.path.splitext(caminho)[0]}.snapshot.{extensao}"
+
+
+def snapshot_valido(caminho, snapshot):
+    try:
+        with open(snapshot + ".meta.json") as f:
+            return os.path.exists(snapshot) and json.load(f) == assinatura(caminho)
+    except (OSError, ValueError):
+        return False
+
+
+def _substituir(gravado, snapshot):
+    if os.path.isdir(gravado) and os.path.exists(snapshot):
+        # os.replace não sobrescreve um diretório com conteúdo: o anterior sai do caminho antes
+        antigo = tempfile.mkdtemp(prefix=f".{os.path.basename(snapshot)}.antigo.", dir=os.path.dirname(snapshot) or ".")
+        os.replace(snapshot, os.path.join(antigo, "snapshot"))
+        os.replace(gravado, snapshot)
+        shutil.rmtree(antigo, ignore_errors=True)
+    else:
+        os.replace(gravado, snapshot)
+
+
+def _gravar(caminho, snapshot, gravar):
+    """
+    Grava o snapshot e o .meta.json em temporários no mesmo diretório e os troca de lugar com os.replace.
+
+    O .meta.json vai por último: outro processo nunca vê um snapshot pela metade marcado como válido.
+    """
+    temporario = None
+    try:
+        assinatura_origem = assinatura(caminho)
+        temporario = tempfile.mkdtemp(prefix=f".{os.path.basename(snapshot)}.", dir=os.path.dirname(snapshot) or ".")
+        gravado = os.path.join(temporario, os.path.basename(snapshot))
+        gravar(gravado)
+        meta = os.path.join(temporario, "meta.json")
+        with open(meta, "w") as f:
+            json.dump(assinatura_origem, f)
+        _substituir(gravado, snapshot)
+        os.replace(meta, snapshot + ".meta.json")
+    except Exception as e:
+        logger.warning("Não foi possível gravar o snapshot %s: %s", snapshot, e)
+    finally:
+        if temporario is not None:
+            shutil.rmtree(temporario, ignore_errors=True)
+
+
+def _carregar(caminho, extensao, ler_origem, ler_snapshot, gravar_snapshot):
+    if not SNAPSHOTS_ATIVOS:
+        return ler_origem()
+
+    snapshot = caminho_snapshot(caminho, extensao)
+    if snapshot_valido(caminho, snapshot):
+        try:
+            return ler_snapshot(snapshot)
+        except Exception as e:
+            # Trocado por outro processo no meio da leitura, por exemplo: a origem resolve
+            logger.warning("Erro ao ler o snapshot %s: %s", snapshot, e)
+
+    dados = ler_origem()
+    _gravar(caminho, snapshot, lambda destino: gravar_snapshot(dados, destino))
+    return dados
+
+
+def carregar_geodataframe(caminho):
+    """
+    Lê uma camada vetorial, usando o snapshot GeoParquet quando ele estiver atualizado.
+    """
+    return _carregar(
+        caminho, "parquet",
+        lambda: gpd.read_file(caminho),
+        gpd.read_parquet,
+        lambda gdf, destino: gdf.to_parquet(destino)
+    )
+
+
+def carregar_tabelas(caminho, ler_origem):
+    """
+    Lê uma planilha separada em várias tabelas por `ler_origem()` (dicionário nome -> DataFrame),
+    usando o snapshot (um diretório com um Parquet por tabela) quando ele estiver atualizado.
+    """
+    def ler_snapshot(snapshot):
+        return {
+            os.path.splitext(nome)[0]: pd.read_parquet(os.path.join(snapshot, nome))
+            for nome in sorted(os.listdir(snapshot)) if nome.endswith(".parquet")
+        }
+
+    def gravar_snapshot(tabelas, destino):
+        os.makedirs(destino, exist_ok=True)
+        for nome, tabela in tabelas.items():
+            tabela.to_parquet(os.path.join(destino, f"{nome}.parquet"), index=False)
+
+    return _carregar(caminho, "tabelas", ler_origem, ler_snapshot, gravar_snapshot)
+
+
+def carregar_modelo(caminho):
+    """
+    Lê o modelo; o snapshot é um joblib sem compressão, carregado com os arrays NumPy em memória mapeada.
+    """
+    return _carregar(
+        caminho, "joblib",
+        lambda: joblib.load(caminho),
+        lambda snapshot: joblib.load(snapshot, mmap_mode="r"),
+        lambda modelo, destino: joblib.dump(modelo, destino)
+    )
+
+
+def atributos_preguicosos(globais, carregadores):
+    """
+    Cria o __getattr__ de um módulo cujos dados só são carregados no primeiro acesso.
+
+    Args:
+        globais (dict): globals() do módulo.
+        carregadores (dict): Nome do atributo -> função que carrega um grupo de
+            atributos e os devolve num dicionário.
+    """
+    lock = threading.RLock()
+
+    def __getattr__(nome):
+        carregar = carregadores.get(nome)
+        if carregar is None:
+            raise AttributeError(f"module {globais['__name__']!r} has no attribute {nome!r}")
+        with lock:
+            if nome not in globais:
+                globais.update(carregar())
+        return globais[nome]
+
+    return __getattr__
+
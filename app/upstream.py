@@ -0,0 +1,132 @@
+import fcntl
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as EsperaVencida
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metricas
+from .config import (
+    UPSTREAM_TIMEOUT_CONEXAO, UPSTREAM_TIMEOUT_LEITURA, UPSTREAM_CONEXOES, UPSTREAM_WORKERS,
+    UPSTREAM_GEOCODIFICACAO_WORKERS, UPSTREAM_ESPERA_MAX, NOMINATIM_INTERVALO_MIN, NOMINATIM_LIMITE_CAMINHO,
+    NOMINATIM_ESPERA_MAX
+)
+
+logger = logging.getLogger(__name__)
+
+# Timeout (conexão, leitura) aplicado a toda chamada externa
+TIMEOUT = (UPSTREAM_TIMEOUT_CONEXAO, UPSTREAM_TIMEOUT_LEITURA)
+
+# Sessão compartilhada: reaproveita conexões (keep-alive) com os serviços externos
+sessao = requests.Session()
+_adaptador = HTTPAdapter(pool_connections=UPSTREAM_CONEXOES, pool_maxsize=UPSTREAM_CONEXOES)
+sessao.mount("http://", _adaptador)
+sessao.mount("https://", _adaptador)
+
+# Pool de threads para sobrepor as chamadas externas entre si e com o processamento local
+executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+# Geocodificação reversa num pool próprio: a espera pela vez no Nominatim não segura as threads de `executor`
+executor_geocodificacao = ThreadPoolExecutor(max_workers=UPSTREAM_GEOCODIFICACAO_WORKERS, thread_name_prefix="geocodificacao")
+
+
+def resultado(futuro, servico, timeout=UPSTREAM_ESPERA_MAX):
+    """
+    Resultado de uma chamada submetida a um dos pools, ou None se ele não chegar em `timeout` segundos.
+
+    None é o mesmo valor das funções de chamada externa quando o serviço falha.
+    """
+    try:
+        return futuro.result(timeout=timeout)
+    except EsperaVencida:
+        futuro.cancel()
+        metricas.incrementar("upstream_esperas_vencidas_total", "Resultados de chamadas externas não recebidos a tempo.", servico=servico)
+        logger.warning("Sem resultado de %s em %.1fs", servico, timeout)
+        return None
+
+
+class LimitadorIntervalo:
+    """
+    Garante um intervalo mínimo entre chamadas (política de uso do Nominatim público).
+
+    Cada chamada reserva o próximo horário livre e dorme até ele. Com `caminho`, o
+    horário livre fica num arquivo travado com flock, e o intervalo vale para todos
+    os processos que o compartilham (os workers do gunicorn, o backfill). Uma
+    reserva mais de `espera_max` segundos à frente é recusada: quem chama desiste
+    em vez de segurar uma thread numa fila sem fim.
+    """
+
+    def __init__(self, intervalo_min, caminho=None, espera_max=float("inf")):
+        self.intervalo_min = intervalo_min
+        self.caminho = caminho
+        self.espera_max = espera_max
+        self._proximo = 0.0
+        self._lock = threading.Lock()
+
+    def _reservar(self, agora):
+        # Devolve o horário reservado (time.time()), ou None se ele passa de espera_max
+        with self._lock:
+            if not self.caminho:
+                horario = max(agora, self._proximo)
+                if horario - agora > self.espera_max:
+                    return None
+                self._proximo = horario + self.intervalo_min
+                return horario
+
+            with open(self.caminho, "a+b") as arquivo:
+                fcntl.flock(arquivo, fcntl.LOCK_EX)
+                arquivo.seek(0)
+                try:
+                    proximo = float(arquivo.read() or 0)
+                except ValueError:
+                    proximo = 0.0
+                horario = max(agora, proximo)
+                if horario - agora > self.espera_max:
+                    return None
+                arquivo.seek(0)
+                arquivo.truncate()
+                arquivo.write(repr(horario + self.intervalo_min).encode())
+                arquivo.flush()
+                return horario
+
+    def aguardar(self):
+        """
+        Espera a vez da chamada; False se ela teria de esperar mais de `espera_max` (não chame o serviço).
+        """
+        if self.intervalo_min <= 0:
+            return True
+        agora = time.time()
+        try:
+            horario = self._reservar(agora)
+        except OSError as e:
+            logger.warning("Erro no arquivo do limite do Nominatim (%s): %s", self.caminho, e)
+            self.caminho = None
+            horario = self._reservar(agora)
+        if horario is None:
+            return False
+        if horario > agora:
+            time.sleep(horario - agora)
+        return True
+
+
+limitador_nominatim = LimitadorIntervalo(NOMINATIM_INTERVALO_MIN, NOMINATIM_LIMITE_CAMINHO, NOMINATIM_ESPERA_MAX)
+
+
+def get_json(url, params=None, headers=None):
+    """
+    GET na sessão compartilhada com timeout explícito; levanta requests.RequestException em falha.
+    """
+    servico = urlparse(url).netloc
+    metricas.incrementar("upstream_requisicoes_total", "Chamadas aos serviços externos.", servico=servico)
+    inicio = time.perf_counter()
+    try:
+        response = sessao.get(url, params=params, headers=headers, timeout=TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        metricas.incrementar("upstream_erros_total", "Chamadas aos serviços externos que falharam.", servico=servico)
+        raise
+    finally:
+        metricas.observar("upstream_duracao_segundos", "Duração das chamadas aos serviços externos.", time.perf_counter() - inicio, servico=servico)
@@ -1,34 +1,88 @@
+import logging
 import numpy as np
 from datetime import datetime, timezone
-import geopandas as gpd
-from shapely.geometry import Point
 import requests
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-from geopy.distance import geodesic
 import pandas as pd
 
-from .config import OPENWEATHER_API_KEY
+from .config import (
+    OPENWEATHER_API_KEY, OPENWEATHER_URL, NOMINATIM_URL, NOMINATIM_USER_AGENT,
+    PREVISAO_GEOHASH_PRECISAO, PREVISAO_CACHE_TTL, PREVISAO_CACHE_TAMANHO,
+    GEOCODIFICACAO_MODO, BAIRROS_COLUNA_NOME, NOMINATIM_CACHE_PATH, NOMINATIM_CACHE_PRECISAO
+)
+from . import upstream, metricas
+from .cache import CacheTTL, CacheDisco, geohash, centro_geohash
+from .indices import IndiceTrechos, IndiceRelevo, COLUNAS_RELEVO
+from .series import SerieMedidas
 
-geolocator = Nominatim(user_agent="meu_app_previsao_enchente_sp")
-geocode_reverso_com_delay = RateLimiter(geolocator.reverse, min_delay_seconds=1)
+logger = logging.getLogger(__name__)
 
-def get_neighbourhood(lat, lon):
+# Previsões do OpenWeather por célula de geohash
+cache_previsoes = CacheTTL(PREVISAO_CACHE_TAMANHO, PREVISAO_CACHE_TTL)
+
+# Respostas do Nominatim, persistidas em disco entre reinícios
+cache_nominatim = CacheDisco(NOMINATIM_CACHE_PATH)
+
+# Colunas de relevo preenchidas com 'Desconhecido' quando o ponto não cai em nenhuma unidade
+COLUNAS_RELEVO_DESCONHECIDO = ['NIVEL_1', 'GEOL_CPRM', 'GEOL_rev']
+
+def get_neighbourhood(lat, lon, indice_bairros=None):
+    """
+    Encontra o bairro de um par de coordenadas.
+
+    Com uma camada local de bairros (`indice_bairros`), a busca é feita em memória;
+    o Nominatim só é consultado se o modo permitir e o ponto cair fora da camada.
+    """
+    if indice_bairros is not None and GEOCODIFICACAO_MODO != "nominatim":
+        posicao = indice_bairros.localizar(lat, lon)
+        if posicao >= 0:
+            bairro = indice_bairros.atributos(posicao)[BAIRROS_COLUNA_NOME]
+            return bairro if isinstance(bairro, str) and bairro else "Bairro Desconhecido"
+        if GEOCODIFICACAO_MODO == "local":
+            return "Localização Não Encontrada"
+
+    return get_neighbourhood_nominatim(lat, lon)
+
+
+def get_neighbourhood_nominatim(lat, lon):
     """
-    Usa a geocodificação reversa para encontrar o bairro de um par de coordenadas.
+    Usa a geocodificação reversa (Nominatim) para encontrar o bairro, com cache persistente por célula.
     """
+    chave = geohash(lat, lon, NOMINATIM_CACHE_PRECISAO)
     try:
-        location = geocode_reverso_com_delay((lat, lon), language='pt-br', exactly_one=True)
+        bairro = cache_nominatim.obter(chave)
+        if bairro is not None:
+            metricas.incrementar("cache_nominatim_consultas_total", "Consultas ao cache persistente do Nominatim.", resultado="hit")
+            return bairro
+    except Exception as e:
+        logger.warning("Erro ao ler o cache do Nominatim: %s", e)
+    metricas.incrementar("cache_nominatim_consultas_total", "Consultas ao cache persistente do Nominatim.", resultado="miss")
+
+    bairro = _buscar_bairro_nominatim(lat, lon)
+    if bairro is not None:
+        try:
+            cache_nominatim.armazenar(chave, bairro)
+        except Exception as e:
+            logger.warning("Erro ao gravar o cache do Nominatim: %s", e)
+    return bairro
+
+
+def _buscar_bairro_nominatim(lat, lon):
+    params = {"lat": lat, "lon": lon, "format": "json", "addressdetails": 1, "accept-language": "pt-br"}
+    try:
+        if not upstream.limitador_nominatim.aguardar():
+            metricas.incrementar("nominatim_recusadas_total", "Chamadas ao Nominatim não feitas por excederem a espera máxima pela vez.")
+            return None
+        location = upstream.get_json(NOMINATIM_URL, params=params, headers={"User-Agent": NOMINATIM_USER_AGENT})
 
-        if location:
-            address = location.raw.get('address', {})
+        if location and "error" not in location:
+            address = location.get('address', {})
             bairro = address.get('suburb') or address.get('city_district') or address.get('neighbourhood')
             return bairro if bairro else "Bairro Desconhecido"
         else:
             return "Localização Não Encontrada"
 
     except Exception as e:
-        print(f"Erro na geocodificação reversa: {e}")
+        logger.warning("Erro na geocodificação reversa: %s", e)
         return
     
 
@@ -39,7 +93,8 @@ def analyze_floodable_sections(lat_evento, lon_evento, gdf_trechos_agua, raio_km
     Args:
         lat_evento (float): Latitude do ponto de interesse.
         lon_evento (float): Longitude do ponto de interesse.
-        gdf_trechos_agua (GeoDataFrame): GeoDataFrame com todos os trechos vulneráveis.
+        gdf_trechos_agua (IndiceTrechos | GeoDataFrame): Índice pré-calculado dos trechos
+            vulneráveis (ou o GeoDataFrame bruto, indexado na hora).
         raio_km (int): Raio da busca em quilômetros.
 
     Returns:
@@ -54,56 +109,57 @@ def analyze_floodable_sections(lat_evento, lon_evento, gdf_trechos_agua, raio_km
     }
 
     try:
-        # Cria um GeoDataFrame para o ponto de interesse
-        ponto_interesse = gpd.GeoDataFrame(
-            [1], geometry=[Point(lon_evento, lat_evento)], crs='EPSG:4326'
-        )
-
-        # Reprojeta os dados para um CRS métrico para o buffer
-        trechos_agua_proj = gdf_trechos_agua.to_crs('EPSG:5880')
-        ponto_proj = ponto_interesse.to_crs('EPSG:5880')
-
-        # Cria o buffer (área circular)
-        raio_em_metros = raio_km * 1000
-        buffer_area = ponto_proj.geometry.buffer(raio_em_metros)
-
-        # Filtra os trechos que intersectam o buffer usando sjoin
-        trechos_no_raio = gdf_trechos_agua.sjoin(
-            gpd.GeoDataFrame(geometry=buffer_area.to_crs(gdf_trechos_agua.crs)),
-            how="inner",
-            predicate="intersects"
-        )
-
-        if trechos_no_raio.empty:
+        indice = gdf_trechos_agua
+        if not isinstance(indice, IndiceTrechos):
+            indice = IndiceTrechos(gdf_trechos_agua)
+
+        # Índices dos trechos a até raio_km do ponto (geometrias já projetadas)
+        trechos_no_raio = indice.consultar(lat_evento, lon_evento, raio_km)
+
+        if len(trechos_no_raio) == 0:
             return features_padrao
 
         # --- Feature Engineering ---
         # 1. Contagem simples de trechos na área
-        n_trechos = len(trechos_no_raio)
-
         # 2. Contagem de trechos de "Alto Impacto"
-        n_alto_impacto = len(trechos_no_raio[trechos_no_raio['Impacto'] == 'Alto'])
-
-        # 3. Score de Risco Médio
-        mapeamento_risco = {"Baixo": 1, "Médio": 2, "Alto": 3}
-        # Usamos .get(x, 0) para tratar valores não esperados sem erro
-        score = (trechos_no_raio['Frequencia'].apply(lambda x: mapeamento_risco.get(x, 0)) +
-                 trechos_no_raio['Impacto'].apply(lambda x: mapeamento_risco.get(x, 0)) +
-                 trechos_no_raio['Vulnerabil'].apply(lambda x: mapeamento_risco.get(x, 0)))
-        risco_medio = score.mean()
-
+        # 3. Score de Risco Médio (Frequencia + Impacto + Vulnerabil, já pré-calculado)
         return {
-            'n_trechos_vulneraveis_5km': n_trechos,
-            'n_trechos_alto_impacto_5km': n_alto_impacto,
-            'risco_medio_trechos_5km': risco_medio
+            'n_trechos_vulneraveis_5km': int(len(trechos_no_raio)),
+            'n_trechos_alto_impacto_5km': int(indice.alto_impacto[trechos_no_raio].sum()),
+            'risco_medio_trechos_5km': float(indice.score[trechos_no_raio].mean())
         }
 
     except Exception as e:
-        print(f"Erro em analyze_floodable_sections: {e}")
+        logger.error("Erro em analyze_floodable_sections: %s", e)
         return features_padrao
 
 
-# Adicione esta função à sua célula de funções
+def analyze_floodable_sections_batch(lats, lons, gdf_trechos_agua, raio_km=5):
+    """
+    Versão vetorizada de analyze_floodable_sections para vários pontos.
+
+    Returns:
+        DataFrame: Uma linha por ponto, com as mesmas features.
+    """
+    indice = gdf_trechos_agua
+    if not isinstance(indice, IndiceTrechos):
+        indice = IndiceTrechos(gdf_trechos_agua)
+
+    n_pontos = len(lats)
+    pontos, trechos = indice.consultar_varios(lats, lons, raio_km)
+
+    n_trechos = np.bincount(pontos, minlength=n_pontos)
+    n_alto_impacto = np.bincount(pontos, weights=indice.alto_impacto[trechos], minlength=n_pontos)
+    soma_score = np.bincount(pontos, weights=indice.score[trechos], minlength=n_pontos)
+    risco_medio = np.divide(soma_score, n_trechos, out=np.zeros(n_pontos), where=n_trechos > 0)
+
+    return pd.DataFrame({
+        'n_trechos_vulneraveis_5km': n_trechos.astype(int),
+        'n_trechos_alto_impacto_5km': n_alto_impacto.astype(int),
+        'risco_medio_trechos_5km': risco_medio
+    })
+
+
 def analyze_local_relief(lat_evento, lon_evento, gdf_relevo):
     """
     Encontra a unidade de relevo para uma dada coordenada e extrai os atributos.
@@ -111,55 +167,73 @@ def analyze_local_relief(lat_evento, lon_evento, gdf_relevo):
     Args:
         lat_evento (float): Latitude do ponto de interesse.
         lon_evento (float): Longitude do ponto de interesse.
-        gdf_relevo (GeoDataFrame): GeoDataFrame com os polígonos do relevo.
+        gdf_relevo (IndiceRelevo | GeoDataFrame): Índice pré-calculado do relevo
+            (ou o GeoDataFrame bruto com os polígonos, indexado na hora).
 
     Returns:
         dict: Um dicionário com as features de relevo.
     """
 
-    colunas_relevo = [
-        'NIVEL_1', 'DECLIV_MED', 'AMPLIT_ALT',
-        'DDREN_MED', 'E_HIDR_MED', 'GEOL_CPRM', 'GEOL_rev'
-    ]
-
     # Dicionário padrão com valores nulos (ou 'Desconhecido') caso não encontre
-    features_padrao = {col: np.nan for col in colunas_relevo}
-    features_padrao['NIVEL_1'] = 'Desconhecido'
-    features_padrao['GEOL_CPRM'] = 'Desconhecido'
-    features_padrao['GEOL_rev'] = 'Desconhecido'
+    features_padrao = {col: np.nan for col in COLUNAS_RELEVO}
+    for coluna in COLUNAS_RELEVO_DESCONHECIDO:
+        features_padrao[coluna] = 'Desconhecido'
 
     try:
-        # Cria o ponto a partir da coordenada
-        ponto = Point(lon_evento, lat_evento)
+        indice = gdf_relevo
+        if not isinstance(indice, IndiceRelevo):
+            indice = IndiceRelevo(gdf_relevo)
 
         # Encontra o polígono de relevo que contém o ponto
-        # A operação gdf.contains(ponto) retorna uma série booleana
-        unidade_relevo = gdf_relevo[gdf_relevo.contains(ponto)]
+        posicao = indice.localizar(lat_evento, lon_evento)
 
         # Se não encontrar nenhum polígono, retorna o padrão
-        if unidade_relevo.empty:
+        if posicao < 0:
             return features_padrao
 
-        # Se encontrou, pega a primeira (e única) linha
-        dados_encontrados = unidade_relevo.iloc[0]
-
         # Extrai os valores das colunas de interesse para um dicionário
-        features_extraidas = dados_encontrados[colunas_relevo].to_dict()
-
-        return features_extraidas
+        return indice.atributos(posicao)
 
     except Exception as e:
-        print(f"Erro em analyze_local_relief: {e}")
+        logger.error("Erro em analyze_local_relief: %s", e)
         return features_padrao
+
+
+def analyze_local_relief_batch(lats, lons, gdf_relevo):
+    """
+    Versão vetorizada de analyze_local_relief para vários pontos.
+
+    Returns:
+        DataFrame: Uma linha por ponto, com as mesmas features.
+    """
+    indice = gdf_relevo
+    if not isinstance(indice, IndiceRelevo):
+        indice = IndiceRelevo(gdf_relevo)
+
+    posicoes = indice.localizar_varios(lats, lons)
+    features = indice.atributos_varios(posicoes)
+    for coluna in COLUNAS_RELEVO_DESCONHECIDO:
+        features.loc[posicoes < 0, coluna] = 'Desconhecido'
+    return features
     
 
 def get_weather_forecast_24h(lat, lon):
+    """
+    Previsão do tempo para as próximas 24 horas, compartilhada por célula de geohash.
+
+    Pontos na mesma célula usam a previsão do centro da célula, guardada em cache
+    por PREVISAO_CACHE_TTL segundos; pedidos simultâneos da mesma célula geram uma única chamada.
+    """
+    celula = geohash(lat, lon, PREVISAO_GEOHASH_PRECISAO)
+    previsao = cache_previsoes.obter_ou_calcular(celula, lambda: _buscar_previsao_24h(*centro_geohash(celula)))
+    return dict(previsao) if previsao is not None else None
+
+
+def _buscar_previsao_24h(lat, lon):
     """Busca a previsão do tempo para as próximas 24 horas (em intervalos de 3h)."""
-    url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric&lang=pt_br"
+    params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric", "lang": "pt_br"}
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        data = upstream.get_json(OPENWEATHER_URL, params=params)
 
         forecast_data = {
             # "city_name": data['city']['name'],
@@ -187,129 +261,123 @@ def get_weather_forecast_24h(lat, lon):
         return forecast_data
 
     except requests.exceptions.RequestException as e:
-        print(f"Erro ao chamar a API do OpenWeather (Forecast): {e}")
+        logger.warning("Erro ao chamar a API do OpenWeather (Forecast): %s", e)
         return None
     
 
+def _janelas_acumuladas(datahora_ref):
+    return [
+        (datahora_ref - pd.Timedelta(hours=24), datahora_ref),
+        (datahora_ref - pd.Timedelta(hours=48), datahora_ref),
+    ]
+
+
+def _janelas_diarias(data_evento, max_dias_verificar):
+    # Normaliza a data do evento para garantir que começamos a verificação a partir do dia anterior
+    data_base = data_evento.normalize()
+    return [
+        (data_base - pd.Timedelta(days=i), data_base - pd.Timedelta(days=i-1) - pd.Timedelta(seconds=1))
+        for i in range(1, max_dias_verificar + 1)
+    ]
+
+
+def _contar_dias_consecutivos(chuva_por_dia, limiar_chuva):
+    """
+    Conta, para cada linha (ponto), quantos dias seguidos a partir do primeiro ficaram acima do limiar.
+    """
+    # Se não choveu num dia (ou não há dado), a sequência é quebrada
+    choveu = chuva_por_dia > limiar_chuva
+    return np.where(choveu.all(axis=1), choveu.shape[1], np.argmin(choveu, axis=1))
+
+
 def accumulated_rain(lat_evento, lon_evento, datahora_ref, medidas, estacoes, chuva_prox_24h=0):
-    
-    chuva_24h = chuva_idw(lat_evento, lon_evento, datahora_ref - pd.Timedelta(hours=24), datahora_ref, medidas, estacoes)
-    chuva_48h = chuva_idw(lat_evento, lon_evento, datahora_ref - pd.Timedelta(hours=48), datahora_ref, medidas, estacoes)
 
-    print("Chuva 24h calculada:", chuva_24h)
-    print("Chuva 48h calculada:", chuva_48h)
+    # As duas janelas são interpoladas numa única passada (distâncias calculadas uma vez)
+    chuva_24h, chuva_48h = chuva_idw_janelas(lat_evento, lon_evento, _janelas_acumuladas(datahora_ref), medidas, estacoes)[0]
+
+    logger.debug("Chuva 24h calculada: %s", chuva_24h)
+    logger.debug("Chuva 48h calculada: %s", chuva_48h)
 
     # O valor de chuva 48 será as próximas 24h + as 24h anteriores
     # O valor de chuva 72 será as próximas 24h + as 48h anteriores
     return {"chuva_48h": chuva_24h + chuva_prox_24h, "chuva_72h": chuva_48h + chuva_prox_24h}
 
 
+def accumulated_rain_batch(lats, lons, datahora_ref, medidas, estacoes, chuva_prox_24h=0):
+    """
+    Versão vetorizada de accumulated_rain; `chuva_prox_24h` pode ter um valor por ponto.
+    """
+    chuva = chuva_idw_janelas(lats, lons, _janelas_acumuladas(datahora_ref), medidas, estacoes)
+    return pd.DataFrame({
+        "chuva_48h": chuva[:, 0] + chuva_prox_24h,
+        "chuva_72h": chuva[:, 1] + chuva_prox_24h
+    })
+
+
 def consecutive_rainy_days(lat_evento, lon_evento, data_evento, medidas, estacoes, limiar_chuva=0.2, max_dias_verificar=30, k=5, p=2, max_dist_km=20):
     """
     Calcula o número de dias consecutivos com chuva acima de um limiar
     antes da data do evento.
     """
-    dias_consecutivos = 0
-    # Normaliza a data do evento para garantir que começamos a verificação a partir do dia anterior
-    data_base = data_evento.normalize()
+    return int(consecutive_rainy_days_batch(
+        [lat_evento], [lon_evento], data_evento, medidas, estacoes, limiar_chuva, max_dias_verificar, k, p, max_dist_km
+    )[0])
 
-    # Loop para verificar os dias anteriores, até o limite de 'max_dias_verificar'
-    for i in range(1, max_dias_verificar + 1):
-        # Define a janela de 24h para o dia anterior que estamos verificando
-        dia_verificar_fim = data_base - pd.Timedelta(days=i-1) - pd.Timedelta(seconds=1)
-        dia_verificar_inicio = data_base - pd.Timedelta(days=i)
 
-        # Usa a função chuva_idw para calcular o total de chuva nesse dia
-        chuva_do_dia = chuva_idw(lat_evento, lon_evento, dia_verificar_inicio, dia_verificar_fim, medidas, estacoes)
+def consecutive_rainy_days_batch(lats, lons, data_evento, medidas, estacoes, limiar_chuva=0.2, max_dias_verificar=30, k=5, p=2, max_dist_km=20):
+    """
+    Versão vetorizada de consecutive_rainy_days: chuva de todos os dias, em todos os pontos, de uma vez.
+    """
+    janelas = _janelas_diarias(data_evento, max_dias_verificar)
+    chuva_por_dia = chuva_idw_janelas(lats, lons, janelas, medidas, estacoes, k, p, max_dist_km)
+    return _contar_dias_consecutivos(chuva_por_dia, limiar_chuva)
 
-        # Se a chuva no dia for maior que o limiar, incrementa o contador
-        if chuva_do_dia > limiar_chuva:
-            dias_consecutivos += 1
-        else:
-            # Se não choveu, a sequência é quebrada, então paramos o loop
-            break
 
-    return dias_consecutivos
+def _serie(medidas, estacoes, sensor=None):
+    return medidas if isinstance(medidas, SerieMedidas) else SerieMedidas(medidas, estacoes, sensor)
 
 
-def chuva_idw(lat_evento, lon_evento, inicio, fim, medidas, estacoes, k=5, p=2, max_dist_km=20):
+def chuva_idw_janelas(lats, lons, janelas, medidas, estacoes, k=5, p=2, max_dist_km=20):
+    """
+    Interpola (IDW) a chuva acumulada de várias janelas em vários pontos de uma só vez.
 
-    # Filtra medidas no período
-    medidas_periodo = medidas[medidas["datahora"].between(inicio, fim)]
-    chuva_estacoes = medidas_periodo.groupby("codEstacao")["valorMedida"].sum().reset_index()
+    Args:
+        lats, lons (float | array): Coordenadas dos pontos.
+        janelas (list): Lista de pares (inicio, fim).
+        medidas (SerieMedidas | DataFrame): Série pré-calculada dos pluviômetros
+            (ou o DataFrame bruto das medidas, indexado na hora).
+        estacoes (MotorIDW | DataFrame): Estações das medidas (ignorado se `medidas` já é uma série).
 
-    # Junta com lat/lon
-    chuva_estacoes = chuva_estacoes.merge(estacoes, on="codEstacao", how="inner")
+    Returns:
+        ndarray: Matriz (n_pontos, n_janelas), com NaN onde não há estação no raio.
+    """
+    serie = _serie(medidas, estacoes)
+    chuva_estacoes = serie.somas(janelas)
+    return serie.motor.interpolar(serie.motor.distancias(lats, lons), chuva_estacoes, k, p, max_dist_km)
 
-    # Calcula distâncias
-    chuva_estacoes["dist"] = [
-        geodesic((lat_evento, lon_evento), (float(lat), float(lon))).km
-        for lat, lon in zip(chuva_estacoes["latitude"], chuva_estacoes["longitude"])
-    ]
 
-    # Filtra estações dentro do raio
-    chuva_estacoes = chuva_estacoes[chuva_estacoes["dist"] <= max_dist_km]
+def chuva_idw(lat_evento, lon_evento, inicio, fim, medidas, estacoes, k=5, p=2, max_dist_km=20):
 
-    if chuva_estacoes.empty:
-        print("Nenhuma estação dentro do raio máximo.")
-        return np.nan
+    chuva = chuva_idw_janelas(lat_evento, lon_evento, [(inicio, fim)], medidas, estacoes, k, p, max_dist_km)[0, 0]
 
-    # Seleciona até k mais próximos
-    vizinhos = chuva_estacoes.nsmallest(k, "dist")
+    if np.isnan(chuva):
+        logger.debug("Nenhuma estação dentro do raio máximo.")
 
-    # Se tiver estação exatamente no ponto
-    if any(vizinhos["dist"] == 0):
-        return vizinhos.loc[vizinhos["dist"] == 0, "valorMedida"].values[0]
+    return chuva
 
-    # IDW
-    weights = 1 / (vizinhos["dist"] ** p)
-    chuva = (vizinhos["valorMedida"] * weights).sum() / weights.sum()
 
-    return chuva
+def niveis_rio_proximos(lats, lons, inicio, fim, medidas_hidro, estacoes_hidro, max_dist_km=20):
+    """
+    Nível médio no período da estação hidrológica mais próxima de cada ponto.
+    """
+    serie = _serie(medidas_hidro, estacoes_hidro, sensor='nível')
+    # Calcula a MÉDIA do nível de cada estação no período
+    nivel_estacoes = serie.medias([(inicio, fim)])[0]
+    return serie.motor.mais_proxima(serie.motor.distancias(lats, lons), nivel_estacoes, max_dist_km)
 
 
 def obter_nivel_rio_proximo(lat_evento, lon_evento, inicio, fim, medidas_hidro, estacoes_hidro, max_dist_km=20):
     """
     Encontra a estação hidrológica mais próxima e retorna o seu NÍVEL MÉDIO no período.
     """
-    medidas_periodo = medidas_hidro[medidas_hidro["datahora"].between(inicio, fim)]
-    if medidas_periodo.empty:
-        return np.nan
-
-    # Filtra pelo sensor de 'nível'
-    medidas_nivel = medidas_periodo[medidas_periodo['sensor'] == 'nível']
-    if medidas_nivel.empty:
-        return np.nan
-
-    # Calcula a MÉDIA do nível para cada estação no período
-    dados_estacoes = medidas_nivel.groupby('codEstacao', as_index=False).agg(valorMedida=('valorMedida', 'mean'))
-    dados_estacoes.dropna(subset=['valorMedida'], inplace=True)
-    if dados_estacoes.empty:
-        return np.nan
-
-    # Junta com os dados das estações para obter as coordenadas
-    dados_estacoes = dados_estacoes.merge(estacoes_hidro, on="codEstacao", how="inner")
-    if dados_estacoes.empty:
-        return np.nan
-
-    # Calcula a distância do evento para TODAS as estações
-    dados_estacoes["dist"] = dados_estacoes.apply(
-        lambda r: geodesic((lat_evento, lon_evento), (r["latitude"], r["longitude"])).km,
-        axis=1
-    )
-
-    # Filtra as estações que estão dentro do raio máximo
-    estacoes_no_raio = dados_estacoes[dados_estacoes["dist"] <= max_dist_km]
-    if estacoes_no_raio.empty:
-        return np.nan
-
-    # --- LÓGICA PRINCIPAL ALTERADA ---
-    # Encontra a 1 estação mais próxima (a linha com a menor distância)
-    vizinho_mais_proximo = estacoes_no_raio.nsmallest(1, 'dist')
-
-    # Se, por algum motivo, não encontrar, retorna NaN
-    if vizinho_mais_proximo.empty:
-        return np.nan
-
-    # Retorna o valor de medida da estação mais próxima
-    return vizinho_mais_proximo['valorMedida'].iloc[0]
\ No newline at end of file
+    return niveis_rio_proximos(lat_evento, lon_evento, inicio, fim, medidas_hidro, estacoes_hidro, max_dist_km)[0]
@@ -0,0 +1,11 @@
+# Configuração do gunicorn: gunicorn -c gunicorn.conf.py run:app
+#
+# Com preload_app, create_app() roda uma vez no processo mestre antes do fork. Com
+# MODO_DADOS=prefork ou mmap, os dados são carregados nesse momento e os workers
+# compartilham as páginas em vez de cada um manter a sua cópia (ver app/compartilhado.py).
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
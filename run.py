@@ -1,6 +1,13 @@
 from app import create_app
+from app.config import SERVIDOR, SERVIDOR_HOST, SERVIDOR_PORTA, SERVIDOR_TIMEOUT_OCIOSO, FLASK_DEBUG, LOG_LEVEL
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    if SERVIDOR in ("asgi", "uvicorn"):
+        import uvicorn
+        from app.asgi import AplicacaoASGI
+        uvicorn.run(AplicacaoASGI(app), host=SERVIDOR_HOST, port=SERVIDOR_PORTA, timeout_keep_alive=SERVIDOR_TIMEOUT_OCIOSO,
+                    log_level=LOG_LEVEL.lower())
+    else:
+        app.run(host=SERVIDOR_HOST, port=SERVIDOR_PORTA, debug=FLASK_DEBUG)
@@ -0,0 +1,42 @@
+"""
+Tabela das predições agendadas: pontos do arquivo pela coordenada, células dos limites pelo geohash.
+"""
+import pytest
+
+from app import agendamento
+from app.cache import centro_geohash, geohash
+
+
+@pytest.fixture
+def tabela(monkeypatch):
+    def prever_pontos(pontos, data_atual):
+        return [{**ponto, "prediction": indice} for indice, ponto in enumerate(pontos)]
+
+    monkeypatch.setattr(agendamento, "prever_pontos", prever_pontos)
+    monkeypatch.setattr(agendamento, "PREVISAO_AGENDADA_INTERVALO", 600)
+    celula = geohash(-23.40, -46.40, 6)
+    lat, lon = centro_geohash(celula)
+    pontos = [
+        # Dois pontos do arquivo na mesma célula de precisão 6
+        {"lat": -23.55052, "lon": -46.633308},
+        {"lat": -23.55100, "lon": -46.634000},
+        {"lat": lat, "lon": lon, "id": celula, "celula": celula},
+    ]
+    assert geohash(-23.55052, -46.633308, 6) == geohash(-23.551, -46.634, 6)
+    monkeypatch.setattr(agendamento, "_tabela", agendamento.calcular_tabela(pontos))
+    return celula
+
+
+def test_pontos_da_mesma_celula_nao_se_sobrescrevem(tabela):
+    assert agendamento.consultar(-23.55052, -46.633308)["prediction"] == 0
+    assert agendamento.consultar(-23.55100, -46.634000)["prediction"] == 1
+
+
+def test_ponto_do_arquivo_nao_cobre_a_celula(tabela):
+    assert agendamento.consultar(-23.5530, -46.6350) is None
+
+
+def test_celula_dos_limites_cobre_os_pontos_dentro_dela(tabela):
+    lat, lon = centro_geohash(tabela)
+    assert agendamento.consultar(lat + 0.001, lon + 0.001)["prediction"] == 2
+    assert len(agendamento.resumo()["itens"]) == 3
@@ -0,0 +1,122 @@
+"""
+Alertas com vários workers: um só avaliador, eventos numerados numa sequência comum a todos.
+"""
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+
+from app import alertas, agendamento, create_app, ingestao, model
+
+
+@pytest.fixture
+def log(monkeypatch, tmp_path):
+    monkeypatch.setattr(alertas, "ALERTAS_CAMINHO", str(tmp_path / "alertas.json"))
+    monkeypatch.setattr(alertas, "ALERTAS_EVENTOS_CAMINHO", str(tmp_path / "eventos.sqlite"))
+    # Estado de um worker recém-iniciado
+    for nome, valor in {"_banco": None, "_seq": 0, "_pid_avaliador": None, "_trava_avaliador": None,
+                        "_vigias": {}, "_mtime_vigias": None, "_indice": {}, "_celulas": {}}.items():
+        monkeypatch.setattr(alertas, nome, valor)
+    monkeypatch.setattr(alertas, "_eventos", alertas.deque(maxlen=alertas.ALERTAS_HISTORICO))
+    monkeypatch.setattr(alertas, "_estados", {})
+    monkeypatch.setattr(alertas, "_pendentes", set())
+    # Os índices por estação dependem das séries de data/, fora do escopo destes testes
+    monkeypatch.setattr(alertas, "_indexar_estacoes", lambda destino, vigias: (None, {}))
+    return tmp_path
+
+
+def _evento(identificador, tipo="alerta"):
+    return {"tipo": tipo, "id": identificador, "metrica": "chuva_24h", "valor": 30.0, "limite": 25.0}
+
+
+def _avaliador_em_outro_worker(publicado, encerrar, eleito):
+    eleito.value = alertas._eleger()
+    alertas._publicar([_evento("a"), _evento("b"), _evento("a", "normalizado")])
+    publicado.set()
+    encerrar.wait(10)
+
+
+def test_seq_comum_e_troca_de_avaliador(log):
+    contexto = multiprocessing.get_context("fork")
+    publicado, encerrar, eleito = contexto.Event(), contexto.Event(), contexto.Value("b", 0)
+    outro = contexto.Process(target=_avaliador_em_outro_worker, args=(publicado, encerrar, eleito))
+    outro.start()
+    try:
+        assert publicado.wait(10) and eleito.value
+        # O outro worker detém a trava: este só lê o log
+        assert not alertas._eleger()
+        assert alertas.ultimo_seq() == 3
+        eventos, ultimo = alertas.aguardar(0, 0)
+        assert [(evento["seq"], evento["id"]) for evento in eventos] == [(1, "a"), (2, "b"), (3, "a")]
+        # Last-Event-ID recebido de outro worker: continua dali, sem repetir
+        eventos, ultimo = alertas.aguardar(2, 0, {"a"})
+        assert [evento["seq"] for evento in eventos] == [3] and ultimo == 3
+    finally:
+        encerrar.set()
+        outro.join(10)
+
+    # Com o avaliador encerrado, a trava fica livre e a sequência continua
+    assert alertas._eleger()
+    alertas._publicar([_evento("b", "normalizado")])
+    eventos, _ = alertas.aguardar(3, 0)
+    assert [evento["seq"] for evento in eventos] == [4]
+
+
+def test_novo_avaliador_retoma_os_estados_gravados(log):
+    alertas.registrar([{"id": "a", "lat": -23.55, "lon": -46.63, "limites": {"chuva_24h": 25.0}}])
+    # Avaliação feita por um avaliador anterior
+    alertas._estados["a"] = {"disparados": {"chuva_24h": True}, "valores": {"chuva_24h": 30.0}, "avaliado_em": "2025-09-01T12:00:00", "avaliado_em_ts": 0.0}
+    alertas._gravar_estados(["a"])
+    alertas._estados.clear()
+
+    assert alertas.listar()[0]["disparados"] == {"chuva_24h": True}
+    assert alertas._eleger()
+    assert alertas._estados["a"]["disparados"] == {"chuva_24h": True}
+    assert alertas._pendentes == {"a"}
+
+    alertas.remover("a")
+    assert alertas._estados_gravados() == {}
+
+
+def test_stream_fora_do_modo_asgi(monkeypatch):
+    for modulo in (ingestao, agendamento, alertas):
+        monkeypatch.setattr(modulo, "iniciar", lambda: None)
+    resposta = create_app().test_client().get("/alerts/stream")
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"]
+
+
+def test_long_poll_sem_espera_fora_do_modo_asgi(log, monkeypatch):
+    for modulo in (ingestao, agendamento, alertas):
+        monkeypatch.setattr(modulo, "iniciar", lambda: None)
+    monkeypatch.setattr(alertas, "ativo", lambda: True)
+    cliente = create_app().test_client()
+    inicio = time.perf_counter()
+    resposta = cliente.get("/alerts?desde=0&espera=30")
+    assert time.perf_counter() - inicio < 1
+    assert resposta.get_json() == {"eventos": [], "ultimo": 0}
+
+
+def test_consulta_em_memoria_nao_espera_pelo_log(log):
+    alertas._publicar([_evento("a"), _evento("b")])
+    # Outra thread gravando no log: a consulta do laço de eventos não passa pela trava
+    with alertas._banco_lock:
+        assert alertas.ultimo_seq(ler=False) == 2
+        eventos, ultimo = alertas.aguardar(0, 0, ler=False)
+        assert [evento["seq"] for evento in eventos] == [1, 2] and ultimo == 2
+        # Last-Event-ID à frente da cópia em memória (evento ainda não lido do log): mantido, sem repetir o histórico
+        assert alertas.aguardar(5, 0, ler=False) == ([], 5)
+
+
+def test_risco_com_classes_nao_numericas(monkeypatch):
+    class Modelo:
+        classes_ = np.array(["alto", "baixo", "medio"])
+
+    monkeypatch.setitem(vars(model), "model", Modelo())
+    assert alertas._niveis_risco(np.array([0, 2])).tolist() == [0.0, 2.0]
+    # Rótulos de texto: a posição em classes_
+    assert alertas._niveis_risco(np.array(["baixo", "medio"], dtype=object)).tolist() == [1.0, 2.0]
+
+    monkeypatch.setitem(vars(model), "model", object())
+    assert np.isnan(alertas._niveis_risco(np.array(["baixo"], dtype=object))).all()
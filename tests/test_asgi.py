@@ -0,0 +1,97 @@
+"""
+Controle de carga do modo ASGI: limite global de admissão acima dos limites por rota e respostas em partes.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask, Response, request, stream_with_context
+
+from app import agendamento, alertas, ingestao
+from app.asgi import AplicacaoASGI
+
+
+@pytest.fixture
+def aplicacao(monkeypatch):
+    for modulo in (ingestao, agendamento, alertas):
+        monkeypatch.setattr(modulo, "iniciar", lambda: None)
+    flask_app = Flask(__name__)
+
+    @flask_app.route("/lenta")
+    def lenta():
+        time.sleep(0.3)
+        return "ok"
+
+    @flask_app.route("/outra")
+    def outra():
+        time.sleep(0.3)
+        return "ok"
+
+    @flask_app.route("/partes")
+    def partes():
+        def gerar():
+            yield request.args["primeira"]
+            # A segunda parte só sai depois que a primeira chegou ao cliente
+            aplicacao.primeira_enviada.wait(5)
+            yield "segunda"
+        return Response(stream_with_context(gerar()))
+
+    # Rotas com folga; o que limita é a admissão (2 vagas, 1 na fila)
+    aplicacao = AplicacaoASGI(flask_app, workers=2, limites={}, limite_padrao=10, fila_max=10, espera_max=5,
+                              degradado=False, admissao_max=8, admissao_fila_max=1)
+    aplicacao.primeira_enviada = threading.Event()
+    yield aplicacao
+    if aplicacao._avisar_alertas in alertas.ouvintes:
+        alertas.ouvintes.remove(aplicacao._avisar_alertas)
+    aplicacao.executor.shutdown(wait=True)
+
+
+async def _requisitar(aplicacao, caminho):
+    scope = {"type": "http", "method": "GET", "path": caminho, "query_string": b"", "headers": []}
+    mensagens = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensagem):
+        mensagens.append(mensagem)
+
+    await aplicacao(scope, receive, send)
+    return mensagens[0]["status"]
+
+
+def test_admissao_limitada_ao_pool(aplicacao):
+    assert aplicacao.admissao.limite == 2
+
+    async def rodar():
+        return await asyncio.gather(*(_requisitar(aplicacao, "/lenta" if i % 2 else "/outra") for i in range(6)))
+
+    status = asyncio.run(rodar())
+    # 2 em execução e 1 na fila; as demais são descartadas na hora, mesmo com vaga nas rotas
+    assert sorted(status) == [200, 200, 200, 503, 503, 503]
+    assert aplicacao.admissao.na_fila == 0 and aplicacao.admissao.em_execucao == 0
+    assert all(limite.em_execucao == 0 and not limite.semaforo.locked() for limite in aplicacao.limites.values())
+
+
+def test_resposta_em_partes(aplicacao):
+    mensagens = []
+
+    async def rodar():
+        scope = {"type": "http", "method": "GET", "path": "/partes", "query_string": b"primeira=um", "headers": []}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(mensagem):
+            mensagens.append(mensagem)
+            if mensagem.get("body") == b"um":
+                aplicacao.primeira_enviada.set()
+
+        await aplicacao(scope, receive, send)
+
+    asyncio.run(rodar())
+    assert mensagens[0]["status"] == 200
+    assert not any(nome == b"content-length" for nome, _ in mensagens[0]["headers"])
+    assert [(mensagem["body"], mensagem["more_body"]) for mensagem in mensagens[1:]] == [(b"um", True), (b"segunda", True), (b"", False)]
+    assert aplicacao.admissao.em_execucao == 0 and not aplicacao.admissao.semaforo.locked()
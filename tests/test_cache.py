@@ -0,0 +1,123 @@
+"""
+Cliente RESP de CacheRedis contra um servidor falso: AUTH/SELECT, respostas inválidas e conexões fechadas.
+"""
+import socketserver
+import threading
+
+import pytest
+
+from app.cache import CacheRedis
+
+
+class _Servidor(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Sessao)
+        self.dados = {}
+        self.comandos = []
+        self.conexoes = 0
+        self.fechadas = 0
+        self.resposta_invalida = False
+        self.encerrada = threading.Condition()
+
+
+class _Sessao(socketserver.StreamRequestHandler):
+    def handle(self):
+        servidor = self.server
+        servidor.conexoes += 1
+        try:
+            while True:
+                linha = self.rfile.readline()
+                if not linha:
+                    return
+                partes = []
+                for _ in range(int(linha[1:-2])):
+                    tamanho = int(self.rfile.readline()[1:-2])
+                    partes.append(self.rfile.read(tamanho + 2)[:-2].decode())
+                servidor.comandos.append(partes)
+                self.wfile.write(self._responder(partes))
+        finally:
+            with servidor.encerrada:
+                servidor.fechadas += 1
+                servidor.encerrada.notify_all()
+
+    def _responder(self, partes):
+        servidor = self.server
+        comando = partes[0]
+        if comando == "AUTH":
+            return b"+OK\r\n" if partes[1] == "segredo" else b"-WRONGPASS invalid password\r\n"
+        if comando == "SELECT":
+            return b"+OK\r\n"
+        if servidor.resposta_invalida:
+            return b"$abc\r\n"
+        if comando == "SET":
+            servidor.dados[partes[1]] = partes[2].encode()
+            return b"+OK\r\n"
+        if comando == "GET":
+            valor = servidor.dados.get(partes[1])
+            return b"$-1\r\n" if valor is None else b"$%d\r\n%s\r\n" % (len(valor), valor)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.fixture
+def servidor():
+    servidor = _Servidor()
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _url(servidor, senha="segredo"):
+    return f"redis://:{senha}@127.0.0.1:{servidor.server_address[1]}/2"
+
+
+def _aguardar_fechadas(servidor, quantidade):
+    with servidor.encerrada:
+        return servidor.encerrada.wait_for(lambda: servidor.fechadas >= quantidade, timeout=5)
+
+
+def test_grava_e_le_com_auth_e_select(servidor):
+    cache = CacheRedis(_url(servidor), ttl_segundos=60)
+    assert cache.obter("a") is None
+    cache.armazenar("a", {"corpo": "ok"})
+    assert cache.obter("a") == {"corpo": "ok"}
+    assert servidor.comandos[:2] == [["AUTH", "segredo"], ["SELECT", "2"]]
+    assert ["SET", "floodguard:a", '{"corpo": "ok"}', "EX", "60"] in servidor.comandos
+    assert servidor.conexoes == 1
+
+
+def test_auth_recusado_nao_guarda_a_conexao(servidor):
+    cache = CacheRedis(_url(servidor, senha="errada"))
+    for tentativa in range(1, 3):
+        with pytest.raises(RuntimeError, match="WRONGPASS"):
+            cache.obter("a")
+        # Cada tentativa abre uma conexão nova e fecha a recusada
+        assert servidor.conexoes == tentativa
+        assert _aguardar_fechadas(servidor, tentativa)
+    assert not any(comando[0] == "GET" for comando in servidor.comandos)
+
+
+def test_resposta_invalida_fecha_a_conexao(servidor):
+    cache = CacheRedis(_url(servidor))
+    cache.armazenar("a", 1)
+    servidor.resposta_invalida = True
+    with pytest.raises(ValueError):
+        cache.obter("a")
+    assert _aguardar_fechadas(servidor, 1)
+
+    # A próxima chamada reconecta em vez de ler o resto da resposta anterior
+    servidor.resposta_invalida = False
+    assert cache.obter("a") == 1
+    assert servidor.conexoes == 2
+
+
+def test_erro_do_servidor_mantem_a_conexao(servidor):
+    cache = CacheRedis(_url(servidor))
+    with pytest.raises(RuntimeError, match="unknown command"):
+        cache._comando("PING")
+    assert cache.obter("a") is None
+    assert servidor.conexoes == 1 and servidor.fechadas == 0
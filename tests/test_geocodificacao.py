@@ -0,0 +1,72 @@
+"""
+Geocodificação reversa pela camada local de bairros, com uma camada sintética de dois polígonos.
+"""
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from app import shapefiles, utils
+from app.indices import IndicePoligonos
+
+
+@pytest.fixture
+def bairros():
+    return gpd.GeoDataFrame(
+        {"nome": ["Centro", "Vila Nova"]},
+        geometry=[box(-46.70, -23.60, -46.60, -23.50), box(-46.60, -23.60, -46.50, -23.50)],
+        crs="EPSG:4326",
+    )
+
+
+@pytest.fixture
+def nominatim(monkeypatch):
+    chamadas = []
+
+    def buscar(lat, lon):
+        chamadas.append((lat, lon))
+        return "Bairro do Nominatim"
+
+    monkeypatch.setattr(utils, "get_neighbourhood_nominatim", buscar)
+    monkeypatch.setattr(utils, "BAIRROS_COLUNA_NOME", "nome")
+    return chamadas
+
+
+@pytest.mark.parametrize("modo", ["auto", "local"])
+def test_ponto_dentro_de_um_poligono(bairros, nominatim, monkeypatch, modo):
+    monkeypatch.setattr(utils, "GEOCODIFICACAO_MODO", modo)
+    indice = IndicePoligonos(bairros, ["nome"])
+    assert utils.get_neighbourhood(-23.55, -46.65, indice) == "Centro"
+    assert utils.get_neighbourhood(-23.55, -46.55, indice) == "Vila Nova"
+    assert nominatim == []
+
+
+def test_ponto_fora_da_camada(bairros, nominatim, monkeypatch):
+    indice = IndicePoligonos(bairros, ["nome"])
+
+    monkeypatch.setattr(utils, "GEOCODIFICACAO_MODO", "auto")
+    assert utils.get_neighbourhood(-22.0, -45.0, indice) == "Bairro do Nominatim"
+    assert nominatim == [(-22.0, -45.0)]
+
+    monkeypatch.setattr(utils, "GEOCODIFICACAO_MODO", "local")
+    assert utils.get_neighbourhood(-22.0, -45.0, indice) == "Localização Não Encontrada"
+    assert len(nominatim) == 1
+
+
+def test_modo_nominatim_ignora_a_camada(bairros, nominatim, monkeypatch):
+    monkeypatch.setattr(utils, "GEOCODIFICACAO_MODO", "nominatim")
+    indice = IndicePoligonos(bairros, ["nome"])
+    assert utils.get_neighbourhood(-23.55, -46.65, indice) == "Bairro do Nominatim"
+
+
+def test_sem_camada_usa_o_nominatim(nominatim, monkeypatch):
+    monkeypatch.setattr(utils, "GEOCODIFICACAO_MODO", "auto")
+    assert utils.get_neighbourhood(-23.55, -46.65, None) == "Bairro do Nominatim"
+
+
+def test_coluna_de_nome_ausente(bairros, monkeypatch, tmp_path):
+    caminho = tmp_path / "bairros.geojson"
+    bairros.rename(columns={"nome": "NM_BAIRRO"}).to_file(caminho, driver="GeoJSON")
+    monkeypatch.setitem(shapefiles.SHAPEFILES, "bairros", str(caminho))
+    monkeypatch.setattr(shapefiles, "BAIRROS_COLUNA_NOME", "nome")
+    with pytest.raises(ValueError, match="NM_BAIRRO"):
+        shapefiles._carregar_bairros()
@@ -0,0 +1,114 @@
+"""
+Paridade da inferência compilada com `model.predict` em pipelines pequenos.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import make_pipeline, Pipeline
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder, OrdinalEncoder, StandardScaler
+from sklearn.tree import DecisionTreeRegressor
+
+from app.inferencia import ModeloCompilado
+
+CATEGORICAS = ["bairro", "zona"]
+NUMERICAS = ["chuva", "altitude"]
+
+
+def _treino(n=200, semente=1):
+    gerador = np.random.default_rng(semente)
+    dados = pd.DataFrame({
+        "bairro": gerador.choice(["Sé", "Lapa", "Mooca", "Penha"], n),
+        "zona": gerador.choice(["norte", "sul", "leste"], n),
+        "chuva": gerador.gamma(2.0, 15.0, n) + 200,
+        "altitude": gerador.normal(760, 40, n),
+    })
+    alvo = dados["chuva"] * 0.3 + (dados["altitude"] - 700) * 2 + dados["bairro"].map({"Sé": 5, "Lapa": 1, "Mooca": 3, "Penha": 8})
+    return dados, alvo.to_numpy()
+
+
+def _consulta():
+    return pd.DataFrame({
+        "bairro": pd.Series(["Sé", "Lapa", "Itaquera", np.nan, "Penha"], dtype=object),
+        "zona": pd.Series(["norte", "sul", "leste", "oeste", np.nan], dtype=object),
+        "chuva": [210.0, np.nan, 250.0, 300.0, 205.0],
+        "altitude": [700.0, 780.0, np.nan, 760.0, 820.0],
+    })
+
+
+def _pipeline(categorico, numerico, estimador=None):
+    transformador = ColumnTransformer([("cat", categorico, CATEGORICAS), ("num", numerico, NUMERICAS)])
+    modelo = Pipeline([("pre", transformador), ("modelo", estimador or LinearRegression())])
+    dados, alvo = _treino()
+    return modelo.fit(dados, alvo)
+
+
+def _conferir(modelo, consulta):
+    inferencia = ModeloCompilado(modelo)
+    assert inferencia.compilado
+    esperado = modelo.predict(consulta)
+    np.testing.assert_allclose(inferencia.prever(consulta), esperado, rtol=1e-12, atol=1e-9)
+    for i in range(len(consulta)):
+        linha = {coluna: consulta[coluna].iloc[i] for coluna in consulta.columns}
+        np.testing.assert_allclose(inferencia.prever_linha(linha), esperado[i:i + 1], rtol=1e-12, atol=1e-9)
+    assert inferencia.aquecer()
+
+
+IMPUTADOR = SimpleImputer(strategy="median")
+
+ESCALAS = {
+    "padrao": make_pipeline(IMPUTADOR, StandardScaler()),
+    "sem_media": make_pipeline(IMPUTADOR, StandardScaler(with_mean=False)),
+    "sem_desvio": make_pipeline(IMPUTADOR, StandardScaler(with_std=False)),
+    "sem_media_nem_desvio": make_pipeline(IMPUTADOR, StandardScaler(with_mean=False, with_std=False)),
+    "minmax": make_pipeline(IMPUTADOR, MinMaxScaler()),
+    "so_imputador": IMPUTADOR,
+}
+
+
+@pytest.mark.parametrize("escala", ESCALAS, ids=list(ESCALAS))
+def test_one_hot_ignorando_desconhecidas(escala):
+    modelo = _pipeline(
+        make_pipeline(SimpleImputer(strategy="most_frequent"), OneHotEncoder(handle_unknown="ignore")),
+        ESCALAS[escala],
+    )
+    _conferir(modelo, _consulta())
+
+
+def test_one_hot_sem_imputador_trata_ausente_como_desconhecida():
+    modelo = _pipeline(OneHotEncoder(handle_unknown="ignore"), ESCALAS["padrao"])
+    _conferir(modelo, _consulta())
+
+
+def test_one_hot_com_erro_em_desconhecidas():
+    modelo = _pipeline(OneHotEncoder(handle_unknown="error"), ESCALAS["sem_media"])
+    conhecidas = _consulta().iloc[[0, 1]].reset_index(drop=True)
+    _conferir(modelo, conhecidas)
+
+    inferencia = ModeloCompilado(modelo)
+    desconhecida = _consulta().iloc[[2]].reset_index(drop=True)
+    with pytest.raises(ValueError):
+        modelo.predict(desconhecida)
+    with pytest.raises(ValueError):
+        inferencia.prever(desconhecida)
+    with pytest.raises(ValueError):
+        inferencia.prever_linha({coluna: desconhecida[coluna].iloc[0] for coluna in desconhecida.columns})
+
+
+@pytest.mark.parametrize("valor_desconhecido", [-1, 99])
+def test_ordinal_com_valor_para_desconhecidas(valor_desconhecido):
+    codificador = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=valor_desconhecido)
+    # A árvore aceita NaN: ausentes chegam ao estimador sem imputação
+    modelo = _pipeline(codificador, ESCALAS["sem_desvio"], DecisionTreeRegressor(random_state=0))
+    _conferir(modelo, _consulta())
+
+
+def test_ordinal_com_imputador():
+    codificador = make_pipeline(
+        SimpleImputer(strategy="constant", fill_value="ausente"),
+        OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1),
+    )
+    modelo = _pipeline(codificador, ESCALAS["sem_media"])
+    _conferir(modelo, _consulta())
@@ -0,0 +1,106 @@
+"""
+Ingestão de medidas: retenção pelo relógio, medidas do futuro recusadas, token do POST e arquivos recebidos.
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from app import agendamento, alertas, create_app, ingestao, sheets
+from app.series import SerieMedidas
+
+ESTACOES = pd.DataFrame({"codEstacao": ["A"], "latitude": [-23.5], "longitude": [-46.6]})
+
+
+def _lote(*datahoras):
+    return pd.DataFrame({
+        "codEstacao": "A", "latitude": -23.5, "longitude": -46.6,
+        "datahora": [str(datahora) for datahora in datahoras], "valorMedida": 1.0,
+    })
+
+
+@pytest.fixture
+def serie(monkeypatch):
+    agora = pd.Timestamp.now().floor("h")
+    medidas = ingestao.tipar_medidas(_lote(agora - pd.Timedelta(hours=2), agora - pd.Timedelta(hours=1)), "pluviometros")
+    # Direto no dicionário do módulo: sem carregar a planilha de data/
+    monkeypatch.setitem(vars(sheets), "serie_pluviometrica", SerieMedidas(medidas, ESTACOES))
+    return agora
+
+
+def test_medida_no_futuro_nao_apaga_a_serie(serie):
+    lote = ingestao.tipar_medidas(_lote(pd.Timestamp("2030-01-01"), serie), "pluviometros")
+    assert len(lote) == 1
+    assert ingestao.ingerir("pluviometros", lote) == 1
+    assert len(sheets.serie_pluviometrica) == 3
+
+
+def test_retencao_conta_a_partir_de_agora(serie, monkeypatch):
+    monkeypatch.setattr(ingestao, "INGESTAO_RETENCAO_DIAS", 1)
+    lote = ingestao.tipar_medidas(_lote(serie - pd.Timedelta(days=3)), "pluviometros")
+    ingestao.ingerir("pluviometros", lote)
+    assert len(sheets.serie_pluviometrica) == 2
+
+
+def test_token_do_post(monkeypatch):
+    for modulo in (ingestao, agendamento, alertas):
+        monkeypatch.setattr(modulo, "iniciar", lambda: None)
+    cliente = create_app().test_client()
+
+    monkeypatch.setattr(ingestao, "INGESTAO_TOKEN", "")
+    assert cliente.post("/ingest/pluviometros", json=[], headers={"Authorization": "Bearer "}).status_code == 401
+
+    monkeypatch.setattr(ingestao, "INGESTAO_TOKEN", "segredo")
+    assert cliente.post("/ingest/pluviometros", json=[]).status_code == 401
+    assert cliente.post("/ingest/pluviometros", json=[], headers={"Authorization": "Bearer outro"}).status_code == 401
+    assert cliente.post("/ingest/desconhecido", json=[], headers={"Authorization": "Bearer segredo"}).status_code == 404
+
+
+def test_arquivos_recebidos_fora_da_retencao_sao_apagados(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingestao, "INGESTAO_PASTA", str(tmp_path))
+    monkeypatch.setattr(ingestao, "INGESTAO_RETENCAO_DIAS", 2)
+    antigo = tmp_path / "pluviometrica_recebidas_20200101.csv"
+    antigo.write_text("x\n")
+    outro_destino = tmp_path / "hidrologica_recebidas_20200101.csv"
+    outro_destino.write_text("x\n")
+
+    ingestao.gravar_recebidas("pluviometros", ingestao.tipar_medidas(_lote(pd.Timestamp.now().floor("h")), "pluviometros"))
+    hoje = f"pluviometrica_recebidas_{pd.Timestamp.now():%Y%m%d}.csv"
+    assert sorted(os.listdir(tmp_path)) == sorted([hoje, outro_destino.name])
+
+
+def test_planilha_com_erro_nao_para_o_acompanhamento(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingestao, "INGESTAO_PASTA", str(tmp_path))
+    monkeypatch.setattr(ingestao, "_acompanhadores", {})
+    monkeypatch.setitem(ingestao.SHEETS, "pluviometros", str(tmp_path / "ausente.csv"))
+    monkeypatch.setitem(ingestao.SHEETS, "hidrologicas", str(tmp_path / "hidrologica.csv"))
+    (tmp_path / "hidrologica.csv").write_text("")
+    monkeypatch.setitem(vars(sheets), "serie_hidrologica", SerieMedidas(ingestao.tipar_medidas(_lote(pd.Timestamp.now().floor("h")), "hidrologicas"), ESTACOES))
+
+    def carregar_com_erro(nome):
+        raise FileNotFoundError(nome)
+
+    # A planilha pluviométrica não carrega: a hidrológica é acompanhada mesmo assim
+    monkeypatch.setattr(sheets, "__getattr__", carregar_com_erro)
+    assert ingestao.verificar_arquivos() == {"pluviometros": 0, "hidrologicas": 0}
+    assert [acompanhador.destino for acompanhador in ingestao._acompanhadores.values()] == ["hidrologicas"]
+
+
+def test_erro_num_ciclo_nao_encerra_a_thread(monkeypatch):
+    ciclos = []
+
+    class Parar(BaseException):
+        pass
+
+    def verificar():
+        ciclos.append(1)
+        raise RuntimeError("planilha corrompida")
+
+    def dormir(_):
+        if len(ciclos) == 3:
+            raise Parar
+    monkeypatch.setattr(ingestao, "verificar_arquivos", verificar)
+    monkeypatch.setattr(ingestao.time, "sleep", dormir)
+    with pytest.raises(Parar):
+        ingestao._acompanhar()
+    assert len(ciclos) == 3
@@ -0,0 +1,59 @@
+"""
+Interpolação IDW: as k estações mais próximas por argpartition contra a ordenação completa.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.interpolacao import MotorIDW
+
+
+def _interpolar_ordenando_todas(distancias, valores, k, p, max_dist_km):
+    ordem = np.argsort(distancias, axis=1, kind="stable")
+    dist = np.take_along_axis(distancias, ordem, axis=1)[:, :, None]
+    vals = np.asarray(valores, dtype=float).T[ordem]
+    validas = ~np.isnan(vals) & (dist <= max_dist_km)
+    usadas = validas & (np.cumsum(validas, axis=1) <= k)
+    vals = np.where(usadas, vals, 0.0)
+    with np.errstate(divide="ignore"):
+        pesos = np.where(usadas & (dist > 0), 1.0 / dist ** p, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        resultado = (vals * pesos).sum(axis=1) / pesos.sum(axis=1)
+    resultado[~usadas.any(axis=1)] = np.nan
+    no_ponto = usadas & (dist == 0)
+    primeira = np.argmax(no_ponto, axis=1)
+    valor_no_ponto = np.take_along_axis(vals, primeira[:, None, :], axis=1)[:, 0, :]
+    return np.where(no_ponto.any(axis=1), valor_no_ponto, resultado)
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_igual_a_ordenar_todas_as_estacoes(semente):
+    gerador = np.random.default_rng(semente)
+    n_estacoes = int(gerador.integers(1, 60))
+    estacoes = pd.DataFrame({
+        "codEstacao": [f"E{i}" for i in range(n_estacoes)],
+        "latitude": -23.5 + gerador.uniform(-0.4, 0.4, n_estacoes),
+        "longitude": -46.6 + gerador.uniform(-0.4, 0.4, n_estacoes),
+    })
+    motor = MotorIDW(estacoes)
+    lats = -23.5 + gerador.uniform(-0.5, 0.5, 40)
+    lons = -46.6 + gerador.uniform(-0.5, 0.5, 40)
+    # Alguns pontos exatamente sobre uma estação
+    lats[:3], lons[:3] = motor.latitudes[0], motor.longitudes[0]
+    distancias = motor.distancias(lats, lons)
+
+    # Janelas com muitas estações sem medida: as k mais próximas nem sempre bastam
+    valores = gerador.gamma(1.0, 5.0, (12, n_estacoes))
+    valores[gerador.random(valores.shape) < gerador.uniform(0, 0.9)] = np.nan
+    for k, max_dist_km in [(1, 20), (5, 20), (5, 5), (8, 100)]:
+        np.testing.assert_allclose(
+            motor.interpolar(distancias, valores, k=k, p=2, max_dist_km=max_dist_km),
+            _interpolar_ordenando_todas(distancias, valores, k, 2, max_dist_km),
+            rtol=1e-12, equal_nan=True,
+        )
+
+
+def test_sem_estacao_no_raio():
+    motor = MotorIDW(pd.DataFrame({"codEstacao": ["A"], "latitude": [-23.5], "longitude": [-46.6]}))
+    distancias = motor.distancias([-20.0], [-40.0])
+    assert np.isnan(motor.interpolar(distancias, np.ones((3, 1)))).all()
@@ -0,0 +1,98 @@
+"""
+Cache de respostas das rotas por coordenada (respostas.em_cache).
+"""
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+
+from app import respostas
+from app.cache import CacheTTL
+
+
+@pytest.fixture
+def rota(monkeypatch):
+    monkeypatch.setattr(respostas, "RESPOSTAS_CACHE_JANELA", 300)
+    monkeypatch.setattr(respostas, "cache_respostas", CacheTTL(100, 300))
+    monkeypatch.setattr(respostas, "backend", None)
+    calculadas = []
+    agendados = {(-23.55052, -46.633308): "agendada"}
+    app = Flask(__name__)
+
+    def direta(lat, lon):
+        if (lat, lon) in agendados:
+            return jsonify({"origem": agendados[(lat, lon)]})
+        return None
+
+    @app.route("/ponto")
+    @respostas.em_cache(direta=direta)
+    def ponto():
+        calculadas.append(request.args["lat"])
+        return jsonify({"origem": "calculada", "coordenadas": respostas.coordenadas()})
+
+    @app.route("/instavel")
+    @respostas.em_cache
+    def instavel():
+        calculadas.append(request.args["lat"])
+        if len(calculadas) == 1:
+            if request.args.get("modo") == "excecao":
+                # Só falha depois que outra requisição passou a esperar por este cálculo
+                limite = time.monotonic() + 5
+                while respostas.cache_respostas.estatisticas()["coalescidas"] == 0 and time.monotonic() < limite:
+                    time.sleep(0.01)
+                raise RuntimeError("serviço externo fora do ar")
+            return jsonify({"error": "indisponível"}), 503
+        return jsonify({"origem": "calculada"})
+
+    return app.test_client(), calculadas
+
+
+def test_resposta_direta_nao_vale_para_a_celula(rota):
+    cliente, calculadas = rota
+    # Ponto agendado primeiro: a resposta dele não fica guardada para a célula
+    assert cliente.get("/ponto?lat=-23.55052&lon=-46.633308").get_json() == {"origem": "agendada"}
+    assert cliente.get("/ponto?lat=-23.5506&lon=-46.6334").get_json()["origem"] == "calculada"
+    # Célula já guardada: o ponto agendado continua recebendo a sua predição
+    assert cliente.get("/ponto?lat=-23.55052&lon=-46.633308").get_json() == {"origem": "agendada"}
+    assert cliente.get("/ponto?lat=-23.5506&lon=-46.6334").get_json()["origem"] == "calculada"
+    assert len(calculadas) == 1
+
+
+def test_etag_devolve_304(rota):
+    cliente, calculadas = rota
+    resposta = cliente.get("/ponto?lat=-23.5506&lon=-46.6334")
+    etag = resposta.headers["ETag"]
+    assert resposta.cache_control.max_age <= 300
+
+    repetida = cliente.get("/ponto?lat=-23.5506&lon=-46.6334", headers={"If-None-Match": etag})
+    assert repetida.status_code == 304 and repetida.data == b""
+    assert cliente.get("/ponto?lat=-23.5506&lon=-46.6334", headers={"If-None-Match": '"outra"'}).status_code == 200
+    assert len(calculadas) == 1
+
+
+def test_resposta_de_erro_nao_e_guardada(rota):
+    cliente, calculadas = rota
+    assert cliente.get("/instavel?lat=-23.5506&lon=-46.6334").status_code == 503
+    assert cliente.get("/instavel?lat=-23.5506&lon=-46.6334").get_json() == {"origem": "calculada"}
+    assert cliente.get("/instavel?lat=-23.5506&lon=-46.6334").get_json() == {"origem": "calculada"}
+    assert len(calculadas) == 2
+
+
+def test_quem_espera_nao_recebe_a_excecao_de_outra_requisicao(rota):
+    cliente, calculadas = rota
+    status = {}
+
+    def consultar(nome):
+        status[nome] = cliente.get("/instavel?lat=-23.5506&lon=-46.6334&modo=excecao").status_code
+
+    primeira = threading.Thread(target=consultar, args=("primeira",))
+    primeira.start()
+    while not calculadas:
+        time.sleep(0.01)
+    consultar("segunda")
+    primeira.join(10)
+
+    # A que calculava responde 500; a que esperava calcula a sua resposta
+    assert status == {"primeira": 500, "segunda": 200}
+    assert respostas.cache_respostas.estatisticas()["coalescidas"] == 1
@@ -0,0 +1,105 @@
+"""
+Acréscimo de medidas à série: repetidas ignoradas, correções substituem o valor anterior; somas e médias
+por janela conferidas com o pandas.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.series import SerieMedidas
+
+ESTACOES = pd.DataFrame({"codEstacao": ["A", "B"], "latitude": [-23.5, -23.6], "longitude": [-46.6, -46.7]})
+JANELA = [(pd.Timestamp("2025-09-01 00:00"), pd.Timestamp("2025-09-01 23:59:59"))]
+
+
+def _medidas(linhas):
+    medidas = pd.DataFrame(linhas, columns=["codEstacao", "datahora", "valorMedida"])
+    medidas["datahora"] = pd.to_datetime(medidas["datahora"])
+    return medidas.merge(ESTACOES, on="codEstacao")
+
+
+@pytest.fixture
+def serie():
+    return SerieMedidas(_medidas([("A", "2025-09-01 01:00", 1.0), ("A", "2025-09-01 02:00", 2.0), ("B", "2025-09-01 01:00", 5.0)]), ESTACOES)
+
+
+def test_reenvio_identico_nao_altera_a_serie(serie):
+    nova, alteradas = serie.acrescentar(_medidas([("A", "2025-09-01 01:00", 1.0), ("B", "2025-09-01 01:00", 5.0)]), contar=True)
+    assert nova is serie and alteradas == 0
+    np.testing.assert_allclose(nova.somas(JANELA), [[3.0, 5.0]])
+
+
+def test_correcao_substitui_o_valor_anterior(serie):
+    nova, alteradas = serie.acrescentar(_medidas([("A", "2025-09-01 02:00", 7.0), ("A", "2025-09-01 03:00", 1.0)]), contar=True)
+    assert alteradas == 2
+    assert len(nova) == 4
+    np.testing.assert_allclose(nova.somas(JANELA), [[9.0, 5.0]])
+    np.testing.assert_allclose(nova.medias(JANELA), [[3.0, 5.0]])
+    # A série anterior continua a mesma
+    np.testing.assert_allclose(serie.somas(JANELA), [[3.0, 5.0]])
+
+
+def test_correcao_de_medida_em_segmento_anterior(serie):
+    serie = serie.acrescentar(_medidas([("B", "2025-09-01 02:00", 1.0)]))
+    serie = serie.acrescentar(_medidas([("B", "2025-09-01 03:00", 1.0)]))
+    nova = serie.acrescentar(_medidas([("B", "2025-09-01 01:00", 0.0), ("B", "2025-09-01 02:00", np.nan)]))
+    assert len(nova) == len(serie)
+    np.testing.assert_allclose(nova.somas(JANELA), [[3.0, 1.0]])
+    np.testing.assert_allclose(nova.medias(JANELA), [[1.5, 0.5]])
+    assert len(nova.compactar().segmentos[0]) == 5
+
+
+def test_no_lote_vale_a_ultima_medida(serie):
+    nova = serie.acrescentar(_medidas([("A", "2025-09-01 01:00", 4.0), ("A", "2025-09-01 01:00", 6.0)]))
+    np.testing.assert_allclose(nova.somas(JANELA), [[8.0, 5.0]])
+
+
+def _somas_e_medias_pandas(medidas, codigos, janelas):
+    somas = np.full((len(janelas), len(codigos)), np.nan)
+    medias = np.full((len(janelas), len(codigos)), np.nan)
+    for i, (inicio, fim) in enumerate(janelas):
+        na_janela = medidas[medidas["datahora"].between(inicio, fim)].groupby("codEstacao")["valorMedida"]
+        somas[i] = na_janela.sum().reindex(codigos).to_numpy()
+        medias[i] = na_janela.mean().reindex(codigos).to_numpy()
+    return somas, medias
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_janelas_em_varios_segmentos_conferem_com_o_pandas(semente):
+    gerador = np.random.default_rng(semente)
+    codigos = [f"E{i}" for i in range(6)]
+    estacoes = pd.DataFrame({"codEstacao": codigos, "latitude": -23.5 - np.arange(6) / 10, "longitude": -46.6})
+    inicio = pd.Timestamp("2025-09-01")
+
+    def lote(n):
+        # Estações novas aparecem nos lotes seguintes; horários repetidos trazem correções e reenvios
+        linhas = pd.DataFrame({
+            "codEstacao": gerador.choice(codigos[:int(gerador.integers(2, 7))], n),
+            "datahora": inicio + pd.to_timedelta(gerador.integers(0, 48 * 60, n) * 60, unit="s"),
+            "valorMedida": np.round(gerador.gamma(0.5, 4.0, n), 1).astype(np.float32).astype(float),
+        })
+        linhas.loc[gerador.random(n) < 0.1, "valorMedida"] = np.nan
+        return linhas.merge(estacoes, on="codEstacao")
+
+    # Lote inicial grande e lotes menores depois: a série fica com vários segmentos
+    lotes = [lote(n) for n in (800, 300, 80)] + [lote(int(gerador.integers(1, 10))) for _ in range(4)]
+    # A tabela inicial entra como está; só acrescentar resolve medidas repetidas
+    lotes[0] = lotes[0].drop_duplicates(subset=["codEstacao", "datahora"], keep="last")
+    serie = SerieMedidas(lotes[0], estacoes[estacoes["codEstacao"].isin(lotes[0]["codEstacao"])])
+    for medidas in lotes[1:]:
+        serie = serie.acrescentar(medidas)
+    assert len(serie.segmentos) > 1
+    # Vale a última medida de cada estação e datahora
+    todas = pd.concat(lotes, ignore_index=True).drop_duplicates(subset=["codEstacao", "datahora"], keep="last")
+    assert len(serie) == len(todas)
+
+    janelas = []
+    for _ in range(20):
+        a, b = np.sort(gerador.integers(-60, 49 * 60, 2)) * 60
+        janelas.append((inicio + pd.Timedelta(seconds=int(a)), inicio + pd.Timedelta(seconds=int(b) - 1)))
+    codigos_serie = list(serie.motor.codigos)
+    desde = inicio + pd.Timedelta(hours=30)
+    for atual, medidas in [(serie, todas), (serie.reter(desde), todas[todas["datahora"] >= desde])]:
+        somas, medias = _somas_e_medias_pandas(medidas, codigos_serie, janelas)
+        np.testing.assert_allclose(atual.somas(janelas), somas, rtol=1e-9, equal_nan=True)
+        np.testing.assert_allclose(atual.medias(janelas), medias, rtol=1e-9, equal_nan=True)
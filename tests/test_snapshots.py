@@ -0,0 +1,53 @@
+"""
+Gravação dos snapshots: troca atômica do snapshot e do .meta.json, sem temporários deixados para trás.
+"""
+import json
+import os
+
+import pandas as pd
+
+from app import snapshots
+
+
+def _tabelas(valor):
+    return {"medidas": pd.DataFrame({"valor": [valor] * 3}), "estacoes": pd.DataFrame({"codigo": ["a", "b"]})}
+
+
+def test_snapshot_de_diretorio_refeito_quando_a_origem_muda(tmp_path):
+    origem = tmp_path / "planilha.csv"
+    origem.write_text("x\n1\n")
+    leituras = []
+
+    def ler_origem():
+        leituras.append(1)
+        return _tabelas(len(leituras))
+
+    assert snapshots.carregar_tabelas(str(origem), ler_origem)["medidas"]["valor"].tolist() == [1] * 3
+    # Snapshot válido: a origem não é lida de novo
+    assert snapshots.carregar_tabelas(str(origem), ler_origem)["medidas"]["valor"].tolist() == [1] * 3
+    assert len(leituras) == 1
+
+    origem.write_text("x\n1\n2\n")
+    assert snapshots.carregar_tabelas(str(origem), ler_origem)["medidas"]["valor"].tolist() == [2] * 3
+    assert snapshots.carregar_tabelas(str(origem), ler_origem)["medidas"]["valor"].tolist() == [2] * 3
+    assert len(leituras) == 2
+
+    snapshot = snapshots.caminho_snapshot(str(origem), "tabelas")
+    with open(snapshot + ".meta.json") as f:
+        assert json.load(f) == snapshots.assinatura(str(origem))
+    assert sorted(os.listdir(tmp_path)) == ["planilha.csv", "planilha.snapshot.tabelas", "planilha.snapshot.tabelas.meta.json"]
+
+
+def test_falha_na_gravacao_nao_deixa_snapshot_valido(tmp_path):
+    origem = tmp_path / "planilha.csv"
+    origem.write_text("x\n1\n")
+    snapshot = snapshots.caminho_snapshot(str(origem), "parquet")
+
+    def gravar_pela_metade(destino):
+        with open(destino, "wb") as f:
+            f.write(b"PAR1")
+        raise OSError("disco cheio")
+
+    snapshots._gravar(str(origem), snapshot, gravar_pela_metade)
+    assert not snapshots.snapshot_valido(str(origem), snapshot)
+    assert os.listdir(tmp_path) == ["planilha.csv"]
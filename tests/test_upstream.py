@@ -0,0 +1,98 @@
+"""
+Chamadas externas contra um servidor HTTP local no papel do Nominatim e do OpenWeather.
+"""
+import json
+import multiprocessing
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from app import upstream, utils
+from app.cache import CacheDisco
+
+
+class _Tratador(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/reverse"):
+            corpo = {"address": {"suburb": "Sé"}}
+        else:
+            corpo = {"list": [{"dt": 0, "rain": {"3h": 1.5}} for _ in range(8)]}
+        dados = json.dumps(corpo).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+@pytest.fixture
+def servicos(monkeypatch, tmp_path):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Tratador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_port}"
+    monkeypatch.setattr(utils, "NOMINATIM_URL", url + "/reverse")
+    monkeypatch.setattr(utils, "OPENWEATHER_URL", url + "/forecast")
+    monkeypatch.setattr(utils, "cache_nominatim", CacheDisco(str(tmp_path / "nominatim.sqlite")))
+    utils.cache_previsoes.limpar()
+    yield tmp_path
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_geocodificacao_limitada_nao_atrasa_a_previsao(servicos, monkeypatch):
+    limitador = upstream.LimitadorIntervalo(0.25, str(servicos / "nominatim.limite"))
+    monkeypatch.setattr(upstream, "limitador_nominatim", limitador)
+
+    inicio_lote = time.perf_counter()
+    futuros = [
+        upstream.executor_geocodificacao.submit(utils.get_neighbourhood_nominatim, -23.5 - i * 0.01, -46.6)
+        for i in range(16)
+    ]
+    time.sleep(0.1)
+    inicio = time.perf_counter()
+    previsao = upstream.resultado(upstream.executor.submit(utils.get_weather_forecast_24h, -23.55, -46.63), "previsao")
+    assert time.perf_counter() - inicio < 1
+    assert previsao == {"chuva_24h": 12.0, "intensidade_max_24h": 1.5}
+
+    bairros = [upstream.resultado(futuro, "geocodificacao", timeout=10) for futuro in futuros]
+    assert bairros == ["Sé"] * 16
+    # 16 chamadas com 0,25 s entre elas
+    assert time.perf_counter() - inicio_lote >= 15 * 0.25 - 0.01
+
+
+def _reservar(caminho, intervalo, vezes, fila):
+    limitador = upstream.LimitadorIntervalo(intervalo, caminho)
+    for _ in range(vezes):
+        limitador.aguardar()
+        fila.put(time.time())
+
+
+def test_limite_compartilhado_entre_processos(tmp_path):
+    contexto = multiprocessing.get_context("fork")
+    fila = contexto.Queue()
+    processos = [contexto.Process(target=_reservar, args=(str(tmp_path / "limite"), 0.2, 3, fila)) for _ in range(3)]
+    for processo in processos:
+        processo.start()
+    horarios = sorted(fila.get(timeout=10) for _ in range(9))
+    for processo in processos:
+        processo.join()
+    intervalos = [depois - antes for antes, depois in zip(horarios, horarios[1:])]
+    assert min(intervalos) >= 0.19
+
+
+def test_reserva_alem_da_espera_maxima_e_recusada():
+    limitador = upstream.LimitadorIntervalo(1.0, espera_max=0.5)
+    assert limitador.aguardar()
+    inicio = time.perf_counter()
+    assert not limitador.aguardar()
+    assert time.perf_counter() - inicio < 0.1
+
+
+def test_resultado_devolve_none_sem_resposta_a_tempo():
+    futuro = upstream.executor.submit(time.sleep, 0.5)
+    assert upstream.resultado(futuro, "teste", timeout=0.05) is None